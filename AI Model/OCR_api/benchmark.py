@@ -0,0 +1,91 @@
+# benchmark.py — OCR service throughput vs. concurrency against a stub model
+"""Benchmark /extract/ throughput as the concurrency limit grows.
+
+Usage (from AI Model/OCR_api/):
+    python benchmark.py [--requests 64] [--latency 0.2] [--levels 1,2,4,8,16]
+
+The Gemini model is replaced by a local stub whose generate_content blocks for
+--latency seconds, like the synchronous SDK waiting on the network. All
+requests are sent at once through an in-process ASGI client, so the numbers
+show how many model calls the service overlaps. With a limit of 1 the service
+is serial, which is how it behaved while the call ran on the event loop.
+"""
+import os
+import io
+import json
+import time
+import asyncio
+import logging
+import argparse
+from types import SimpleNamespace
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-stub")
+
+import httpx
+from PIL import Image
+
+import main
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel; blocks like a network round trip."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, parts, request_options=None):
+        time.sleep(self.latency)
+        return SimpleNamespace(text=json.dumps({"Name": "Stub Student", "Roll Number": "42"}))
+
+
+def _sample_images(count):
+    # Distinct images (and a fresh cache per level), so the response cache
+    # never answers for the model
+    images = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        img = Image.new("RGB", (800, 600), (240, 240, 240))
+        img.putpixel((0, 0), (i % 256, i // 256 % 256, 0))
+        img.save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+
+async def _run(images):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://ocr") as client:
+        async def one(image):
+            response = await client.post(
+                "/extract/", files={"file": ("cert.png", image, "image/png")}
+            )
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(image) for image in images))
+        return time.perf_counter() - start
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--levels", default="1,2,4,8,16")
+    args = parser.parse_args()
+
+    stub = StubModel(args.latency)
+    main.get_model = lambda: stub
+    logging.disable(logging.INFO)
+
+    print(f"{'limit':>6} {'requests':>9} {'elapsed s':>10} {'req/s':>8} {'speedup':>8}")
+    baseline = None
+    for level in (int(x) for x in args.levels.split(",")):
+        main.configure_concurrency(level)
+        main.response_cache = main.ResponseCache(main.OCR_CACHE_SIZE)
+        elapsed = asyncio.run(_run(_sample_images(args.requests)))
+        rate = args.requests / elapsed
+        baseline = baseline or rate
+        print(f"{level:>6} {args.requests:>9} {elapsed:>10.2f} {rate:>8.1f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
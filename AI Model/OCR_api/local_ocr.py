@@ -0,0 +1,168 @@
+# local_ocr.py — Tesseract extraction tier with per-institution layout templates
+r"""Cheap, offline first pass for /extract/.
+
+Tesseract reads the page, a layout template picks the fields out of the text,
+and main.py only falls back to Gemini when required fields are missing or the
+OCR confidence is too low. pytesseract (and the tesseract binary) are optional:
+without them the local tier reports itself unavailable and every image goes to
+Gemini as before.
+
+Templates live in a JSON file (OCR_TEMPLATES_PATH, see templates.example.json):
+
+    [{"institution": "Example Institute of Technology",
+      "match": ["example institute"],
+      "fields": {"Roll Number": {"pattern": "Roll\\s*No\\.?\\s*:?\\s*(\\w+)"},
+                 "Name": {"box": [0.1, 0.3, 0.9, 0.4]}}}]
+
+A template applies when any "match" phrase occurs in the page text. Each field
+is the first group of "pattern" (searched case-insensitively), read either
+from the whole page or from "box" — a region in page-relative coordinates
+(left, top, right, bottom) that is OCR'd on its own. A box without a pattern
+takes the region's text as the value. Fields not covered by the matched
+template fall back to the generic patterns below.
+"""
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# The keys EXTRACTION_PROMPT asks Gemini for, so both tiers answer alike
+FIELDS = (
+    "Name", "Roll Number", "Course", "Branch", "Year",
+    "CGPA", "SGPA", "Certificate Id", "Institution", "Issue Date",
+)
+
+# Label-based patterns that work on most certificate layouts
+GENERIC_PATTERNS = {
+    "Name": r"(?:Student(?:'s)?\s+)?Name\s*(?:of\s+the\s+(?:Student|Candidate))?\s*[:\-]\s*([A-Z][A-Za-z .']+)",
+    "Roll Number": r"(?:Roll|Enrol(?:l)?ment|Seat)\s*(?:No\.?|Number)\s*[:\-]?\s*([A-Z0-9/\-]+)",
+    "Certificate Id": r"Certificate\s*(?:No\.?|Number|Id)\s*[:\-]?\s*([A-Z0-9/\-]+)",
+    "Course": r"(?:Course|Programme|Program|Degree)\s*[:\-]\s*([A-Za-z .()]+)",
+    "Branch": r"(?:Branch|Specialization|Discipline)\s*[:\-]\s*([A-Za-z .&()]+)",
+    "Year": r"(?:Year|Session|Batch)\s*[:\-]?\s*((?:19|20)\d{2}(?:\s*-\s*(?:19|20)?\d{2})?)",
+    "CGPA": r"CGPA\s*[:\-]?\s*(\d{1,2}\.\d{1,2})",
+    "SGPA": r"SGPA\s*[:\-]?\s*(\d{1,2}\.\d{1,2})",
+    "Institution": r"^\s*([A-Z][A-Za-z .,&]*(?:University|Institute|College|School)[A-Za-z .,&]*)\s*$",
+    "Issue Date": r"(?:Date\s*(?:of\s*Issue)?|Issued\s*on)\s*[:\-]?\s*(\d{1,2}[/.\-]\d{1,2}[/.\-]\d{2,4})",
+}
+
+
+@lru_cache(maxsize=1)
+def is_available() -> bool:
+    """True when pytesseract and the tesseract binary can both be used."""
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        logger.info(f"Local OCR tier unavailable ({e.__class__.__name__}); using Gemini only")
+        return False
+    return True
+
+
+def _compile(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+
+
+def load_templates(path: str) -> List[dict]:
+    """Load layout templates from `path`; a missing file means generic patterns only."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return []
+
+    templates = []
+    for entry in raw:
+        fields = {}
+        for field, spec in entry.get("fields", {}).items():
+            if field not in FIELDS:
+                raise ValueError(f"Template {entry.get('institution')!r}: unknown field {field!r}")
+            fields[field] = {
+                "pattern": _compile(spec["pattern"]) if spec.get("pattern") else None,
+                "box": tuple(spec["box"]) if spec.get("box") else None,
+            }
+        templates.append({
+            "institution": entry["institution"],
+            "match": [phrase.lower() for phrase in entry.get("match", [entry["institution"]])],
+            "fields": fields,
+        })
+    logger.info(f"Loaded {len(templates)} OCR layout templates from {path}")
+    return templates
+
+
+_GENERIC = {field: {"pattern": _compile(pattern), "box": None} for field, pattern in GENERIC_PATTERNS.items()}
+
+
+def read_text(img: Image.Image) -> Tuple[str, float]:
+    """OCR an image; returns (text, mean word confidence in 0..1)."""
+    import pytesseract
+
+    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        confidences.append(conf)
+        line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(line, []).append(word)
+    text = "\n".join(" ".join(words) for words in lines.values())
+    confidence = sum(confidences) / len(confidences) / 100 if confidences else 0.0
+    return text, confidence
+
+
+def match_template(text: str, templates: List[dict]) -> Optional[dict]:
+    """The first template whose match phrases occur in the page text."""
+    lowered = text.lower()
+    for template in templates:
+        if any(phrase in lowered for phrase in template["match"]):
+            return template
+    return None
+
+
+def _crop(img: Image.Image, box: tuple) -> Image.Image:
+    width, height = img.size
+    left, top, right, bottom = box
+    return img.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+
+
+def _search(spec: dict, text: str) -> Optional[str]:
+    if spec["pattern"] is None:
+        value = " ".join(text.split())
+    else:
+        match = spec["pattern"].search(text)
+        value = " ".join(match.group(1).split()) if match else ""
+    return value or None
+
+
+def extract(img: Image.Image, templates: List[dict]) -> Tuple[dict, float, Optional[str]]:
+    """Extract FIELDS from a decoded image.
+
+    Returns (fields, confidence, institution of the matched template or None).
+    Confidence is the lowest mean word confidence of the page and any boxes read.
+    """
+    gray = img.convert("L")
+    text, confidence = read_text(gray)
+    template = match_template(text, templates)
+
+    specs = dict(_GENERIC)
+    fields = {field: None for field in FIELDS}
+    if template is not None:
+        specs.update(template["fields"])
+        fields["Institution"] = template["institution"]
+
+    for field, spec in specs.items():
+        if fields[field] is not None:
+            continue
+        source = text
+        if spec["box"] is not None:
+            source, box_confidence = read_text(_crop(gray, spec["box"]))
+            confidence = min(confidence, box_confidence)
+        fields[field] = _search(spec, source)
+    return fields, confidence, template["institution"] if template else None
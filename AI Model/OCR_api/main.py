@@ -4,16 +4,28 @@ import json
 import re
 import os
 import io
+import asyncio
+import hashlib
 import pathlib
 import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from PIL import Image
 
+import local_ocr
+
 # ---------- Logging ----------
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -32,6 +44,99 @@ if not GEMINI_API_KEY:
 genai.configure(api_key=GEMINI_API_KEY)
 logger.info("Gemini API configured successfully.")
 
+# ---------- Concurrency ----------
+# Image decoding and the synchronous Gemini SDK call block, so they run on a
+# bounded thread pool instead of the event loop. The semaphore caps calls in
+# flight (excess requests wait); each request is bounded by OCR_REQUEST_TIMEOUT,
+# which is also passed to the model call so its thread does not outlive it.
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "8"))
+OCR_REQUEST_TIMEOUT = float(os.getenv("OCR_REQUEST_TIMEOUT", "60"))
+
+# /extract/batch: images packed into one model request (1 = no packing) and
+# the most images accepted per call
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "4"))
+OCR_MAX_BATCH_FILES = int(os.getenv("OCR_MAX_BATCH_FILES", "32"))
+
+# ---------- Upload Limits ----------
+# Uploads are read in chunks and refused past OCR_MAX_UPLOAD_MB. Image headers
+# are checked before decoding: more than OCR_MAX_IMAGE_PIXELS pixels is refused
+# (decompression bombs), and larger-than-needed images are decoded/reduced to
+# OCR_MAX_DIMENSION on the long side, which is plenty for OCR.
+OCR_MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_MB", "10")) * 1024 * 1024
+OCR_MAX_IMAGE_PIXELS = int(os.getenv("OCR_MAX_IMAGE_PIXELS", "40000000"))
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "3072"))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Pillow's own guard: it raises DecompressionBombError beyond twice this
+Image.MAX_IMAGE_PIXELS = OCR_MAX_IMAGE_PIXELS
+
+# ---------- Response Cache Settings ----------
+# In-memory LRU entries, and an optional SQLite file that survives restarts
+# (empty = memory only)
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "1024"))
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", "")
+
+# ---------- Tiered Extraction ----------
+# Tesseract with layout templates answers first; Gemini is called only when a
+# required field is missing or local confidence (0..1) is below the threshold.
+# The local tier runs whenever pytesseract and the tesseract binary are
+# installed, unless OCR_LOCAL_TIER=off.
+OCR_LOCAL_TIER = os.getenv("OCR_LOCAL_TIER", "auto").lower()
+OCR_LOCAL_MIN_CONFIDENCE = float(os.getenv("OCR_LOCAL_MIN_CONFIDENCE", "0.80"))
+OCR_REQUIRED_FIELDS = [
+    field.strip() for field in os.getenv("OCR_REQUIRED_FIELDS", "Name,Roll Number,Institution").split(",")
+    if field.strip()
+]
+OCR_TEMPLATES_PATH = os.getenv("OCR_TEMPLATES_PATH", str(_BASE_DIR / "templates.json"))
+# What a Gemini call costs (USD) and takes (ms) before any has been timed;
+# used to report what each locally answered request saved
+GEMINI_COST_PER_CALL = float(os.getenv("GEMINI_COST_PER_CALL", "0.0005"))
+GEMINI_LATENCY_MS = float(os.getenv("GEMINI_LATENCY_MS", "3000"))
+
+_executor = None
+_semaphore = None
+
+
+def configure_concurrency(limit: int) -> None:
+    """(Re)create the model-call pool and semaphore for `limit` concurrent requests."""
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="ocr")
+    _semaphore = asyncio.Semaphore(limit)
+
+
+configure_concurrency(OCR_MAX_CONCURRENCY)
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the model pool, waiting for a concurrency slot first.
+
+    The slot is held until the worker thread finishes. Cancelling the await
+    (e.g. a timeout) does not stop the thread, so it keeps its slot rather
+    than letting more calls run than the cap allows.
+    """
+    semaphore = _semaphore
+    await semaphore.acquire()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    except BaseException:
+        semaphore.release()
+        raise
+
+    def finished(done):
+        semaphore.release()
+        if not done.cancelled():
+            done.exception()  # retrieved, so an abandoned call's error is not logged as unhandled
+
+    future.add_done_callback(finished)
+    return await asyncio.shield(future)
+
+
+def request_deadline() -> float:
+    """time.monotonic() deadline for a request started now."""
+    return time.monotonic() + OCR_REQUEST_TIMEOUT
+
 # ---------- FastAPI App ----------
 app = FastAPI(
     title="Gemini OCR API",
@@ -78,29 +183,121 @@ Do NOT include markdown, code fences, or any explanation text.
 Return raw JSON only.
 """
 
+BATCH_PROMPT = EXTRACTION_PROMPT + """
+This request contains several images, each introduced by a line "Image <index>:".
+Apply the instructions above to every image independently. Instead of a single
+object, return ONLY a JSON array with one object per image. Each object must
+contain the key "index" with that image's index, plus either the extracted
+fields or the "error" key.
+"""
+
 
 # ---------- Core Extraction ----------
-def extract_with_gemini(image_bytes: bytes) -> dict:
-    """Send image to Gemini 1.5 Flash using PIL and return extracted JSON data."""
+QUOTA_ERROR = (
+    "Gemini API quota exceeded. Please enable billing on your Google AI Studio account "
+    "at https://aistudio.google.com, or wait and try again later."
+)
+
+
+class ModelError(Exception):
+    """A model call failed; the message is safe to return to the client."""
+
+
+class ModelTimeout(ModelError):
+    """The request deadline passed before or during a model call."""
+
+
+TIMEOUT_ERROR = "OCR request timed out. Please try again."
+
+
+MODEL_NAME = "gemini-2.5-flash"
+
+
+@lru_cache(maxsize=1)
+def get_model():
+    """Gemini model client, created once and shared by all requests."""
+    return genai.GenerativeModel(MODEL_NAME)
+
+
+class UploadTooLarge(Exception):
+    """An upload exceeded OCR_MAX_UPLOAD_BYTES."""
+
+
+async def read_upload(file: UploadFile, limit: int = OCR_MAX_UPLOAD_BYTES) -> bytearray:
+    """Read an upload in chunks, refusing it as soon as it exceeds `limit` bytes."""
+    too_large = UploadTooLarge(f"File too large. Maximum size is {limit // (1024 * 1024)} MB.")
+    if file.size is not None and file.size > limit:
+        raise too_large
+    data = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        data += chunk
+        if len(data) > limit:
+            raise too_large
+    return data
+
+
+def open_image(image_bytes: bytes) -> Image.Image:
+    """Decode image bytes, raising ValueError with a client-facing message.
+
+    Dimensions are read from the header first, so oversized images are refused
+    before any pixel data is decoded. JPEGs larger than OCR_MAX_DIMENSION are
+    decoded at a reduced scale (draft mode); other formats are downscaled right
+    after decoding.
+    """
     try:
-        img = Image.open(io.BytesIO(image_bytes))
+        img = Image.open(io.BytesIO(image_bytes))  # header only, no pixel data yet
+    except Image.DecompressionBombError as e:
+        logger.warning(f"Refusing image: {e}")
+        raise ValueError(f"Image dimensions too large. Maximum is {OCR_MAX_IMAGE_PIXELS} pixels.")
     except Exception as e:
         logger.error(f"Cannot open image: {e}")
-        return {"error": f"Invalid image file: {e}"}
+        raise ValueError(f"Invalid image file: {e}")
 
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    logger.info(f"Sending image ({img.size}, {img.mode}) to Gemini...")
+    width, height = img.size
+    if width * height > OCR_MAX_IMAGE_PIXELS:
+        logger.warning(f"Refusing {width}x{height} image (limit {OCR_MAX_IMAGE_PIXELS} pixels)")
+        raise ValueError(
+            f"Image dimensions too large ({width}x{height}). "
+            f"Maximum is {OCR_MAX_IMAGE_PIXELS} pixels."
+        )
 
     try:
-        response = model.generate_content([EXTRACTION_PROMPT, img])
+        if img.format == "JPEG" and max(width, height) > OCR_MAX_DIMENSION:
+            img.draft("RGB", (OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+        img.load()
+    except Exception as e:
+        logger.error(f"Cannot decode image: {e}")
+        raise ValueError(f"Invalid image file: {e}")
+
+    if max(img.size) > OCR_MAX_DIMENSION:
+        img.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+    return img
+
+
+def generate(parts: list, deadline: Optional[float] = None) -> str:
+    """Call the model and return its raw text with markdown fences stripped.
+
+    With a time.monotonic() deadline the call gets the time left as its own
+    timeout; ModelTimeout is raised when it runs out.
+    """
+    request_options = {}
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise ModelTimeout(TIMEOUT_ERROR)
+        request_options["timeout"] = timeout
+    try:
+        response = get_model().generate_content(parts, request_options=request_options)
     except Exception as e:
         err_str = str(e)
         logger.error(f"Gemini API error: {err_str[:200]}")
+        if isinstance(e, (TimeoutError, google_exceptions.DeadlineExceeded)) or (
+            deadline is not None and time.monotonic() >= deadline
+        ):
+            raise ModelTimeout(TIMEOUT_ERROR)
         if "429" in err_str or "quota" in err_str.lower():
-            return {
-                "error": "Gemini API quota exceeded. Please enable billing on your Google AI Studio account at https://aistudio.google.com, or wait and try again later."
-            }
-        return {"error": f"Gemini API error: {err_str[:200]}"}
+            raise ModelError(QUOTA_ERROR)
+        raise ModelError(f"Gemini API error: {err_str[:200]}")
 
     raw = response.text.strip()
     logger.info(f"Gemini raw response (first 200 chars): {raw[:200]}")
@@ -109,19 +306,333 @@ def extract_with_gemini(image_bytes: bytes) -> dict:
     if "```" in raw:
         raw = re.sub(r"```(?:json)?\s*", "", raw).strip()
         raw = raw.rstrip("`").strip()
+    return raw
+
 
+def parse_json(raw: str, pattern: str = r"\{.*\}"):
+    """Parse the model's JSON, falling back to the first match of `pattern` in the text."""
     try:
         return json.loads(raw)
     except json.JSONDecodeError:
-        # Try to find a JSON object anywhere in the response
-        match = re.search(r"\{.*\}", raw, re.DOTALL)
+        # Try to find the JSON value anywhere in the response
+        match = re.search(pattern, raw, re.DOTALL)
         if match:
             try:
                 return json.loads(match.group())
             except json.JSONDecodeError:
                 pass
         logger.error(f"Failed to parse JSON from Gemini response:\n{raw}")
+        return None
+
+
+def extract_with_gemini(image_bytes: bytes, deadline: Optional[float] = None) -> dict:
+    """Send image to Gemini 1.5 Flash using PIL and return extracted JSON data."""
+    try:
+        img = open_image(image_bytes)
+    except ValueError as e:
+        return {"error": str(e)}
+    return extract_image_with_gemini(img, deadline)
+
+
+def extract_image_with_gemini(img: Image.Image, deadline: Optional[float] = None) -> dict:
+    """Gemini extraction of an already decoded image. ModelTimeout propagates."""
+    logger.info(f"Sending image ({img.size}, {img.mode}) to Gemini...")
+    try:
+        raw = generate([EXTRACTION_PROMPT, img], deadline)
+    except ModelTimeout:
+        raise
+    except ModelError as e:
+        return {"error": str(e)}
+
+    data = parse_json(raw)
+    if not isinstance(data, dict):
         return {"error": "Could not parse AI response. Please try again."}
+    return data
+
+
+def extract_packed_with_gemini(items: list, deadline: Optional[float] = None) -> dict:
+    """Extract several images with one model request.
+
+    `items` is a list of (index, image_bytes). Returns {index: result} for every
+    image the response could be matched to; images left out (e.g. an unparseable
+    response) are for the caller to retry individually.
+    """
+    results = {}
+    parts = [BATCH_PROMPT]
+    for index, image_bytes in items:
+        try:
+            img = open_image(image_bytes)
+        except ValueError as e:
+            results[index] = {"error": str(e)}
+            continue
+        parts.extend([f"Image {index}:", img])
+
+    expected = {index for index, _ in items} - set(results)
+    if not expected:
+        return results
+
+    logger.info(f"Sending {len(expected)} images to Gemini in one request...")
+    try:
+        raw = generate(parts, deadline)
+    except ModelError as e:
+        # The model itself is failing (or the time is up) — retrying per image would fail the same way
+        results.update({index: {"error": str(e)} for index in expected})
+        return results
+
+    data = parse_json(raw, r"\[.*\]")
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict) and item.get("index") in expected:
+            index = item.pop("index")
+            results[index] = item
+    return results
+
+
+async def extract_group(items: list, deadline: Optional[float] = None) -> dict:
+    """Extract a group of (index, image_bytes): packed into one request when
+    there are several, with concurrent single calls for anything unmatched.
+    """
+    results = {}
+    if len(items) > 1:
+        results = await run_blocking(extract_packed_with_gemini, items, deadline)
+    missing = [(index, image_bytes) for index, image_bytes in items if index not in results]
+    if missing:
+        if len(items) > 1:
+            logger.warning(f"Packed response missed {len(missing)} images; retrying individually")
+        singles = await asyncio.gather(
+            *(run_blocking(extract_with_gemini, image_bytes, deadline) for _, image_bytes in missing)
+        )
+        results.update({index: result for (index, _), result in zip(missing, singles)})
+    return results
+
+
+# ---------- Local Tier ----------
+class TierStats:
+    """Per-tier request counts plus what the local tier saved. Gemini latency is
+    a moving average of timed calls, seeded with GEMINI_LATENCY_MS. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.gemini_ms = GEMINI_LATENCY_MS
+        self.counts = {"cache": 0, "local": 0, "gemini": 0}
+        self.saved_cost = 0.0
+        self.saved_ms = 0.0
+        self.local_fallthrough_ms = 0.0
+
+    def record_gemini(self, elapsed_ms: Optional[float], local_ms: float = 0.0, count: int = 1) -> None:
+        """Count requests Gemini answered; elapsed_ms None when not timed per image."""
+        with self._lock:
+            self.counts["gemini"] += count
+            if elapsed_ms is not None:
+                self.gemini_ms = 0.8 * self.gemini_ms + 0.2 * elapsed_ms
+            self.local_fallthrough_ms += local_ms
+
+    def record_saved(self, tier: str, elapsed_ms: float) -> Tuple[float, float]:
+        """Count a request answered without Gemini; returns (cost, ms) it saved."""
+        with self._lock:
+            self.counts[tier] += 1
+            saved_ms = max(0.0, self.gemini_ms - elapsed_ms)
+            self.saved_cost += GEMINI_COST_PER_CALL
+            self.saved_ms += saved_ms
+        return GEMINI_COST_PER_CALL, saved_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": dict(self.counts),
+                "local_tier_enabled": local_tier_enabled(),
+                "gemini_latency_ms": round(self.gemini_ms, 1),
+                "saved_cost_usd": round(self.saved_cost, 6),
+                "saved_ms": round(self.saved_ms, 1),
+                "local_fallthrough_ms": round(self.local_fallthrough_ms, 1),
+            }
+
+
+tier_stats = TierStats()
+
+
+@lru_cache(maxsize=1)
+def get_templates() -> list:
+    """Layout templates, loaded once."""
+    return local_ocr.load_templates(OCR_TEMPLATES_PATH)
+
+
+def local_tier_enabled() -> bool:
+    if OCR_LOCAL_TIER == "off":
+        return False
+    return local_ocr.is_available()
+
+
+def extract_locally(img: Image.Image) -> Optional[dict]:
+    """Local tier: the extracted fields, or None when Gemini has to answer."""
+    if not local_tier_enabled():
+        return None
+    try:
+        fields, confidence, institution = local_ocr.extract(img, get_templates())
+    except Exception as e:
+        logger.warning(f"Local OCR failed, falling back to Gemini: {e}")
+        return None
+
+    missing = [field for field in OCR_REQUIRED_FIELDS if not fields.get(field)]
+    if missing or confidence < OCR_LOCAL_MIN_CONFIDENCE:
+        logger.info(
+            f"Local OCR not accepted (template {institution!r}, confidence {confidence:.2f}, "
+            f"missing {missing}); escalating to Gemini"
+        )
+        return None
+    logger.info(f"Local OCR accepted (template {institution!r}, confidence {confidence:.2f})")
+    return fields
+
+
+def extract_tiered(image_bytes: bytes, deadline: Optional[float] = None) -> Tuple[dict, str, float]:
+    """Extract one image, local tier first. Returns (result, tier, elapsed_ms)
+    where tier is "local" or "gemini".
+    """
+    start = time.perf_counter()
+    try:
+        img = open_image(image_bytes)
+    except ValueError as e:
+        return {"error": str(e)}, "gemini", 0.0
+
+    result = extract_locally(img)
+    local_ms = (time.perf_counter() - start) * 1000
+    if result is not None:
+        return result, "local", local_ms
+
+    result = extract_image_with_gemini(img, deadline)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    tier_stats.record_gemini(elapsed_ms - local_ms, local_ms)
+    return result, "gemini", elapsed_ms
+
+
+def extract_locally_from_bytes(image_bytes: bytes) -> Tuple[Optional[dict], float]:
+    """Local tier for a batch item: (fields or None, elapsed_ms). Undecodable
+    images return None and get their error from the Gemini path.
+    """
+    start = time.perf_counter()
+    if not local_tier_enabled():
+        return None, 0.0
+    try:
+        img = open_image(image_bytes)
+    except ValueError:
+        return None, 0.0
+    return extract_locally(img), (time.perf_counter() - start) * 1000
+
+
+def tier_headers(tier: str, saved: Tuple[float, float]) -> dict:
+    """X-OCR-Tier plus the cost (USD) and latency (ms) the answer saved."""
+    cost, ms = saved
+    return {"X-OCR-Tier": tier, "X-OCR-Saved-Cost": f"{cost:.6f}", "X-OCR-Saved-Ms": f"{ms:.0f}"}
+
+
+# ---------- Response Cache ----------
+class ResponseCache:
+    """Two-tier cache of successful extractions: an in-memory LRU in front of an
+    optional SQLite table. Disk hits are promoted to memory. Thread-safe.
+    """
+
+    def __init__(self, maxsize: int, db_path: str = ""):
+        self.maxsize = max(maxsize, 1)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get_memory(self, key: str) -> Optional[dict]:
+        """Memory-tier lookup; cheap enough to run on the event loop."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return value
+
+    def get_disk(self, key: str) -> Optional[dict]:
+        """Disk-tier lookup (blocking). Counts a miss when neither tier has the key."""
+        value = None
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT value FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        """Store an extraction in both tiers (blocking when the disk tier is on)."""
+        self._remember(key, value)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+                self._db.commit()
+        with self._lock:
+            self.stats["stores"] += 1
+
+    def _remember(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        """Hit/miss counters plus tier sizes."""
+        with self._lock:
+            stats = dict(self.stats, memory_entries=len(self._memory))
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        stats["disk_enabled"] = self._db is not None
+        return stats
+
+
+response_cache = ResponseCache(OCR_CACHE_SIZE, OCR_CACHE_DB)
+
+# Prompt changes must invalidate cached answers. BATCH_PROMPT only wraps
+# EXTRACTION_PROMPT in a multi-image envelope, so both paths share entries.
+_PROMPT_DIGEST = hashlib.sha256(EXTRACTION_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(image_bytes: bytes) -> str:
+    """Cache key: image digest + prompt digest + model name."""
+    return f"{hashlib.sha256(image_bytes).hexdigest()}:{_PROMPT_DIGEST}:{MODEL_NAME}"
+
+
+def is_cacheable(result: dict) -> bool:
+    """Only successful, parsed extractions are cached."""
+    return isinstance(result, dict) and "error" not in result
+
+
+async def cache_lookup(key: str) -> Tuple[Optional[dict], Optional[str]]:
+    """Return (result, tier) from the cache, or (None, None) on a miss."""
+    result = response_cache.get_memory(key)
+    if result is not None:
+        return result, "memory"
+    result = await asyncio.to_thread(response_cache.get_disk, key)
+    if result is not None:
+        return result, "disk"
+    return None, None
+
+
+async def cache_store(key: str, result: dict) -> None:
+    if is_cacheable(result):
+        await asyncio.to_thread(response_cache.set, key, result)
 
 
 # ---------- Health Check ----------
@@ -130,6 +641,18 @@ async def health():
     return {"status": "ok", "service": "Gemini OCR API v1.2"}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss counters."""
+    return response_cache.snapshot()
+
+
+@app.get("/tiers/stats")
+async def tiers_stats():
+    """Requests answered per tier (cache, local, gemini) and what that saved."""
+    return tier_stats.snapshot()
+
+
 # ---------- Main OCR Endpoint ----------
 @app.post("/extract/")
 async def extract_certificate(file: UploadFile = File(...)):
@@ -143,9 +666,128 @@ async def extract_certificate(file: UploadFile = File(...)):
             detail=f"Only image files are supported. Received: {file.content_type}",
         )
 
-    image_bytes = await file.read()
+    try:
+        image_bytes = await read_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     logger.info(f"Received: {file.filename!r} ({file.content_type}, {len(image_bytes)} bytes)")
 
-    result = extract_with_gemini(image_bytes)
-    logger.info(f"Returning result keys: {list(result.keys())}")
-    return JSONResponse(content=result)
+    start = time.perf_counter()
+    key = cache_key(image_bytes)
+    result, tier = await cache_lookup(key)
+    saved = (0.0, 0.0)
+    if result is not None:
+        answered_by = "cache"
+        saved = tier_stats.record_saved("cache", (time.perf_counter() - start) * 1000)
+    else:
+        try:
+            result, answered_by, elapsed_ms = await asyncio.wait_for(
+                run_blocking(extract_tiered, image_bytes, request_deadline()), timeout=OCR_REQUEST_TIMEOUT
+            )
+        except (asyncio.TimeoutError, ModelTimeout):
+            logger.error(f"OCR timed out after {OCR_REQUEST_TIMEOUT}s for {file.filename!r}")
+            raise HTTPException(status_code=504, detail=TIMEOUT_ERROR)
+        if answered_by == "local":
+            saved = tier_stats.record_saved("local", elapsed_ms)
+        else:
+            # Local answers are cheap to recompute; only Gemini's are cached
+            await cache_store(key, result)
+
+    logger.info(
+        f"Returning result keys: {list(result.keys())} (tier: {answered_by}, cache: {tier or 'miss'}, "
+        f"saved ${saved[0]:.6f} / {saved[1]:.0f} ms)"
+    )
+    # X-Cache: HIT-MEMORY / HIT-DISK / MISS
+    headers = {"X-Cache": f"HIT-{tier.upper()}" if tier else "MISS", **tier_headers(answered_by, saved)}
+    return JSONResponse(content=result, headers=headers)
+
+
+# ---------- Batch OCR Endpoint ----------
+@app.post("/extract/batch")
+async def extract_certificates(files: List[UploadFile] = File(...)):
+    """
+    Upload several certificate images in one call.
+    Returns {"results": [...]} in input order; each item has "index",
+    "filename", "cached" ("memory", "disk" or false), "tier" ("cache",
+    "local" or "gemini") plus either "data" (extracted fields) or "error".
+    """
+    if len(files) > OCR_MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. At most {OCR_MAX_BATCH_FILES} images per batch.",
+        )
+
+    results = {}
+    cached = {}
+    tiers = {}
+    keys = {}
+    pending = []
+    for index, file in enumerate(files):
+        if not file.content_type or not file.content_type.startswith("image/"):
+            results[index] = {"error": f"Only image files are supported. Received: {file.content_type}"}
+            continue
+        try:
+            image_bytes = await read_upload(file)
+        except UploadTooLarge as e:
+            results[index] = {"error": str(e)}
+            continue
+        keys[index] = cache_key(image_bytes)
+        result, tier = await cache_lookup(keys[index])
+        if result is not None:
+            results[index], cached[index], tiers[index] = result, tier, "cache"
+            tier_stats.record_saved("cache", 0.0)
+        else:
+            pending.append((index, image_bytes))
+
+    # Local tier first; only what it cannot answer is sent to Gemini
+    local_fallthrough_ms = 0.0
+    if pending and local_tier_enabled():
+        local = await asyncio.gather(
+            *(run_blocking(extract_locally_from_bytes, image_bytes) for _, image_bytes in pending)
+        )
+        remaining = []
+        for (index, image_bytes), (fields, elapsed_ms) in zip(pending, local):
+            if fields is None:
+                remaining.append((index, image_bytes))
+                local_fallthrough_ms += elapsed_ms
+                continue
+            results[index], tiers[index] = fields, "local"
+            tier_stats.record_saved("local", elapsed_ms)
+        pending = remaining
+    logger.info(
+        f"Batch received: {len(files)} files, {len(cached)} cached, "
+        f"{list(tiers.values()).count('local')} local, {len(pending)} to Gemini"
+    )
+
+    deadline = request_deadline()
+
+    async def run_group(group):
+        try:
+            return await asyncio.wait_for(extract_group(group, deadline), timeout=OCR_REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, ModelTimeout):
+            logger.error(f"OCR batch group timed out after {OCR_REQUEST_TIMEOUT}s")
+            return {index: {"error": TIMEOUT_ERROR} for index, _ in group}
+
+    size = max(1, OCR_BATCH_SIZE)
+    groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+    for group_results in await asyncio.gather(*(run_group(group) for group in groups)):
+        results.update(group_results)
+    for index, _ in pending:
+        tiers[index] = "gemini"
+        await cache_store(keys[index], results[index])
+    if pending:
+        tier_stats.record_gemini(None, local_fallthrough_ms, count=len(pending))  # packed calls are not timed per image
+
+    items = []
+    for index, file in enumerate(files):
+        result = results[index]
+        item = {
+            "index": index, "filename": file.filename,
+            "cached": cached.get(index, False), "tier": tiers.get(index),
+        }
+        if "error" in result:
+            item["error"] = result["error"]
+        else:
+            item["data"] = result
+        items.append(item)
+    return JSONResponse(content={"results": items})
@@ -7,8 +7,10 @@ from flask_migrate import Migrate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from models import db
+from storage import init_storage
 from config import config_by_name
 from middleware.error_handler import register_error_handlers
+from utils.file_utils import UploadRequest
 
 # Shared limiter instance — initialized with app in create_app()
 limiter = Limiter(key_func=get_remote_address, default_limits=[])
@@ -32,6 +34,7 @@ logger = logging.getLogger(__name__)
 def create_app(config_name='default'):
     """Application factory — creates and configures the Flask application."""
     app = Flask(__name__)
+    app.request_class = UploadRequest
 
     # Load configuration
     config_class = config_by_name.get(config_name, config_by_name['default'])
@@ -39,6 +42,7 @@ def create_app(config_name='default'):
 
     # Initialize extensions
     db.init_app(app)
+    init_storage(app)
     Migrate(app, db)
     limiter.init_app(app)
     CORS(app, resources={
@@ -65,6 +69,10 @@ def create_app(config_name='default'):
     # Register global error handlers
     register_error_handlers(app)
 
+    # Register CLI commands
+    from cli import register_commands
+    register_commands(app)
+
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health_check():
@@ -95,6 +103,10 @@ def create_app(config_name='default'):
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         logger.info('Database tables created and upload folder ensured')
 
+    # Background cleanup of abandoned resumable upload sessions
+    from services.resumable_upload_service import start_session_cleanup
+    start_session_cleanup(app)
+
     return app
 
 
@@ -0,0 +1,66 @@
+"""Benchmark password hashing settings — logins/second per core.
+
+Usage (from backend/):
+    python -m benchmarks.password_hashing [--seconds 3] [--workers N]
+
+A "login" is one verify against a stored hash, which is what /api/auth/login
+pays per request. Each setting is measured single-threaded and through a
+thread pool of --workers threads to show how well the KDF scales across cores.
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from services.password_service import hash_with, verify_with
+
+SETTINGS = [
+    ('scrypt', 16384),
+    ('scrypt', 32768),
+    ('pbkdf2', 300000),
+    ('pbkdf2', 600000),
+    ('bcrypt', 10),
+    ('bcrypt', 12),
+]
+
+PASSWORD = 'benchmark-password-123'
+
+
+def _run(stored_hash, seconds, workers):
+    """Run verifies for roughly `seconds` and return completed count and elapsed time."""
+    deadline = time.perf_counter() + seconds
+    count = 0
+
+    def loop():
+        done = 0
+        while time.perf_counter() < deadline:
+            verify_with(stored_hash, PASSWORD)
+            done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for done in pool.map(lambda _: loop(), range(workers)):
+            count += done
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    threads_label = f'{args.workers} threads/s'
+    print(f'{"scheme":<8} {"cost":>8} {"1 thread/s":>11} {threads_label:>13} {"per core/s":>10}')
+    for scheme, cost in SETTINGS:
+        stored = hash_with(PASSWORD, scheme, cost)
+        single, single_elapsed = _run(stored, args.seconds, 1)
+        multi, multi_elapsed = _run(stored, args.seconds, args.workers)
+        single_rate = single / single_elapsed
+        multi_rate = multi / multi_elapsed
+        print(f'{scheme:<8} {cost:>8} {single_rate:>11.1f} {multi_rate:>13.1f} '
+              f'{multi_rate / args.workers:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Benchmark region-of-interest cropping — image tokens, bytes and text kept.
+
+Usage (from backend/):
+    python -m benchmarks.roi_cropping [--count 20] [--fixtures DIR] [--live]
+
+The fixture set is --count synthetic certificates (seeded, so runs compare):
+a decorated border, a seal, a logo and a few lines of text at random
+positions. Images in --fixtures are added as they are. For every page the
+mosaic from build_roi_mosaic is compared with the full page on estimated
+Gemini image tokens (258 per 768x768 tile), PNG size and analysis time.
+"text kept" is the share of a synthetic page's text lines that lie wholly
+inside the mosaic's regions; it must stay at 100% for the same accuracy.
+
+With --live (needs GEMINI_API_KEY) both images are also sent to Gemini:
+exact token counts, call latency and whether the mosaic gave the same fields
+as the full page.
+"""
+import io
+import os
+import math
+import time
+import random
+import argparse
+from PIL import Image, ImageDraw, ImageFont
+from utils.layout_utils import find_text_regions, build_roi_mosaic
+
+TILE = 768
+TOKENS_PER_TILE = 258
+
+NAMES = ['Asha Rao', 'Rahul Deshmukh', 'Priya Kulkarni', 'Imran Shaikh', 'Neha Patil']
+INSTITUTIONS = ['Savitribai Phule Pune University', 'College of Engineering Pune', 'Institute of Technology Nashik']
+
+
+def estimate_tokens(img):
+    """Gemini image tokens: one tile for small images, else 258 per 768px tile."""
+    if max(img.size) <= 384:
+        return TOKENS_PER_TILE
+    return math.ceil(img.width / TILE) * math.ceil(img.height / TILE) * TOKENS_PER_TILE
+
+
+def _png_size(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.tell()
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has one bitmap size
+        return ImageFont.load_default()
+
+
+def make_fixture(seed):
+    """A synthetic certificate and the boxes of its text lines."""
+    rng = random.Random(seed)
+    width, height = rng.choice([(1600, 1130), (2200, 1560), (1240, 1754)])
+    img = Image.new('RGB', (width, height), (250, 246, 232))
+    draw = ImageDraw.Draw(img)
+
+    margin = rng.randint(20, 50)
+    for inset in (0, 18):
+        draw.rectangle(
+            (margin + inset, margin + inset, width - margin - inset, height - margin - inset),
+            outline=(130, 90, 30), width=rng.randint(4, 14)
+        )
+    seal = rng.randint(180, 260)
+    sx, sy = width - margin - seal - 80, height - margin - seal - 80
+    draw.ellipse((sx, sy, sx + seal, sy + seal), outline=(170, 30, 30), width=6)
+    draw.ellipse((sx + 25, sy + 25, sx + seal - 25, sy + seal - 25), outline=(170, 30, 30), width=3)
+    draw.rectangle((margin + 70, margin + 60, margin + 230, margin + 220), fill=(30, 70, 150))
+
+    name, institution = rng.choice(NAMES), rng.choice(INSTITUTIONS)
+    lines = [
+        (institution, 44), ('Provisional Degree Certificate', 34),
+        (f'Name: {name}', 30), (f'Roll No: {rng.randint(10000, 99999)}', 30),
+        (f'CGPA: {rng.uniform(6, 10):.2f}', 30), (f'Date of Issue: {rng.randint(1, 28):02d}/06/2023', 30),
+    ]
+    boxes = []
+    y = margin + 280
+    x = rng.randint(margin + 260, width // 3)
+    for text, size in lines:
+        box = draw.textbbox((x, y), text, font=_font(size))
+        draw.text((x, y), text, fill=(20, 20, 20), font=_font(size))
+        boxes.append(box)
+        y += int(size * rng.uniform(2.0, 2.8))
+    return img, boxes
+
+
+def text_kept(img, line_boxes):
+    """Share of text lines that lie wholly inside one detected region."""
+    regions = [box for row in find_text_regions(img) for box in row]
+    kept = 0
+    for left, top, right, bottom in line_boxes:
+        if any(r[0] <= left and r[1] <= top and r[2] >= right and r[3] >= bottom for r in regions):
+            kept += 1
+    return kept / len(line_boxes)
+
+
+def _live(model, img):
+    from services.validation_service import EXTRACTION_PROMPT, _gemini_fields
+    tokens = model.count_tokens([EXTRACTION_PROMPT, img]).total_tokens
+    start = time.perf_counter()
+    try:
+        fields = _gemini_fields(model, img)
+    except Exception as e:
+        fields = {'error': str(e)[:60]}
+    return tokens, time.perf_counter() - start, fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=20)
+    parser.add_argument('--fixtures', help='directory of extra certificate images')
+    parser.add_argument('--live', action='store_true', help='also call Gemini on page and mosaic')
+    args = parser.parse_args()
+
+    fixtures = [(f'synthetic-{i:02d}', *make_fixture(i)) for i in range(args.count)]
+    if args.fixtures:
+        for name in sorted(os.listdir(args.fixtures)):
+            with Image.open(os.path.join(args.fixtures, name)) as img:
+                fixtures.append((name, img.convert('RGB'), None))
+
+    model = None
+    if args.live:
+        from services.validation_service import get_genai_model
+        model = get_genai_model()
+        if model is None:
+            parser.error('--live needs GEMINI_API_KEY')
+
+    totals = {'page_tokens': 0, 'roi_tokens': 0, 'page_bytes': 0, 'roi_bytes': 0, 'fallbacks': 0}
+    print(f'{"fixture":<18} {"page":>11} {"mosaic":>11} {"tokens":>13} {"png KB":>13} {"ms":>6} {"text kept":>9}')
+    for name, img, line_boxes in fixtures:
+        start = time.perf_counter()
+        mosaic = build_roi_mosaic(img)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        sent = mosaic or img
+        totals['fallbacks'] += mosaic is None
+        page_tokens, roi_tokens = estimate_tokens(img), estimate_tokens(sent)
+        page_bytes, roi_bytes = _png_size(img), _png_size(sent)
+        for key, value in (('page_tokens', page_tokens), ('roi_tokens', roi_tokens),
+                           ('page_bytes', page_bytes), ('roi_bytes', roi_bytes)):
+            totals[key] += value
+        kept = f'{text_kept(img, line_boxes):.0%}' if line_boxes else '-'
+        print(f'{name[:18]:<18} {"x".join(map(str, img.size)):>11} {"x".join(map(str, sent.size)):>11} '
+              f'{page_tokens:>6}>{roi_tokens:<6} {page_bytes // 1024:>6}>{roi_bytes // 1024:<6} '
+              f'{elapsed_ms:>6.1f} {kept:>9}')
+
+        if model is not None:
+            page = _live(model, img)
+            roi = _live(model, sent)
+            print(f'{"  live":<18} tokens {page[0]}>{roi[0]}  latency {page[1]:.2f}s>{roi[1]:.2f}s  '
+                  f'same fields: {page[2] == roi[2]}')
+
+    print(f'\nestimated image tokens: {totals["page_tokens"]} -> {totals["roi_tokens"]} '
+          f'({1 - totals["roi_tokens"] / totals["page_tokens"]:.0%} fewer)')
+    print(f'PNG bytes: {totals["page_bytes"]} -> {totals["roi_bytes"]} '
+          f'({1 - totals["roi_bytes"] / totals["page_bytes"]:.0%} fewer)')
+    print(f'full-page fallbacks: {totals["fallbacks"]} of {len(fixtures)}')
+
+
+if __name__ == '__main__':
+    main()
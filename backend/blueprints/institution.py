@@ -93,6 +93,8 @@ def list_records(current_user):
 @institution_required
 def get_institution_stats(current_user):
     """Get statistics for the current institution dashboard."""
+    # Outside the try: a deleted user is answered with 401 by token_required
+    institution_name = current_user.name
     try:
         from models.result import Result
         import json
@@ -108,7 +110,7 @@ def get_institution_stats(current_user):
         return success_response(
             data={
                 'total_records': total_records,
-                'institution_name': current_user.name
+                'institution_name': institution_name
             },
             message='Institution stats retrieved successfully'
         )
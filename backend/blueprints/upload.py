@@ -1,7 +1,21 @@
 import logging
-from flask import Blueprint, request
-from services.upload_service import save_document, get_user_documents, get_document, delete_document
+from flask import Blueprint, request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.wsgi import get_input_stream
+from services.upload_service import (
+    save_document, save_documents, get_user_documents, get_document, delete_document, get_document_key
+)
+from services.download_service import send_stored_file, make_download_url, resolve_download_token
+from services.derivative_service import (
+    derivative_key, derivative_etag, derivative_mimetype, derivative_unavailable, enqueue_derivatives
+)
+from services.resumable_upload_service import (
+    create_upload_session, get_upload_session, write_chunk,
+    finalize_upload_session, cancel_upload_session
+)
 from middleware.auth_middleware import token_required
+from middleware.idempotency import idempotent
 from utils.response_utils import success_response, error_response, paginated_response
 
 logger = logging.getLogger(__name__)
@@ -11,6 +25,7 @@ upload_bp = Blueprint('upload', __name__)
 
 @upload_bp.route('/upload', methods=['POST'])
 @token_required
+@idempotent
 def upload_file(current_user):
     """Upload a document file."""
     if 'file' not in request.files:
@@ -34,6 +49,47 @@ def upload_file(current_user):
         return error_response('Upload failed', 'INTERNAL_ERROR', 500)
 
 
+@upload_bp.route('/upload/batch', methods=['POST'])
+@token_required
+def upload_batch(current_user):
+    """Upload many files (any number of `files` parts) in one request.
+
+    Query: ?validate=true also queues validation for every stored document.
+    """
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        return error_response('Expected a multipart/form-data body', 'BAD_REQUEST', 400)
+
+    validate = request.args.get('validate', 'false').lower() in ('1', 'true', 'yes')
+
+    # The body is parsed straight off the WSGI input with the batch size limit;
+    # MAX_CONTENT_LENGTH stays the limit for single-file requests
+    stream = get_input_stream(
+        request.environ, max_content_length=current_app.config['MAX_BATCH_UPLOAD_SIZE']
+    )
+
+    try:
+        results = save_documents(stream, boundary.encode('latin-1'), current_user.id, validate)
+    except RequestEntityTooLarge:
+        return error_response('Batch exceeds the maximum upload size', 'PAYLOAD_TOO_LARGE', 413)
+    except ValueError as e:
+        return error_response(str(e), 'VALIDATION_ERROR', 400)
+    except Exception as e:
+        logger.error(f'Batch upload error: {e}', exc_info=True)
+        return error_response('Upload failed', 'INTERNAL_ERROR', 500)
+
+    if not results:
+        return error_response('No files provided', 'BAD_REQUEST', 400)
+
+    stored = sum(1 for entry in results if entry['status'] == 'stored')
+    return success_response(
+        data={'files': results, 'stored': stored, 'rejected': len(results) - stored},
+        message=f'{stored} of {len(results)} files uploaded',
+        status_code=201 if stored else 200
+    )
+
+
 @upload_bp.route('/upload/list', methods=['GET'])
 @token_required
 def list_files(current_user):
@@ -68,6 +124,94 @@ def get_file(current_user, doc_id):
         return error_response('Failed to retrieve document', 'INTERNAL_ERROR', 500)
 
 
+@upload_bp.route('/upload/<int:doc_id>/download', methods=['GET'])
+@token_required
+def download_file(current_user, doc_id):
+    """Download the original uploaded file (supports Range requests)."""
+    try:
+        document = get_document(doc_id, current_user.id)
+        return send_stored_file(get_document_key(document), download_name=document.filename)
+    except ValueError as e:
+        msg = str(e)
+        if msg == 'NOT_FOUND':
+            return error_response('Document not found', 'NOT_FOUND', 404)
+        if msg == 'FORBIDDEN':
+            return error_response('Access denied', 'FORBIDDEN', 403)
+        return error_response(msg, 'ERROR', 400)
+    except FileNotFoundError:
+        return error_response('File not found in storage', 'NOT_FOUND', 404)
+    except Exception as e:
+        logger.error(f'Download error: {e}', exc_info=True)
+        return error_response('Download failed', 'INTERNAL_ERROR', 500)
+
+
+@upload_bp.route('/upload/<int:doc_id>/thumbnail', methods=['GET'])
+@token_required
+def thumbnail(current_user, doc_id):
+    """Get the document's thumbnail (first page for PDFs), with cache validators."""
+    try:
+        document = get_document(doc_id, current_user.id)
+        source_key = get_document_key(document)
+    except ValueError as e:
+        msg = str(e)
+        if msg == 'NOT_FOUND':
+            return error_response('Document not found', 'NOT_FOUND', 404)
+        if msg == 'FORBIDDEN':
+            return error_response('Access denied', 'FORBIDDEN', 403)
+        return error_response(msg, 'ERROR', 400)
+
+    try:
+        return send_stored_file(
+            derivative_key(source_key),
+            download_name=f'thumbnail_{doc_id}',
+            mimetype=derivative_mimetype(),
+            as_attachment=False,
+            etag=derivative_etag(source_key),
+            max_age=current_app.config['THUMBNAIL_MAX_AGE']
+        )
+    except FileNotFoundError:
+        # Generation already failed (e.g. a PDF without PyMuPDF): don't queue it again
+        if derivative_unavailable(source_key):
+            return error_response('No thumbnail can be generated for this document', 'THUMBNAIL_UNAVAILABLE', 404)
+        # Not generated yet — queue it and let the client retry
+        enqueue_derivatives(source_key, document.file_type)
+        return error_response('Thumbnail is not available yet', 'THUMBNAIL_PENDING', 404)
+    except Exception as e:
+        logger.error(f'Thumbnail error: {e}', exc_info=True)
+        return error_response('Failed to retrieve thumbnail', 'INTERNAL_ERROR', 500)
+
+
+@upload_bp.route('/upload/<int:doc_id>/download-url', methods=['GET'])
+@token_required
+def download_url(current_user, doc_id):
+    """Get a short-lived signed URL for the original file (usable without a token)."""
+    try:
+        document = get_document(doc_id, current_user.id)
+        url, expires_in = make_download_url(get_document_key(document), document.filename)
+        return success_response(data={'url': url, 'expires_in': expires_in})
+    except ValueError as e:
+        msg = str(e)
+        if msg == 'NOT_FOUND':
+            return error_response('Document not found', 'NOT_FOUND', 404)
+        if msg == 'FORBIDDEN':
+            return error_response('Access denied', 'FORBIDDEN', 403)
+        return error_response(msg, 'ERROR', 400)
+
+
+@upload_bp.route('/files/<token>', methods=['GET'])
+def signed_download(token):
+    """Serve a file through a signed URL issued by /upload/<id>/download-url."""
+    try:
+        key, download_name, mimetype = resolve_download_token(token)
+        return send_stored_file(key, download_name, mimetype)
+    except ValueError as e:
+        if str(e) == 'EXPIRED':
+            return error_response('Download link has expired', 'AUTH_ERROR', 401)
+        return error_response('Download link is invalid', 'AUTH_ERROR', 401)
+    except FileNotFoundError:
+        return error_response('File not found in storage', 'NOT_FOUND', 404)
+
+
 @upload_bp.route('/upload/<int:doc_id>', methods=['DELETE'])
 @token_required
 def delete_file(current_user, doc_id):
@@ -85,3 +229,103 @@ def delete_file(current_user, doc_id):
     except Exception as e:
         logger.error(f'Delete error: {e}', exc_info=True)
         return error_response('Delete failed', 'INTERNAL_ERROR', 500)
+
+
+# ────────────────────────────────────────────────────────────
+# Resumable Uploads
+# ────────────────────────────────────────────────────────────
+
+def _session_error(e):
+    """Map resumable upload service errors to API responses."""
+    msg = str(e)
+    if msg == 'NOT_FOUND':
+        return error_response('Upload session not found', 'NOT_FOUND', 404)
+    if msg == 'FORBIDDEN':
+        return error_response('Access denied', 'FORBIDDEN', 403)
+    if msg == 'OFFSET_MISMATCH':
+        return error_response('Chunk offset does not match the current upload offset', 'OFFSET_MISMATCH', 409)
+    if msg == 'INCOMPLETE':
+        return error_response('Upload is not complete yet', 'INCOMPLETE', 409)
+    if msg == 'SESSION_BUSY':
+        return error_response('Another request is using this upload session', 'SESSION_BUSY', 409)
+    return error_response(msg, 'VALIDATION_ERROR', 400)
+
+
+def _session_response(session, message=None, status_code=200):
+    response, status = success_response(data={'session': session}, message=message, status_code=status_code)
+    response.headers['Upload-Offset'] = str(session['offset'])
+    response.headers['Upload-Length'] = str(session['total_size'])
+    return response, status
+
+
+@upload_bp.route('/upload/sessions', methods=['POST'])
+@token_required
+def create_session(current_user):
+    """Start a resumable upload. Body: {"filename": ..., "size": <bytes>}."""
+    data = request.get_json(silent=True)
+    if not data:
+        return error_response('Request body is required', 'BAD_REQUEST', 400)
+
+    try:
+        session = create_upload_session(current_user.id, data.get('filename'), data.get('size'))
+        return _session_response(session, 'Upload session created', 201)
+    except ValueError as e:
+        return _session_error(e)
+    except Exception as e:
+        logger.error(f'Create upload session error: {e}', exc_info=True)
+        return error_response('Failed to create upload session', 'INTERNAL_ERROR', 500)
+
+
+@upload_bp.route('/upload/sessions/<session_id>', methods=['GET'])
+@token_required
+def get_session(current_user, session_id):
+    """Get the current offset of a resumable upload."""
+    try:
+        session = get_upload_session(session_id, current_user.id)
+        return _session_response(session.to_dict())
+    except ValueError as e:
+        return _session_error(e)
+
+
+@upload_bp.route('/upload/sessions/<session_id>', methods=['PUT'])
+@token_required
+def upload_chunk(current_user, session_id):
+    """Append a raw chunk at the offset given in the Upload-Offset header."""
+    offset = request.headers.get('Upload-Offset', type=int)
+    try:
+        session = write_chunk(session_id, current_user.id, offset, request.stream)
+        return _session_response(session)
+    except ValueError as e:
+        return _session_error(e)
+    except Exception as e:
+        logger.error(f'Upload chunk error: {e}', exc_info=True)
+        return error_response('Failed to store chunk', 'INTERNAL_ERROR', 500)
+
+
+@upload_bp.route('/upload/sessions/<session_id>/complete', methods=['POST'])
+@token_required
+def complete_session(current_user, session_id):
+    """Finalize a fully received upload into a document."""
+    try:
+        document = finalize_upload_session(session_id, current_user.id)
+        return success_response(
+            data={'document': document},
+            message='File uploaded successfully',
+            status_code=201
+        )
+    except ValueError as e:
+        return _session_error(e)
+    except Exception as e:
+        logger.error(f'Finalize upload error: {e}', exc_info=True)
+        return error_response('Upload failed', 'INTERNAL_ERROR', 500)
+
+
+@upload_bp.route('/upload/sessions/<session_id>', methods=['DELETE'])
+@token_required
+def cancel_session(current_user, session_id):
+    """Abort a resumable upload."""
+    try:
+        cancel_upload_session(session_id, current_user.id)
+        return success_response(message='Upload session cancelled')
+    except ValueError as e:
+        return _session_error(e)
@@ -1,19 +1,44 @@
-import os
 import logging
-from flask import Blueprint, request, send_file
+from flask import Blueprint, request, current_app, Response, stream_with_context
 from app import limiter
-from services.validation_service import validate_document, get_result, get_validation_history, revalidate_document
-from services.report_service import generate_validation_report
+from services.validation_service import (
+    validate_document, get_result, get_validation_history, revalidate_document, upload_and_validate
+)
+from services.report_service import ensure_report, render_report, get_report_etag
+from services.download_service import send_stored_file, send_generated_file, make_download_url
+from services.export_service import (
+    collect_export, iter_report_zip, start_export_job, get_export_job, get_export_key,
+    build_history_filters, iter_history_rows, iter_history_export, HISTORY_FORMATS
+)
 from middleware.auth_middleware import token_required
+from middleware.idempotency import idempotent
 from utils.response_utils import success_response, error_response, paginated_response
 
 logger = logging.getLogger(__name__)
 
 validation_bp = Blueprint('validation', __name__)
 
+# Content types of the history export formats
+HISTORY_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _in_progress_response():
+    response = current_app.make_response(error_response(
+        'This document is already being validated. Try again shortly.', 'VALIDATION_IN_PROGRESS', 409
+    ))
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+def _deadline_response():
+    return error_response(
+        'Validation did not finish in time. Try again later.', 'VALIDATION_TIMEOUT', 504
+    )
+
 
 @validation_bp.route('/validate/<int:doc_id>', methods=['POST'])
 @token_required
+@idempotent
 @limiter.limit('10 per minute')
 def validate(current_user, doc_id):
     """Run AI validation pipeline on a document."""
@@ -30,13 +55,66 @@ def validate(current_user, doc_id):
         if msg == 'FORBIDDEN':
             return error_response('Access denied', 'FORBIDDEN', 403)
         if msg == 'USAGE_LIMIT_REACHED':
-            return error_response('Validation limit reached (10 max). Please upgrade to paid.', 'USAGE_LIMIT_REACHED', 403)
+            limit = current_app.config['FREE_VALIDATION_LIMIT']
+            return error_response(f'Validation limit reached ({limit} max). Please upgrade to paid.', 'USAGE_LIMIT_REACHED', 403)
+        if msg == 'VALIDATION_IN_PROGRESS':
+            return _in_progress_response()
+        if msg == 'DEADLINE_EXCEEDED':
+            return _deadline_response()
         return error_response(msg, 'ERROR', 400)
     except Exception as e:
         logger.error(f'Validation error: {e}', exc_info=True)
         return error_response('Validation failed', 'INTERNAL_ERROR', 500)
 
 
+@validation_bp.route('/validate', methods=['POST'])
+@token_required
+@idempotent
+@limiter.limit('10 per minute')
+def upload_validate(current_user):
+    """Upload a document and validate it in one request.
+
+    Query: ?async=true returns 202 with the document as a job handle; poll
+    GET /api/results/<id> for the result.
+    """
+    if 'file' not in request.files:
+        return error_response('No file provided', 'BAD_REQUEST', 400)
+
+    file = request.files['file']
+    if file.filename == '':
+        return error_response('No file selected', 'BAD_REQUEST', 400)
+
+    run_async = request.args.get('async', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        document, result = upload_and_validate(file, current_user, run_async)
+    except ValueError as e:
+        msg = str(e)
+        if msg == 'USAGE_LIMIT_REACHED':
+            limit = current_app.config['FREE_VALIDATION_LIMIT']
+            return error_response(f'Validation limit reached ({limit} max). Please upgrade to paid.', 'USAGE_LIMIT_REACHED', 403)
+        if msg == 'VALIDATION_IN_PROGRESS':
+            return _in_progress_response()
+        if msg == 'DEADLINE_EXCEEDED':
+            return _deadline_response()
+        return error_response(msg, 'VALIDATION_ERROR', 400)
+    except Exception as e:
+        logger.error(f'Upload-and-validate error: {e}', exc_info=True)
+        return error_response('Validation failed', 'INTERNAL_ERROR', 500)
+
+    if run_async:
+        return success_response(
+            data={'document': document, 'status_url': f"/api/results/{document['id']}"},
+            message='Document uploaded, validation queued',
+            status_code=202
+        )
+    return success_response(
+        data={'document': document, 'result': result},
+        message='Validation complete',
+        status_code=201
+    )
+
+
 @validation_bp.route('/validate/<int:doc_id>', methods=['PUT'])
 @token_required
 def revalidate(current_user, doc_id):
@@ -53,6 +131,10 @@ def revalidate(current_user, doc_id):
             return error_response('Document not found', 'NOT_FOUND', 404)
         if msg == 'FORBIDDEN':
             return error_response('Access denied', 'FORBIDDEN', 403)
+        if msg == 'VALIDATION_IN_PROGRESS':
+            return _in_progress_response()
+        if msg == 'DEADLINE_EXCEEDED':
+            return _deadline_response()
         return error_response(msg, 'ERROR', 400)
     except Exception as e:
         logger.error(f'Re-validation error: {e}', exc_info=True)
@@ -104,6 +186,37 @@ def history(current_user):
         logger.error(f'History error: {e}', exc_info=True)
         return error_response('Failed to retrieve history', 'INTERNAL_ERROR', 500)
 
+
+@validation_bp.route('/history/export', methods=['GET'])
+@token_required
+def export_history(current_user):
+    """Stream the full validation history as CSV or NDJSON.
+
+    Query: format=csv|ndjson, verdict, from/to (YYYY-MM-DD, inclusive),
+    min_score/max_score (0-1). Filtering happens in SQL and rows are streamed,
+    so memory use does not depend on the size of the history.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in HISTORY_FORMATS:
+        return error_response('Invalid format. Must be csv or ndjson.', 'VALIDATION_ERROR', 400)
+
+    try:
+        conditions = build_history_filters(
+            verdict=request.args.get('verdict'),
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            min_score=request.args.get('min_score'),
+            max_score=request.args.get('max_score')
+        )
+    except ValueError as e:
+        return error_response(str(e), 'VALIDATION_ERROR', 400)
+
+    rows = iter_history_rows(current_user.id, conditions)
+    response = Response(stream_with_context(iter_history_export(rows, fmt)), mimetype=HISTORY_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="validation_history.{fmt}"'
+    return response
+
+
 @validation_bp.route('/results/<int:doc_id>/report', methods=['GET'])
 @token_required
 def download_report(current_user, doc_id):
@@ -119,19 +232,105 @@ def download_report(current_user, doc_id):
         if not document.result:
              return error_response('Document not validated yet', 'NOT_VALIDATED', 400)
 
-        # Generate report to a temporary path
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        report_path = os.path.join(temp_dir, f"report_{doc_id}.pdf")
-        
-        generate_validation_report(document, document.result, report_path)
-
-        return send_file(
-            report_path,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f"Validation_Report_{document.filename}.pdf"
-        )
+        result = document.result
+        validators = {
+            'download_name': f"Validation_Report_{document.filename}.pdf",
+            'mimetype': 'application/pdf',
+            'etag': get_report_etag(result),
+            'last_modified': result.validated_at
+        }
+        if current_app.config.get('DOWNLOAD_OFFLOAD', 'none') != 'none':
+            # Persist once into storage, then hand the transfer to the offload layer
+            return send_stored_file(ensure_report(document, result), **validators)
+        # Served from the in-process report cache; rendered only on a miss
+        return send_generated_file(lambda: render_report(document, result), **validators)
     except Exception as e:
         logger.error(f'Report download error: {e}', exc_info=True)
         return error_response('Failed to generate report', 'INTERNAL_ERROR', 500)
+
+
+EXPORT_DOWNLOAD_NAME = 'validation_reports.zip'
+
+
+@validation_bp.route('/results/export', methods=['POST'])
+@token_required
+def export_reports(current_user):
+    """Export PDF reports plus a CSV summary as one ZIP.
+
+    Body (optional): {"document_ids": [...]}; defaults to every validated document.
+    Small exports stream directly; large ones (or ?async=true) run as a job.
+    """
+    data = request.get_json(silent=True) or {}
+    run_async = request.args.get('async', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        snapshots = collect_export(current_user, data.get('document_ids'))
+    except ValueError as e:
+        msg = str(e)
+        if msg == 'NO_RESULTS':
+            return error_response('No validated documents to export', 'NOT_FOUND', 404)
+        if msg == 'TOO_MANY':
+            limit = current_app.config['REPORT_EXPORT_MAX']
+            return error_response(f'Too many reports in one export ({limit} max)', 'VALIDATION_ERROR', 400)
+        if msg == 'INVALID_IDS':
+            return error_response('document_ids must be a list of integers', 'VALIDATION_ERROR', 400)
+        return error_response(msg, 'ERROR', 400)
+
+    workers = current_app.config['REPORT_EXPORT_WORKERS']
+    try:
+        if run_async or len(snapshots) > current_app.config['REPORT_EXPORT_SYNC_LIMIT']:
+            job = start_export_job(current_user.id, snapshots)
+            return success_response(
+                data={'job': job.to_dict(), 'status_url': f'/api/results/export/{job.id}'},
+                message='Export started',
+                status_code=202
+            )
+
+        response = Response(stream_with_context(iter_report_zip(snapshots, workers)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename="{EXPORT_DOWNLOAD_NAME}"'
+        return response
+    except Exception as e:
+        logger.error(f'Report export error: {e}', exc_info=True)
+        return error_response('Export failed', 'INTERNAL_ERROR', 500)
+
+
+def _export_job_error(e):
+    msg = str(e)
+    if msg == 'NOT_FOUND':
+        return error_response('Export job not found', 'NOT_FOUND', 404)
+    if msg == 'FORBIDDEN':
+        return error_response('Access denied', 'FORBIDDEN', 403)
+    return error_response(msg, 'ERROR', 400)
+
+
+@validation_bp.route('/results/export/<job_id>', methods=['GET'])
+@token_required
+def export_status(current_user, job_id):
+    """Get a background export's progress, with a download URL once done."""
+    try:
+        job = get_export_job(job_id, current_user.id)
+    except ValueError as e:
+        return _export_job_error(e)
+
+    data = {'job': job.to_dict()}
+    if job.status == 'done':
+        url, expires_in = make_download_url(get_export_key(job.id), EXPORT_DOWNLOAD_NAME, 'application/zip')
+        data.update(download_url=url, expires_in=expires_in)
+    return success_response(data=data)
+
+
+@validation_bp.route('/results/export/<job_id>/download', methods=['GET'])
+@token_required
+def export_download(current_user, job_id):
+    """Download a finished background export."""
+    try:
+        job = get_export_job(job_id, current_user.id)
+    except ValueError as e:
+        return _export_job_error(e)
+
+    if job.status != 'done':
+        return error_response('Export is not ready yet', 'NOT_READY', 409)
+    try:
+        return send_stored_file(get_export_key(job.id), download_name=EXPORT_DOWNLOAD_NAME, mimetype='application/zip')
+    except FileNotFoundError:
+        return error_response('Export file not found', 'NOT_FOUND', 404)
@@ -0,0 +1,52 @@
+import click
+from flask.cli import AppGroup
+
+storage_cli = AppGroup('storage', help='Manage uploaded file storage.')
+
+
+@storage_cli.command('gc')
+@click.option('--grace', type=int, default=None,
+              help='Seconds a blob must be unreferenced before removal (default: BLOB_GC_GRACE_SECONDS).')
+def storage_gc(grace):
+    """Reclaim blobs that are no longer referenced by any document."""
+    from services.blob_service import collect_garbage
+    stats = collect_garbage(grace)
+    click.echo(
+        f"Removed {stats['blobs_removed']} blobs ({stats['bytes_freed']} bytes) "
+        f"and {stats['orphans_removed']} orphaned files."
+    )
+
+
+@storage_cli.command('migrate-layout')
+@click.option('--batch-size', type=int, default=500, show_default=True,
+              help='Files moved per batch.')
+@click.option('--pause', type=float, default=0.5, show_default=True,
+              help='Seconds to sleep between batches to limit I/O pressure.')
+@click.option('--max-batches', type=int, default=None,
+              help='Stop after this many batches (rerun to resume).')
+def storage_migrate_layout(batch_size, pause, max_batches):
+    """Move files from the flat uploads folder into the sharded ab/cd/<name> layout."""
+    import time
+    from flask import current_app
+    from utils.file_utils import get_blob_dir, migrate_flat_files
+
+    total = 0
+    batches = 0
+    for base_dir in (current_app.config['UPLOAD_FOLDER'], get_blob_dir()):
+        while max_batches is None or batches < max_batches:
+            moved = migrate_flat_files(base_dir, batch_size)
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            click.echo(f'Moved {moved} files from {base_dir} ({total} total)')
+            time.sleep(pause)
+    if max_batches is not None and batches >= max_batches:
+        click.echo(f'Stopped after {batches} batches ({total} files moved); rerun to resume.')
+    else:
+        click.echo(f'Migration finished: {total} files moved in {batches} batches.')
+
+
+def register_commands(app):
+    """Register CLI command groups on the Flask app."""
+    app.cli.add_command(storage_cli)
@@ -19,9 +19,108 @@ class Config:
         UPLOAD_FOLDER = _upload_env or os.path.join(_BASE_DIR, 'uploads')
 
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_FILE_SIZE_MB', '16')) * 1024 * 1024
+    MAX_FILE_SIZE = MAX_CONTENT_LENGTH
+
+    # Resumable uploads — files are sent in chunks, each within MAX_CONTENT_LENGTH
+    MAX_RESUMABLE_FILE_SIZE = int(os.getenv('MAX_RESUMABLE_FILE_SIZE_MB', '512')) * 1024 * 1024
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))
+    UPLOAD_SESSION_CLEANUP_INTERVAL = int(os.getenv('UPLOAD_SESSION_CLEANUP_INTERVAL', '900'))
+    # A chunk request's claim on its byte range lapses after this many seconds
+    UPLOAD_CHUNK_TIMEOUT = int(os.getenv('UPLOAD_CHUNK_TIMEOUT', '300'))
+
+    # File storage driver: local (UPLOAD_FOLDER), s3 (S3-compatible object
+    # store, requires boto3) or memory (in-process fake, for tests/dev only)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+    S3_BUCKET = os.getenv('S3_BUCKET')
+    S3_PREFIX = os.getenv('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL')
+    S3_REGION = os.getenv('S3_REGION')
+    S3_ACCESS_KEY_ID = os.getenv('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.getenv('S3_SECRET_ACCESS_KEY')
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32'))
+    S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD_MB', '8')) * 1024 * 1024
+    S3_MULTIPART_PART_SIZE = int(os.getenv('S3_MULTIPART_PART_SIZE_MB', '8')) * 1024 * 1024
+
+    # Download offload: none (Python streams, Range via send_file), x-accel
+    # (nginx X-Accel-Redirect), x-sendfile (Apache/lighttpd) or redirect (signed
+    # object-storage URL). X_ACCEL_PREFIX is the nginx internal location
+    # aliased to UPLOAD_FOLDER.
+    DOWNLOAD_OFFLOAD = os.getenv('DOWNLOAD_OFFLOAD', 'none')
+    X_ACCEL_PREFIX = os.getenv('X_ACCEL_PREFIX', '/protected-uploads/')
+    USE_X_SENDFILE = DOWNLOAD_OFFLOAD == 'x-sendfile'
+    SIGNED_URL_TTL = int(os.getenv('SIGNED_URL_TTL', '300'))
+
+    # Thumbnails generated in the background after upload (0 workers = inline)
+    THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '256'))
+    THUMBNAIL_FORMAT = os.getenv('THUMBNAIL_FORMAT', 'webp')
+    THUMBNAIL_MAX_AGE = int(os.getenv('THUMBNAIL_MAX_AGE', str(7 * 24 * 3600)))
+    DERIVATIVE_WORKERS = int(os.getenv('DERIVATIVE_WORKERS', '2'))
+
+    # OCR service (AI Model/OCR_api). When set, the pipeline's OCR step calls its
+    # /extract/ over a pooled keep-alive session instead of Gemini directly.
+    OCR_SERVICE_URL = os.getenv('OCR_SERVICE_URL', '')
+    OCR_SERVICE_CONNECT_TIMEOUT = float(os.getenv('OCR_SERVICE_CONNECT_TIMEOUT', '3'))
+    OCR_SERVICE_TIMEOUT = float(os.getenv('OCR_SERVICE_TIMEOUT', '60'))
+    OCR_SERVICE_RETRIES = int(os.getenv('OCR_SERVICE_RETRIES', '2'))
+    OCR_SERVICE_BACKOFF = float(os.getenv('OCR_SERVICE_BACKOFF', '0.5'))
+    OCR_SERVICE_POOL_SIZE = int(os.getenv('OCR_SERVICE_POOL_SIZE', '10'))
+
+    # Send Gemini a mosaic of the page's text regions instead of the whole page
+    # (full page as fallback). The mosaic is used only if it is at most
+    # OCR_ROI_MAX_AREA of the page area.
+    OCR_ROI_CROPPING = os.getenv('OCR_ROI_CROPPING', 'true').lower() == 'true'
+    OCR_ROI_MAX_AREA = float(os.getenv('OCR_ROI_MAX_AREA', '0.7'))
+
+    # Rendered validation reports kept in memory (entries, LRU eviction)
+    REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '128'))
+
+    # Bulk report export: render processes (0 = inline), exports above the sync
+    # limit run as background jobs, hard cap per export
+    REPORT_EXPORT_WORKERS = int(os.getenv('REPORT_EXPORT_WORKERS', str(os.cpu_count() or 1)))
+    REPORT_EXPORT_SYNC_LIMIT = int(os.getenv('REPORT_EXPORT_SYNC_LIMIT', '50'))
+    REPORT_EXPORT_MAX = int(os.getenv('REPORT_EXPORT_MAX', '5000'))
+
+    # Batch upload (POST /api/upload/batch): total request size, file count and
+    # workers for the validation jobs it can enqueue (0 workers = inline)
+    MAX_BATCH_UPLOAD_SIZE = int(os.getenv('MAX_BATCH_UPLOAD_SIZE_MB', '512')) * 1024 * 1024
+    MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', '500'))
+    VALIDATION_WORKERS = int(os.getenv('VALIDATION_WORKERS', '2'))
+    # Threads running independent pipeline stages (CNN, OCR, ...) side by side
+    # (0 = one stage at a time on the request thread)
+    PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', '4'))
+    # Seconds a validation may take end to end. Stages get budgets from the time
+    # left; stages that run out are skipped and the result is marked partial.
+    VALIDATION_DEADLINE = float(os.getenv('VALIDATION_DEADLINE', '30'))
+
+    # Concurrent validations of one document are coalesced. The runner holds a
+    # lease row for up to VALIDATION_LEASE_TTL seconds; others poll every
+    # VALIDATION_LEASE_POLL seconds and give up (409) after VALIDATION_WAIT_TIMEOUT.
+    VALIDATION_LEASE_TTL = int(os.getenv('VALIDATION_LEASE_TTL', '300'))
+    VALIDATION_LEASE_POLL = float(os.getenv('VALIDATION_LEASE_POLL', '0.5'))
+    VALIDATION_WAIT_TIMEOUT = float(os.getenv('VALIDATION_WAIT_TIMEOUT', '120'))
+
+    # Responses to POSTs sent with an Idempotency-Key are replayed for this long
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24')) * 3600
+
+    # Unreferenced blobs are kept this long before `flask storage gc` reclaims them
+    BLOB_GC_GRACE_SECONDS = int(os.getenv('BLOB_GC_GRACE_SECONDS', '3600'))
     ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png'}
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Principal cache used by token_required (seconds / max cached users). Other
+    # worker processes see role changes and deletions after at most the TTL
+    # (0 = no cache).
+    PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', '10'))
+    PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', '4096'))
+
+    # Number of validations a free 'user' account may run
+    FREE_VALIDATION_LIMIT = int(os.getenv('FREE_VALIDATION_LIMIT', '10'))
+
+    # Password hashing — scheme is scrypt, pbkdf2 or bcrypt; cost defaults per scheme
+    PASSWORD_HASH_SCHEME = os.getenv('PASSWORD_HASH_SCHEME', 'scrypt')
+    PASSWORD_HASH_COST = int(os.getenv('PASSWORD_HASH_COST', '0')) or None
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '0')) or None
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -41,6 +140,11 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
+    RATELIMIT_ENABLED = False
+    UPLOAD_SESSION_CLEANUP_INTERVAL = 0
+    DERIVATIVE_WORKERS = 0
+    VALIDATION_WORKERS = 0
+    REPORT_EXPORT_WORKERS = 0
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     UPLOAD_FOLDER = os.path.join(Config._BASE_DIR, 'test_uploads')
 
@@ -1,8 +1,8 @@
 from functools import wraps
 from flask import request, current_app
 import jwt
-from models import db
-from models.user import User
+from werkzeug.exceptions import Unauthorized
+from services.auth_service import get_principal
 from utils.response_utils import error_response
 
 
@@ -29,7 +29,7 @@ def token_required(f):
             user_id = payload.get('user_id')
             if not user_id:
                 return error_response('Token payload is invalid', 'AUTH_ERROR', 401)
-            current_user = db.session.get(User, user_id)
+            current_user = get_principal(user_id)
             if current_user is None:
                 return error_response('User not found', 'AUTH_ERROR', 401)
         except jwt.ExpiredSignatureError:
@@ -37,7 +37,11 @@ def token_required(f):
         except jwt.InvalidTokenError:
             return error_response('Token is invalid', 'AUTH_ERROR', 401)
 
-        return f(current_user, *args, **kwargs)
+        try:
+            return f(current_user, *args, **kwargs)
+        except Unauthorized:
+            # The cached principal's user was deleted in another process
+            return error_response('User not found', 'AUTH_ERROR', 401)
     return decorated
 
 
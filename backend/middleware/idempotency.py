@@ -0,0 +1,67 @@
+from functools import wraps
+from flask import request, current_app
+from services.idempotency_service import request_fingerprint, claim_key, complete_key, release_key
+from utils.response_utils import error_response
+
+# Statuses that mean "not now" rather than a final answer; a retry with the
+# same key must run again instead of replaying them.
+TRANSIENT_STATUSES = (409, 423, 429)
+
+
+def _is_final(response):
+    if response.is_streamed or response.status_code >= 500:
+        return False
+    return response.status_code not in TRANSIENT_STATUSES and 'Retry-After' not in response.headers
+
+
+def idempotent(f):
+    """Decorator honouring an optional Idempotency-Key header on POSTs.
+    Must be used with @token_required applied first; keys are per user.
+
+    The first request with a key runs and its response is stored; retries with
+    the same key and request get that response replayed (Idempotent-Replayed:
+    true). 5xx responses, transient refusals (409, 423, 429) and anything
+    carrying Retry-After are not stored, so a retry runs the request again.
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return f(current_user, *args, **kwargs)
+
+        key = key.strip()
+        if not key or len(key) > 255:
+            return error_response('Idempotency-Key must be 1-255 characters', 'BAD_REQUEST', 400)
+
+        try:
+            record_id, stored = claim_key(current_user.id, key, request_fingerprint())
+        except ValueError as e:
+            if str(e) == 'IDEMPOTENCY_KEY_REUSED':
+                return error_response(
+                    'Idempotency-Key was already used for a different request', 'IDEMPOTENCY_KEY_REUSED', 422
+                )
+            response = current_app.make_response(error_response(
+                'A request with this Idempotency-Key is still in progress', 'IDEMPOTENCY_IN_PROGRESS', 409
+            ))
+            response.headers['Retry-After'] = '1'
+            return response
+
+        if stored is not None:
+            response = current_app.response_class(
+                stored.response_body, status=stored.response_status, mimetype=stored.response_mimetype
+            )
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(f(current_user, *args, **kwargs))
+        except Exception:
+            release_key(record_id)
+            raise
+
+        if _is_final(response):
+            complete_key(record_id, response.status_code, response.get_data(as_text=True), response.mimetype)
+        else:
+            release_key(record_id)
+        return response
+    return decorated
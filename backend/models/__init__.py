@@ -4,6 +4,11 @@ db = SQLAlchemy()
 
 # Import models to register them with SQLAlchemy
 from models.user import User
+from models.blob import Blob
 from models.document import Document
 from models.result import Result
 from models.institution_record import InstitutionRecord
+from models.upload_session import UploadSession
+from models.export_job import ExportJob
+from models.validation_lease import ValidationLease
+from models.idempotency_record import IdempotencyRecord
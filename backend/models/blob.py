@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+from models import db
+
+
+class Blob(db.Model):
+    """Content-addressed file, stored once per unique SHA-256 digest and shared by documents."""
+    __tablename__ = 'blobs'
+
+    hash = db.Column(db.String(64), primary_key=True)               # SHA-256 hex digest
+    size = db.Column(db.BigInteger, nullable=False)                 # Size in bytes
+    ref_count = db.Column(db.Integer, nullable=False, default=0)    # Documents pointing at this blob
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        """Serialize blob to JSON-safe dict."""
+        return {
+            'hash': self.hash,
+            'size': self.size,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<Blob {self.hash[:12]} refs={self.ref_count}>'
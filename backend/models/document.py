@@ -11,6 +11,12 @@ class Document(db.Model):
     stored_name = db.Column(db.String(255), unique=True, nullable=False)  # UUID-based name
     file_type = db.Column(db.String(10), nullable=False)           # pdf, jpg, png
     file_size = db.Column(db.Integer, nullable=False)              # Size in bytes
+    # SHA-256 hex digest of the file. Also set on documents uploaded before the
+    # blob store, whose files still live under stored_name.
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # The blob holding the file, counted in its ref_count. Equal to content_hash
+    # when set; null for legacy files not stored as a blob.
+    blob_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'), nullable=True, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     uploaded_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
@@ -25,6 +31,7 @@ class Document(db.Model):
             'stored_name': self.stored_name,
             'file_type': self.file_type,
             'file_size': self.file_size,
+            'content_hash': self.content_hash,
             'user_id': self.user_id,
             'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
             'has_result': self.result is not None
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from models import db
+
+
+class ExportJob(db.Model):
+    """Background bulk report export, written as a ZIP into storage."""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)                 # UUID hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    total = db.Column(db.Integer, nullable=False)                   # Reports in the export
+    completed = db.Column(db.Integer, nullable=False, default=0)    # Reports written so far
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Serialize export job to JSON-safe dict."""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.status} {self.completed}/{self.total}>'
@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+from models import db
+
+
+class IdempotencyRecord(db.Model):
+    """Stored outcome of a POST sent with an Idempotency-Key header, replayed
+    when the same user retries with the same key.
+    """
+    __tablename__ = 'idempotency_records'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)          # sha256 of method, path and body
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, done
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    response_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyRecord user={self.user_id} key={self.key} {self.status}>'
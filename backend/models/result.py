@@ -15,6 +15,8 @@ class Result(db.Model):
     verdict = db.Column(db.String(20), nullable=False)      # AUTHENTIC / SUSPICIOUS / FAKE
     extracted_data = db.Column(db.JSON, nullable=True)       # OCR-extracted fields
     field_matches = db.Column(db.JSON, nullable=True)        # Per-field match details
+    partial = db.Column(db.Boolean, default=False)             # Some stages ran out of time
+    skipped_stages = db.Column(db.JSON, nullable=True)       # Names of those stages
     validated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     def to_dict(self):
@@ -31,6 +33,8 @@ class Result(db.Model):
             'verdict': self.verdict,
             'extracted_data': self.extracted_data,
             'field_matches': self.field_matches,
+            'partial': bool(self.partial),
+            'skipped_stages': self.skipped_stages or [],
             'validated_at': self.validated_at.isoformat() if self.validated_at else None
         }
 
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from models import db
+
+
+class UploadSession(db.Model):
+    """In-progress resumable upload, backed by a sparse file on disk."""
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True)                 # UUID hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)            # Original name
+    file_type = db.Column(db.String(10), nullable=False)            # pdf, jpg, png
+    total_size = db.Column(db.BigInteger, nullable=False)           # Declared size in bytes
+    offset = db.Column(db.BigInteger, nullable=False, default=0)    # Bytes received so far
+    writer = db.Column(db.String(32), nullable=True)                # Token of the request writing the next chunk
+    writer_expires_at = db.Column(db.DateTime, nullable=True)       # Claim lapses if that request dies
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    def to_dict(self):
+        """Serialize upload session to JSON-safe dict."""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'file_type': self.file_type,
+            'total_size': self.total_size,
+            'offset': self.offset,
+            'complete': self.offset >= self.total_size,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.offset}/{self.total_size}>'
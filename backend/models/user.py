@@ -1,5 +1,4 @@
 from datetime import datetime, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
 from models import db
 
 
@@ -9,7 +8,7 @@ class User(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(256), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)      # Set via services.password_service
     name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), default='user') # admin, institution, user
     validation_count = db.Column(db.Integer, default=0)
@@ -19,14 +18,6 @@ class User(db.Model):
     # Relationships
     documents = db.relationship('Document', backref='user', lazy=True, cascade='all, delete-orphan')
 
-    def set_password(self, password):
-        """Hash and store the password."""
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        """Verify password against stored hash."""
-        return check_password_hash(self.password_hash, password)
-
     def to_dict(self):
         """Serialize user to JSON-safe dict (excludes password_hash)."""
         return {
@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+from models import db
+
+
+class ValidationLease(db.Model):
+    """Claim on running the validation pipeline for a document, shared by all
+    workers. Whoever holds an unexpired lease runs the pipeline; others wait.
+    """
+    __tablename__ = 'validation_leases'
+
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True)
+    owner = db.Column(db.String(32), nullable=False)                # UUID hex of the holding request
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<ValidationLease doc={self.document_id} owner={self.owner}>'
@@ -3,11 +3,20 @@ import logging
 from datetime import datetime, timedelta, timezone
 import jwt
 from flask import current_app
+from sqlalchemy import event
+from werkzeug.exceptions import Unauthorized
 from models import db
 from models.user import User
+from services.password_service import hash_password, verify_password, needs_rehash
+from utils.cache_utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Fields snapshotted into the principal cache — everything authorization checks need
+PRINCIPAL_FIELDS = ('id', 'role', 'is_paid', 'validation_count')
+
+_principal_cache = None
+
 
 def register_user(email, password, name, role='user'):
     """Register a new user and return user dict + JWT token."""
@@ -45,7 +54,7 @@ def register_user(email, password, name, role='user'):
         name=name,
         role=role
     )
-    user.set_password(password)
+    user.password_hash = hash_password(password)
 
     db.session.add(user)
     db.session.commit()
@@ -66,9 +75,15 @@ def login_user(email, password):
     if not user:
         raise ValueError('INVALID_CREDENTIALS')
 
-    if not user.check_password(password):
+    if not verify_password(user.password_hash, password):
         raise ValueError('INVALID_CREDENTIALS')
 
+    # Transparently upgrade hashes made with outdated KDF parameters
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+        db.session.commit()
+        logger.info(f'Password hash upgraded for user: {user.email}')
+
     # Generate token
     token = generate_token(user.id)
 
@@ -96,6 +111,101 @@ def get_user_by_id(user_id):
     return db.session.get(User, user_id)
 
 
+# ────────────────────────────────────────────────────────────
+# Principal Cache
+# ────────────────────────────────────────────────────────────
+
+class Principal:
+    """Authenticated user resolved from the principal cache.
+
+    Exposes the snapshotted authorization fields without touching the database.
+    Any other attribute (email, name, to_dict, ...) loads the full User row on
+    first access, within the current request's session.
+
+    Principals are read-only: a write would only change this request's copy of
+    the snapshot. Update the User row instead (the cache entry is dropped when
+    it is saved).
+
+    If the user was deleted by another process while the snapshot was cached,
+    that load finds no row: the entry is dropped and Unauthorized is raised,
+    which token_required answers with 401.
+    """
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', None)
+
+    def __getattr__(self, name):
+        snapshot = self.__dict__['_snapshot']
+        if name in snapshot:
+            return snapshot[name]
+        if self.__dict__['_user'] is None:
+            user = db.session.get(User, snapshot['id'])
+            if user is None:
+                invalidate_principal(snapshot['id'])
+                raise Unauthorized('User not found')
+            object.__setattr__(self, '_user', user)
+        return getattr(self._user, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Principal is read-only; update User {self._snapshot["id"]} instead')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'Principal is read-only; update User {self._snapshot["id"]} instead')
+
+    def __repr__(self):
+        return f'<Principal user_id={self._snapshot["id"]} role={self._snapshot["role"]}>'
+
+
+def _get_principal_cache():
+    global _principal_cache
+    if _principal_cache is None:
+        _principal_cache = TTLCache(
+            maxsize=current_app.config.get('PRINCIPAL_CACHE_SIZE', 4096),
+            ttl=current_app.config.get('PRINCIPAL_CACHE_TTL', 10)
+        )
+    return _principal_cache
+
+
+def get_principal(user_id):
+    """Resolve the principal for user_id, hitting the DB only on a cache miss.
+    Returns None if the user does not exist.
+
+    Changes made in this process drop the entry at once; other worker
+    processes pick up a role change or deletion within PRINCIPAL_CACHE_TTL
+    seconds, so keep it short. A TTL of 0 turns the cache off.
+    """
+    if current_app.config.get('PRINCIPAL_CACHE_TTL', 10) <= 0:
+        user = db.session.get(User, user_id)
+        return None if user is None else Principal({field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+
+    cache = _get_principal_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+        cache.set(user_id, snapshot)
+    return Principal(snapshot)
+
+
+def invalidate_principal(user_id):
+    """Drop a cached principal so the next request reloads it from the DB."""
+    if _principal_cache is not None:
+        _principal_cache.pop(user_id)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_user_change(mapper, connection, target):
+    """Keep the principal cache coherent with role, password and quota changes.
+    Inserts are included because SQLite may reuse the id of a deleted row.
+    """
+    invalidate_principal(target.id)
+
+
 def change_password(user_id, old_password, new_password):
     """Change user password after verifying the old password."""
     if not old_password or not new_password:
@@ -108,10 +218,10 @@ def change_password(user_id, old_password, new_password):
     if not user:
         raise ValueError('NOT_FOUND')
 
-    if not user.check_password(old_password):
+    if not verify_password(user.password_hash, old_password):
         raise ValueError('INVALID_CREDENTIALS')
 
-    user.set_password(new_password)
+    user.password_hash = hash_password(new_password)
     db.session.commit()
 
     logger.info(f'Password changed for user: {user.email}')
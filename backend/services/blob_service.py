@@ -0,0 +1,189 @@
+import os
+import re
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import update, delete, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from models import db
+from models.blob import Blob
+from models.document import Document
+from services.derivative_service import delete_derivatives
+from storage import get_storage
+from utils.file_utils import get_staging_dir, stream_to_file
+
+logger = logging.getLogger(__name__)
+
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+BLOB_PREFIX = 'blobs/'
+
+
+def blob_key(content_hash):
+    """Storage key of a content-addressed blob."""
+    return BLOB_PREFIX + content_hash
+
+
+def store_blob(stream, extension, max_size=None):
+    """Stream an upload into the blob store and return (content_hash, file_size).
+
+    Adds one reference to the blob inside the current transaction; the caller
+    commits it together with the Document that points at the blob.
+    """
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    incoming_path = os.path.join(get_staging_dir(), f'{uuid.uuid4().hex}.incoming')
+    file_size, content_hash = stream_to_file(stream, incoming_path, extension, max_size)
+    adopt_blob(incoming_path, content_hash, file_size)
+    return content_hash, file_size
+
+
+def adopt_blob(path, content_hash, file_size):
+    """Move an already validated local file into the blob store under its hash,
+    adding one reference.
+
+    If the blob is already stored the local copy is dropped; otherwise it is
+    handed to the storage driver, which also restores a blob whose file a
+    concurrent GC pass removed.
+    """
+    try:
+        created = _acquire(content_hash, file_size)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    storage = get_storage()
+    key = blob_key(content_hash)
+    if not created and storage.exists(key):
+        os.remove(path)
+    else:
+        storage.put_file(key, path)
+
+
+def _acquire(content_hash, file_size):
+    """Increment a blob's reference count, creating the row on first use.
+    Returns True if the row was created.
+    """
+    now = datetime.now(timezone.utc)
+    stmt = (
+        update(Blob)
+        .where(Blob.hash == content_hash)
+        .values(ref_count=Blob.ref_count + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(stmt).rowcount:
+        return False
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(Blob(hash=content_hash, size=file_size, ref_count=1, created_at=now, updated_at=now))
+        return True
+    except IntegrityError:
+        # A concurrent upload created the row first — count our reference on it
+        db.session.execute(stmt)
+        return False
+
+
+def _release_stmt(content_hash):
+    return (
+        update(Blob)
+        .where(Blob.hash == content_hash, Blob.ref_count > 0)
+        .values(ref_count=Blob.ref_count - 1, updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+
+
+@event.listens_for(Document, 'after_delete')
+def _release_on_document_delete(mapper, connection, target):
+    """Drop the document's blob reference in the same transaction as the delete.
+    Runs for cascaded deletes too (e.g. when a user is removed). The file is
+    reclaimed later by collect_garbage(); its derivatives go as soon as the
+    transaction that released the last reference commits.
+    """
+    if not target.blob_hash:
+        return
+    row = connection.execute(_release_stmt(target.blob_hash).returning(Blob.ref_count)).first()
+    session = object_session(target)
+    if row is not None and row.ref_count <= 0 and session is not None:
+        session.info.setdefault('unreferenced_blobs', set()).add(target.blob_hash)
+
+
+@event.listens_for(Session, 'after_commit')
+def _delete_unreferenced_derivatives(session):
+    for content_hash in session.info.pop('unreferenced_blobs', ()):
+        try:
+            delete_derivatives(blob_key(content_hash))
+        except Exception as e:
+            logger.warning(f'Could not delete derivatives of blob {content_hash}: {e}')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_unreferenced_blobs(session):
+    session.info.pop('unreferenced_blobs', None)
+
+
+def collect_garbage(grace_seconds=None):
+    """Reclaim unreferenced blobs and orphaned files in the blob store.
+
+    Only blobs unreferenced for longer than grace_seconds are removed, so an
+    upload that is about to re-reference a blob does not race the collector.
+    Their files are deleted before the row deletes commit: an upload that
+    re-references the blob meanwhile waits on the row and, once we commit,
+    re-creates it and stores the file again. A file written within the grace
+    period is left for a later orphan sweep. Stored objects with no Blob row
+    (e.g. from a rolled-back upload) and stale staging files are removed
+    under the same grace period.
+    """
+    if grace_seconds is None:
+        grace_seconds = current_app.config.get('BLOB_GC_GRACE_SECONDS', 3600)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    cutoff_ts = time.time() - grace_seconds
+
+    storage = get_storage()
+    stats = {'blobs_removed': 0, 'bytes_freed': 0, 'orphans_removed': 0}
+    try:
+        removed = db.session.execute(
+            delete(Blob)
+            .where(Blob.ref_count <= 0, Blob.updated_at < cutoff)
+            .returning(Blob.hash, Blob.size)
+            .execution_options(synchronize_session=False)
+        ).all()
+        stored = dict(storage.iter_keys(BLOB_PREFIX)) if removed else {}
+        for content_hash, size in removed:
+            key = blob_key(content_hash)
+            if stored.get(key, 0) >= cutoff_ts:
+                continue
+            storage.delete(key)
+            delete_derivatives(key)
+            stats['blobs_removed'] += 1
+            stats['bytes_freed'] += size
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+
+    for key, modified in list(storage.iter_keys(BLOB_PREFIX)):
+        if modified >= cutoff_ts:
+            continue
+        # Derivatives ('<hash>.thumb.webp') live as long as their blob
+        name = key[len(BLOB_PREFIX):].split('.', 1)[0]
+        if _BLOB_NAME.match(name) and db.session.get(Blob, name) is not None:
+            continue
+        storage.delete(key)
+        stats['orphans_removed'] += 1
+
+    for dirpath, _, filenames in os.walk(get_staging_dir()):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.getmtime(path) < cutoff_ts:
+                os.remove(path)
+                stats['orphans_removed'] += 1
+
+    logger.info(
+        f"Blob GC: removed {stats['blobs_removed']} blobs ({stats['bytes_freed']} bytes), "
+        f"{stats['orphans_removed']} orphaned files"
+    )
+    return stats
@@ -0,0 +1,182 @@
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from storage import get_storage
+from utils.file_utils import get_staging_dir
+
+logger = logging.getLogger(__name__)
+
+# Derivative variants produced for every document
+THUMBNAIL_VARIANT = 'thumb'
+VARIANTS = (THUMBNAIL_VARIANT,)
+
+_FORMAT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Source keys with derivative generation queued or running in this process
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _thumbnail_format():
+    fmt = current_app.config.get('THUMBNAIL_FORMAT', 'webp').lower()
+    return fmt if fmt in _FORMAT_EXTENSIONS else 'jpeg'
+
+
+def derivative_key(source_key, variant=THUMBNAIL_VARIANT):
+    """Storage key of a derivative, stored next to its source file."""
+    return f'{source_key}.{variant}.{_FORMAT_EXTENSIONS[_thumbnail_format()]}'
+
+
+def unavailable_key(source_key, variant=THUMBNAIL_VARIANT):
+    """Storage key of the marker left when a derivative cannot be produced
+    (unsupported input, missing optional renderer or a failed render).
+    """
+    return f'{source_key}.{variant}.unavailable'
+
+
+def derivative_unavailable(source_key, variant=THUMBNAIL_VARIANT):
+    """Check whether generating a derivative already failed for this source."""
+    return get_storage().exists(unavailable_key(source_key, variant))
+
+
+def derivative_etag(source_key, variant=THUMBNAIL_VARIANT):
+    """Strong validator for a derivative. Source keys are content-addressed (or
+    unique per upload), so the key plus render settings identify the bytes.
+    """
+    size = current_app.config.get('THUMBNAIL_SIZE', 256)
+    return f'{derivative_key(source_key, variant)}@{size}'
+
+
+def derivative_mimetype():
+    """Content type of the configured derivative format."""
+    return f'image/{_thumbnail_format()}'
+
+
+def _render_pdf_first_page(stream, size):
+    """Rasterize the first PDF page if PyMuPDF is installed, else return None."""
+    try:
+        import fitz
+        from PIL import Image
+    except ImportError:
+        logger.info('PyMuPDF not installed — skipping PDF preview')
+        return None
+
+    with fitz.open(stream=stream.read(), filetype='pdf') as pdf:
+        if pdf.page_count == 0:
+            return None
+        page = pdf.load_page(0)
+        zoom = size / max(page.rect.width, page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def generate_thumbnail(source_key, file_type):
+    """Render a fixed-size thumbnail (first page for PDFs) into storage.
+    Returns the derivative key, or None if no thumbnail could be produced.
+    """
+    from PIL import Image
+
+    storage = get_storage()
+    size = current_app.config.get('THUMBNAIL_SIZE', 256)
+    fmt = _thumbnail_format()
+
+    with storage.open(source_key) as stream:
+        if file_type == 'pdf':
+            img = _render_pdf_first_page(stream, size)
+            if img is None:
+                return None
+        else:
+            img = Image.open(stream)
+            # JPEG draft mode decodes at a reduced scale — far cheaper than a full decode
+            img.draft('RGB', (size, size))
+            img.load()
+
+    img.thumbnail((size, size))
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    tmp_path = os.path.join(get_staging_dir(), f'{uuid.uuid4().hex}.{THUMBNAIL_VARIANT}')
+    try:
+        img.save(tmp_path, format=fmt.upper(), quality=80)
+        key = derivative_key(source_key)
+        storage.put_file(key, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return key
+
+
+def _mark_unavailable(source_key):
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    tmp_path = os.path.join(get_staging_dir(), f'{uuid.uuid4().hex}.{THUMBNAIL_VARIANT}')
+    try:
+        open(tmp_path, 'wb').close()
+        get_storage().put_file(unavailable_key(source_key), tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _generate_safely(source_key, file_type):
+    try:
+        if generate_thumbnail(source_key, file_type):
+            logger.info(f'Thumbnail generated for {source_key}')
+        else:
+            _mark_unavailable(source_key)
+    except Exception as e:
+        logger.warning(f'Thumbnail generation failed for {source_key}: {e}')
+        try:
+            _mark_unavailable(source_key)
+        except Exception as mark_error:
+            logger.warning(f'Could not record failed thumbnail for {source_key}: {mark_error}')
+    finally:
+        with _pending_lock:
+            _pending.discard(source_key)
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='derivatives')
+    return _executor
+
+
+def enqueue_derivatives(source_key, file_type):
+    """Schedule derivative generation for a stored file on the background pool.
+    With DERIVATIVE_WORKERS = 0 the work runs inline (used in tests). A source
+    already queued or being rendered in this process is not queued again.
+    """
+    with _pending_lock:
+        if source_key in _pending:
+            return
+        _pending.add(source_key)
+
+    workers = current_app.config.get('DERIVATIVE_WORKERS', 2)
+    if not workers:
+        _generate_safely(source_key, file_type)
+        return
+
+    app = current_app._get_current_object()
+
+    def task():
+        with app.app_context():
+            _generate_safely(source_key, file_type)
+
+    _get_executor(workers).submit(task)
+
+
+def delete_derivatives(source_key):
+    """Remove every derivative of a stored file, and any unavailable markers."""
+    storage = get_storage()
+    for variant in VARIANTS:
+        storage.delete(derivative_key(source_key, variant))
+        storage.delete(unavailable_key(source_key, variant))
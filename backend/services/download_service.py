@@ -0,0 +1,176 @@
+import io
+import os
+import logging
+import mimetypes
+from urllib.parse import quote
+from flask import current_app, request, send_file, redirect, url_for, Response, stream_with_context
+from datetime import timezone
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from storage import get_storage
+from utils.file_utils import STREAM_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+_SIGNING_SALT = 'stored-file-download'
+
+
+def guess_mimetype(filename):
+    """Best-effort content type for a download name."""
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def _content_disposition(download_name, as_attachment):
+    disposition = 'attachment' if as_attachment else 'inline'
+    return f"{disposition}; filename*=UTF-8''{quote(download_name)}"
+
+
+def send_stored_file(key, download_name, mimetype=None, as_attachment=True, etag=None,
+                     max_age=None, last_modified=None):
+    """Build the response for an already authorized download of a stored file.
+
+    Depending on DOWNLOAD_OFFLOAD the transfer is handed to the front web server
+    (nginx X-Accel-Redirect or Apache X-Sendfile) or redirected to a signed
+    object-storage URL, so no Python worker is held for a slow client. Without
+    offload, local files go through send_file, which honours Range and
+    conditional requests; other drivers are streamed in chunks.
+
+    For immutable content pass a strong etag (and optionally last_modified),
+    answered with 304 before storage is touched, and max_age for a private
+    Cache-Control lifetime.
+    """
+    last_modified = _http_time(last_modified)
+    if _is_not_modified(etag, last_modified):
+        response = Response(status=304)
+        return _apply_cache_headers(response, etag, max_age, last_modified)
+
+    response = _build_file_response(key, download_name, mimetype, as_attachment, etag, max_age)
+    return _apply_cache_headers(response, etag, max_age, last_modified)
+
+
+def send_generated_file(render, download_name, mimetype=None, as_attachment=True, etag=None,
+                        max_age=None, last_modified=None):
+    """Serve content produced in memory by render() with the same validators as
+    send_stored_file. A matching conditional request gets a 304 without calling
+    render(); otherwise send_file handles Range and If-Modified-Since.
+    """
+    last_modified = _http_time(last_modified)
+    if _is_not_modified(etag, last_modified):
+        response = Response(status=304)
+        return _apply_cache_headers(response, etag, max_age, last_modified)
+
+    response = send_file(
+        io.BytesIO(render()),
+        mimetype=mimetype or guess_mimetype(download_name),
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=etag or False,
+        last_modified=last_modified,
+        max_age=max_age
+    )
+    return _apply_cache_headers(response, etag, max_age, last_modified)
+
+
+def _http_time(value):
+    # HTTP dates have second precision; stored naive datetimes are UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def _is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return bool(etag) and etag in request.if_none_match
+    since = request.if_modified_since
+    return last_modified is not None and since is not None and last_modified <= since
+
+
+def _apply_cache_headers(response, etag, max_age, last_modified=None):
+    if etag:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    if max_age is not None:
+        response.cache_control.private = True
+        response.cache_control.max_age = max_age
+    return response
+
+
+def _build_file_response(key, download_name, mimetype, as_attachment, etag, max_age):
+    storage = get_storage()
+    mimetype = mimetype or guess_mimetype(download_name)
+    mode = current_app.config.get('DOWNLOAD_OFFLOAD', 'none')
+
+    if mode == 'redirect':
+        url = storage.url(key, current_app.config.get('SIGNED_URL_TTL', 300))
+        if url:
+            return redirect(url, code=302)
+
+    local_path = storage.local_path(key)
+    if local_path and not os.path.exists(local_path):
+        raise FileNotFoundError(key)
+
+    if local_path and mode == 'x-accel':
+        # nginx serves the file (including Range) from an internal location
+        # aliased to UPLOAD_FOLDER, e.g. `location /protected-uploads/ { internal; alias ...; }`
+        relative = os.path.relpath(local_path, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = current_app.config['X_ACCEL_PREFIX'].rstrip('/') + '/' + quote(relative)
+        response.headers['Content-Disposition'] = _content_disposition(download_name, as_attachment)
+        return response
+
+    if local_path:
+        # With USE_X_SENDFILE (DOWNLOAD_OFFLOAD=x-sendfile) Flask emits an
+        # X-Sendfile header instead of the body
+        return send_file(
+            local_path,
+            mimetype=mimetype,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            conditional=True,
+            etag=etag or True,
+            max_age=max_age
+        )
+
+    stored = storage.open(key)
+
+    def generate():
+        with stored:
+            for chunk in iter(lambda: stored.read(STREAM_CHUNK_SIZE), b''):
+                yield chunk
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = _content_disposition(download_name, as_attachment)
+    return response
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=_SIGNING_SALT)
+
+
+def make_download_url(key, download_name, mimetype=None):
+    """Return (url, expires_in) for a short-lived link that needs no Authorization header.
+
+    Object storage drivers hand out their own presigned URL; otherwise the URL
+    points at /api/files/<token>, which is served through send_stored_file.
+    """
+    expires_in = current_app.config.get('SIGNED_URL_TTL', 300)
+    url = get_storage().url(key, expires_in)
+    if url:
+        return url, expires_in
+
+    token = _serializer().dumps({'key': key, 'name': download_name, 'type': mimetype})
+    return url_for('upload.signed_download', token=token, _external=True), expires_in
+
+
+def resolve_download_token(token):
+    """Verify a signed download token and return (key, download_name, mimetype)."""
+    try:
+        payload = _serializer().loads(token, max_age=current_app.config.get('SIGNED_URL_TTL', 300))
+    except SignatureExpired:
+        raise ValueError('EXPIRED')
+    except BadSignature:
+        raise ValueError('INVALID')
+    return payload['key'], payload['name'], payload.get('type')
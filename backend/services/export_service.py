@@ -0,0 +1,377 @@
+import io
+import os
+import csv
+import json
+import uuid
+import logging
+import threading
+import zipfile
+import multiprocessing
+from datetime import datetime, date, time, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app
+from sqlalchemy import update, select
+from werkzeug.utils import secure_filename
+from models import db
+from models.document import Document
+from models.result import Result
+from models.export_job import ExportJob
+from services.report_service import snapshot_report, render_report_snapshot, get_cached_report
+from storage import get_storage
+from utils.file_utils import get_staging_dir
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = (
+    'document_id', 'filename', 'verdict', 'final_score', 'cnn_score',
+    'ocr_confidence', 'db_match_score', 'validated_at'
+)
+
+HISTORY_FIELDS = (
+    'result_id', 'document_id', 'filename', 'file_type', 'verdict', 'final_score',
+    'cnn_score', 'ocr_confidence', 'db_match_score', 'validated_at'
+)
+
+HISTORY_FORMATS = ('csv', 'ndjson')
+VERDICTS = ('AUTHENTIC', 'SUSPICIOUS', 'FAKE')
+
+# Rows fetched from the cursor per round trip, and rows per yielded chunk
+HISTORY_BATCH_SIZE = 1000
+
+_render_pool = None
+_job_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_export_key(job_id):
+    """Storage key of a finished background export."""
+    return f'exports/{job_id}.zip'
+
+
+def collect_export(user, document_ids=None):
+    """Snapshot the validated documents to export for a user.
+
+    Admins may export any document; everyone else only their own. Without
+    document_ids every validated document in scope is exported.
+    """
+    query = db.session.query(Document, Result).join(Result, Result.document_id == Document.id)
+    if user.role != 'admin':
+        query = query.filter(Document.user_id == user.id)
+    if document_ids is not None:
+        if not isinstance(document_ids, list) or not all(isinstance(i, int) for i in document_ids):
+            raise ValueError('INVALID_IDS')
+        query = query.filter(Document.id.in_(document_ids))
+
+    max_reports = current_app.config.get('REPORT_EXPORT_MAX', 5000)
+    rows = query.order_by(Document.id).limit(max_reports + 1).all()
+    if not rows:
+        raise ValueError('NO_RESULTS')
+    if len(rows) > max_reports:
+        raise ValueError('TOO_MANY')
+    return [snapshot_report(document, result) for document, result in rows]
+
+
+# ────────────────────────────────────────────────────────────
+# Rendering
+# ────────────────────────────────────────────────────────────
+
+def _get_render_pool(workers):
+    # Reportlab layout is pure-Python CPU work, so reports are rendered in worker
+    # processes. 'spawn' keeps children independent of the parent's threads.
+    global _render_pool
+    if _render_pool is None:
+        with _pool_lock:
+            if _render_pool is None:
+                _render_pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+                )
+    return _render_pool
+
+
+def iter_rendered(snapshots, workers):
+    """Yield (snapshot, pdf_bytes) as reports finish rendering, in completion order.
+
+    Reports already in the report cache are not rendered again. At most two
+    renders per worker are in flight, bounding memory for large exports.
+    With workers = 0 everything renders inline.
+    """
+    pending = []
+    for snapshot in snapshots:
+        pdf = get_cached_report(snapshot['version'])
+        if pdf is not None:
+            yield snapshot, pdf
+        elif not workers:
+            yield snapshot, render_report_snapshot(snapshot)
+        else:
+            pending.append(snapshot)
+
+    if not pending:
+        return
+
+    pool = _get_render_pool(workers)
+    queue = iter(pending)
+    in_flight = {}
+    for snapshot in queue:
+        in_flight[pool.submit(render_report_snapshot, snapshot)] = snapshot
+        if len(in_flight) >= workers * 2:
+            break
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            snapshot = in_flight.pop(future)
+            yield snapshot, future.result()
+            following = next(queue, None)
+            if following is not None:
+                in_flight[pool.submit(render_report_snapshot, following)] = following
+
+
+# ────────────────────────────────────────────────────────────
+# Streaming ZIP
+# ────────────────────────────────────────────────────────────
+
+class _ZipSink:
+    """Write-only, non-seekable file object collecting the bytes ZipFile emits.
+
+    ZipFile falls back to data descriptors on unseekable output, so the archive
+    can be streamed entry by entry without being staged anywhere.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _summary_csv(snapshots):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SUMMARY_FIELDS)
+    for snapshot in snapshots:
+        document, result = snapshot['document'], snapshot['result']
+        writer.writerow([
+            document['id'], document['filename'], result['verdict'], result['final_score'],
+            result['cnn_score'], result['ocr_confidence'], result['db_match_score'],
+            result['validated_at'].isoformat() if result['validated_at'] else ''
+        ])
+    return buffer.getvalue()
+
+
+def _entry_name(snapshot):
+    document = snapshot['document']
+    stem = secure_filename(document['filename'].rsplit('.', 1)[0]) or 'document'
+    return f"reports/{document['id']}_{stem}.pdf"
+
+
+def iter_report_zip(snapshots, workers=0, on_progress=None):
+    """Yield a ZIP archive of summary.csv plus one PDF report per snapshot.
+
+    Each report is compressed and yielded as soon as it is rendered; only the
+    entries currently being written are held in memory.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('summary.csv', _summary_csv(snapshots))
+        yield sink.drain()
+
+        for count, (snapshot, pdf) in enumerate(iter_rendered(snapshots, workers), start=1):
+            archive.writestr(_entry_name(snapshot), pdf)
+            yield sink.drain()
+            if on_progress:
+                on_progress(count)
+    yield sink.drain()
+
+
+# ────────────────────────────────────────────────────────────
+# Background Jobs
+# ────────────────────────────────────────────────────────────
+
+def _get_job_pool():
+    global _job_pool
+    if _job_pool is None:
+        with _pool_lock:
+            if _job_pool is None:
+                _job_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='export-jobs')
+    return _job_pool
+
+
+def _set_job(job_id, **values):
+    db.session.execute(
+        update(ExportJob)
+        .where(ExportJob.id == job_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _run_export_job(job_id, snapshots, workers):
+    """Write the ZIP to a staging file, then move it into storage."""
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    tmp_path = os.path.join(get_staging_dir(), f'{job_id}.export.zip')
+    # Progress is written every few reports rather than per report
+    step = max(1, len(snapshots) // 20)
+
+    def progress(count):
+        if count % step == 0:
+            _set_job(job_id, completed=count)
+
+    try:
+        _set_job(job_id, status='running')
+        with open(tmp_path, 'wb') as out:
+            for chunk in iter_report_zip(snapshots, workers, on_progress=progress):
+                out.write(chunk)
+        get_storage().put_file(get_export_key(job_id), tmp_path)
+        _set_job(job_id, status='done', completed=len(snapshots), finished_at=datetime.now(timezone.utc))
+        logger.info(f'Export job {job_id} finished: {len(snapshots)} reports')
+    except Exception as e:
+        logger.error(f'Export job {job_id} failed: {e}', exc_info=True)
+        db.session.rollback()
+        _set_job(job_id, status='failed', error=str(e)[:255], finished_at=datetime.now(timezone.utc))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def start_export_job(user_id, snapshots):
+    """Create an ExportJob and build its ZIP in the background.
+    With REPORT_EXPORT_WORKERS = 0 the job runs inline (used in tests).
+    """
+    job = ExportJob(id=uuid.uuid4().hex, user_id=user_id, status='pending', total=len(snapshots), completed=0)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.id
+
+    workers = current_app.config.get('REPORT_EXPORT_WORKERS', 0)
+    if not workers:
+        _run_export_job(job_id, snapshots, workers)
+    else:
+        app = current_app._get_current_object()
+
+        def task():
+            with app.app_context():
+                _run_export_job(job_id, snapshots, workers)
+
+        _get_job_pool().submit(task)
+
+    db.session.expire(job)
+    return job
+
+
+def get_export_job(job_id, user_id):
+    """Get an export job, verifying ownership."""
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        raise ValueError('NOT_FOUND')
+    if job.user_id != user_id:
+        raise ValueError('FORBIDDEN')
+    return job
+
+
+# ────────────────────────────────────────────────────────────
+# History Export
+# ────────────────────────────────────────────────────────────
+
+def _parse_day(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name} date. Use YYYY-MM-DD.')
+
+
+def _parse_score(value, name):
+    try:
+        score = float(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}. Must be a number between 0 and 1.')
+    if not 0 <= score <= 1:
+        raise ValueError(f'Invalid {name}. Must be a number between 0 and 1.')
+    return score
+
+
+def build_history_filters(verdict=None, date_from=None, date_to=None, min_score=None, max_score=None):
+    """Turn query-string filters into SQL conditions on Result.
+
+    Dates are whole UTC days, both ends inclusive. Raises ValueError with a
+    client-facing message on invalid input.
+    """
+    conditions = []
+    if verdict:
+        verdict = verdict.upper()
+        if verdict not in VERDICTS:
+            raise ValueError('Invalid verdict filter. Must be AUTHENTIC, SUSPICIOUS, or FAKE.')
+        conditions.append(Result.verdict == verdict)
+    if date_from:
+        start = datetime.combine(_parse_day(date_from, 'from'), time.min)
+        conditions.append(Result.validated_at >= start)
+    if date_to:
+        end = datetime.combine(_parse_day(date_to, 'to') + timedelta(days=1), time.min)
+        conditions.append(Result.validated_at < end)
+    if min_score:
+        conditions.append(Result.final_score >= _parse_score(min_score, 'min_score'))
+    if max_score:
+        conditions.append(Result.final_score <= _parse_score(max_score, 'max_score'))
+    return conditions
+
+
+def iter_history_rows(user_id, conditions):
+    """Yield history rows as plain tuples in HISTORY_FIELDS order, newest first.
+
+    Selects only the exported columns (no ORM objects are built) and reads them
+    through a server-side cursor in HISTORY_BATCH_SIZE batches.
+    """
+    stmt = (
+        select(
+            Result.id, Document.id, Document.filename, Document.file_type, Result.verdict,
+            Result.final_score, Result.cnn_score, Result.ocr_confidence, Result.db_match_score,
+            Result.validated_at
+        )
+        .join(Document, Result.document_id == Document.id)
+        .where(Document.user_id == user_id, *conditions)
+        .order_by(Result.validated_at.desc(), Result.id.desc())
+        .execution_options(yield_per=HISTORY_BATCH_SIZE)
+    )
+    result = db.session.execute(stmt)
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _history_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_history_export(rows, fmt):
+    """Serialize history rows to CSV or NDJSON, yielding one chunk per batch."""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(HISTORY_FIELDS)
+
+        def write(row):
+            writer.writerow([_history_value(v) for v in row])
+    else:
+        def write(row):
+            buffer.write(json.dumps(dict(zip(HISTORY_FIELDS, map(_history_value, row)))) + '\n')
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= HISTORY_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
@@ -0,0 +1,98 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app, request
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.idempotency_record import IdempotencyRecord
+from utils.file_utils import STREAM_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def request_fingerprint():
+    """sha256 over the method, path, query, form fields and uploaded file
+    contents of the current request, so a key reused for a different request
+    can be told apart from a retry.
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.full_path}\n'.encode('utf-8'))
+    if request.mimetype == 'multipart/form-data':
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f'{name}={value}\n'.encode('utf-8'))
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f'{name}:{file.filename}\n'.encode('utf-8'))
+            for chunk in iter(lambda: file.stream.read(STREAM_CHUNK_SIZE), b''):
+                digest.update(chunk)
+            file.stream.seek(0)
+    else:
+        digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _find(user_id, key):
+    return db.session.execute(
+        select(IdempotencyRecord)
+        .where(IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key)
+        .execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+
+
+def claim_key(user_id, key, fingerprint):
+    """Claim an Idempotency-Key for a request about to run.
+
+    Returns (record_id, None) when the caller should run the request, or
+    (None, record) with a finished record whose response is to be replayed.
+    Raises ValueError('IDEMPOTENCY_KEY_REUSED') if the key was used for a
+    different request, ValueError('IDEMPOTENCY_IN_PROGRESS') while the first
+    request with the key is still running.
+    """
+    now = datetime.now(timezone.utc)
+    # Expired keys of this user are dropped, which also frees `key` if it expired
+    db.session.execute(
+        delete(IdempotencyRecord)
+        .where(IdempotencyRecord.user_id == user_id, IdempotencyRecord.expires_at < now)
+        .execution_options(synchronize_session=False)
+    )
+    record = IdempotencyRecord(
+        user_id=user_id, key=key, fingerprint=fingerprint, status='in_progress',
+        expires_at=now + timedelta(seconds=current_app.config.get('IDEMPOTENCY_TTL', 86400))
+    )
+    db.session.add(record)
+    try:
+        db.session.commit()
+        return record.id, None
+    except IntegrityError:
+        db.session.rollback()
+
+    existing = _find(user_id, key)
+    if existing is not None and existing.fingerprint != fingerprint:
+        raise ValueError('IDEMPOTENCY_KEY_REUSED')
+    if existing is None or existing.status != 'done':
+        raise ValueError('IDEMPOTENCY_IN_PROGRESS')
+    return None, existing
+
+
+def complete_key(record_id, status_code, body, mimetype):
+    """Store the response of a request that ran under a claimed key."""
+    db.session.rollback()
+    db.session.execute(
+        update(IdempotencyRecord)
+        .where(IdempotencyRecord.id == record_id)
+        .values(status='done', response_status=status_code, response_body=body, response_mimetype=mimetype)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def release_key(record_id):
+    """Forget a claimed key after a failed or transient response, so a retry runs it again."""
+    db.session.rollback()
+    db.session.execute(
+        delete(IdempotencyRecord)
+        .where(IdempotencyRecord.id == record_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    logger.info(f'Released idempotency record {record_id}; the request can be retried')
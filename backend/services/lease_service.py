@@ -0,0 +1,114 @@
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.validation_lease import ValidationLease
+
+logger = logging.getLogger(__name__)
+
+# In-process single flight: document id -> Event set when the leading call ends
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def acquire_lease(document_id, owner, ttl):
+    """Try to take the validation lease for a document; True on success.
+
+    A missing lease is created; an expired one (its holder died) is taken over
+    with a conditional UPDATE, so exactly one worker wins either way.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        db.session.add(ValidationLease(document_id=document_id, owner=owner, expires_at=now + timedelta(seconds=ttl)))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+
+    taken = db.session.execute(
+        update(ValidationLease)
+        .where(ValidationLease.document_id == document_id, ValidationLease.expires_at < now)
+        .values(owner=owner, expires_at=now + timedelta(seconds=ttl))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if taken:
+        logger.warning(f'Took over expired validation lease for document {document_id}')
+    return bool(taken)
+
+
+def release_lease(document_id, owner):
+    """Drop a lease, but only if this owner still holds it."""
+    db.session.rollback()
+    db.session.execute(
+        delete(ValidationLease)
+        .where(ValidationLease.document_id == document_id, ValidationLease.owner == owner)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _lead(document_id, run, existing, deadline):
+    config = current_app.config
+    ttl = config.get('VALIDATION_LEASE_TTL', 300)
+    poll = config.get('VALIDATION_LEASE_POLL', 0.5)
+    owner = uuid.uuid4().hex
+
+    # Another worker may hold the lease: wait for its result or for the lease
+    # to be released or expire
+    while not acquire_lease(document_id, owner, ttl):
+        result = existing()
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            raise ValueError('VALIDATION_IN_PROGRESS')
+        time.sleep(poll)
+
+    try:
+        # The previous holder may have finished between our check and the lease
+        result = existing()
+        if result is not None:
+            return result
+        return run()
+    finally:
+        release_lease(document_id, owner)
+
+
+def run_once(document_id, run, existing, deadline=None):
+    """Run `run()` as the only validation of a document in flight.
+
+    Concurrent callers in this process wait for the leading call; callers in
+    other workers wait on the ValidationLease row. Waiters return `existing()`
+    — the stored result — once the leader finishes. If the leader failed, the
+    next waiter takes over. Raises ValueError('VALIDATION_IN_PROGRESS') after
+    VALIDATION_WAIT_TIMEOUT seconds without a result, or sooner at the caller's
+    deadline (a time.monotonic() value).
+    """
+    wait_until = time.monotonic() + current_app.config.get('VALIDATION_WAIT_TIMEOUT', 120)
+    deadline = wait_until if deadline is None else min(deadline, wait_until)
+    while True:
+        with _inflight_lock:
+            event = _inflight.get(document_id)
+            leader = event is None
+            if leader:
+                event = _inflight[document_id] = threading.Event()
+
+        if leader:
+            try:
+                return _lead(document_id, run, existing, deadline)
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(document_id, None)
+                event.set()
+
+        logger.info(f'Validation of document {document_id} already running; waiting for it')
+        if not event.wait(max(0.0, deadline - time.monotonic())):
+            raise ValueError('VALIDATION_IN_PROGRESS')
+        result = existing()
+        if result is not None:
+            return result
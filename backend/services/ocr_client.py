@@ -0,0 +1,199 @@
+import os
+import time
+import uuid
+import random
+import logging
+import mimetypes
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from utils.file_utils import STREAM_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# OCR service field -> backend extracted_data key. map_fields() also derives the
+# id_number/date keys that verify_against_institution_data() matches on.
+FIELD_MAP = {
+    'Name': 'name',
+    'Roll Number': 'roll_number',
+    'Certificate Id': 'certificate_id',
+    'Institution': 'institution',
+    'Issue Date': 'issue_date',
+    'Course': 'course',
+    'Branch': 'branch',
+    'Year': 'year',
+    'CGPA': 'cgpa',
+    'SGPA': 'sgpa',
+}
+
+# Responses worth retrying: rate limiting and gateway/availability errors
+RETRY_STATUSES = {429, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class OCRServiceError(Exception):
+    """The OCR service could not produce an extraction."""
+
+
+class OCRServiceTimeout(OCRServiceError, TimeoutError):
+    """The OCR service did not answer before the caller's deadline."""
+
+
+def _get_session():
+    # One pooled keep-alive session per process, shared by all request threads
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = current_app.config.get('OCR_SERVICE_POOL_SIZE', 10)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+class _MultipartBody:
+    """File-like multipart/form-data body that streams the file part from its
+    source in STREAM_CHUNK_SIZE reads, so the upload is never held in memory.
+    Exposes `len` (read by requests) when the file size is known, so a
+    Content-Length is sent; otherwise requests uses chunked transfer encoding.
+    """
+
+    def __init__(self, stream, filename, content_type, size=None):
+        self.boundary = uuid.uuid4().hex
+        safe_name = filename.replace('"', '')
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('ascii')
+        self._stream = stream
+        if size is not None:
+            self.len = len(self._head) + size + len(self._tail)
+        self._parts = [self._head, None, self._tail]
+        self._buffer = b''
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def read(self, size=-1):
+        size = STREAM_CHUNK_SIZE if size is None or size < 0 else size
+        while len(self._buffer) < size and self._parts:
+            part = self._parts[0]
+            if part is None:
+                chunk = self._stream.read(STREAM_CHUNK_SIZE)
+                if chunk:
+                    self._buffer += chunk
+                    continue
+            elif part:
+                self._buffer += part
+            self._parts.pop(0)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _stream_size(stream):
+    """Remaining bytes of a seekable stream, or None if it cannot be measured."""
+    try:
+        if not stream.seekable():
+            return None
+        position = stream.tell()
+        end = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+        return end - position
+    except (AttributeError, OSError):
+        return None
+
+
+def map_fields(data):
+    """Map the OCR service schema onto the backend's extracted_data keys.
+
+    id_number prefers the roll number and falls back to the certificate id;
+    date prefers the issue date and falls back to the year.
+    """
+    fields = {key: data.get(source) for source, key in FIELD_MAP.items() if source in data}
+    fields['id_number'] = data.get('Roll Number') or data.get('Certificate Id')
+    fields['date'] = data.get('Issue Date') or data.get('Year')
+    return fields
+
+
+def _post(url, stream, filename, timeout):
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    body = _MultipartBody(stream, filename, content_type, _stream_size(stream))
+    return _get_session().post(url, data=body, headers={'Content-Type': body.content_type}, timeout=timeout)
+
+
+def extract(stream, filename, deadline=None):
+    """Extract certificate fields from a file via the OCR service's /extract/.
+
+    The stream is sent as-is from its current position. Connection errors,
+    timeouts and 429/5xx gateway responses are retried with exponential backoff
+    and full jitter (only if the stream can be rewound). With a deadline
+    (a time.monotonic() value) timeouts shrink to the time left and no retry
+    starts that could not finish before it; OCRServiceTimeout is raised when
+    the deadline ends the attempts. Returns
+    {'fields': {...}, 'confidence': float} like extract_data_with_gemini.
+    """
+    config = current_app.config
+    url = config['OCR_SERVICE_URL'].rstrip('/') + '/extract/'
+    timeout = (config.get('OCR_SERVICE_CONNECT_TIMEOUT', 3), config.get('OCR_SERVICE_TIMEOUT', 60))
+    retries = config.get('OCR_SERVICE_RETRIES', 2)
+    backoff = config.get('OCR_SERVICE_BACKOFF', 0.5)
+
+    try:
+        start = stream.tell() if stream.seekable() else None
+    except (AttributeError, OSError):
+        start = None
+    attempts = retries + 1 if start is not None else 1
+
+    error = 'OCR service deadline exceeded'
+    out_of_time = False
+    for attempt in range(attempts):
+        if attempt:
+            delay = random.uniform(0, backoff * (2 ** (attempt - 1)))
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                out_of_time = True
+                break
+            logger.warning(f'OCR service retry {attempt}/{retries} for {filename} in {delay:.2f}s')
+            time.sleep(delay)
+            stream.seek(start)
+        if deadline is not None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                out_of_time = True
+                break
+            timeout = (min(timeout[0], left), min(timeout[1], left))
+        try:
+            response = _post(url, stream, filename, timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = f'OCR service unreachable: {e}'
+            continue
+        if response.status_code in RETRY_STATUSES:
+            error = f'OCR service returned {response.status_code}'
+            continue
+        if response.status_code != 200:
+            raise OCRServiceError(f'OCR service returned {response.status_code}: {response.text[:200]}')
+
+        try:
+            data = response.json()
+        except ValueError:
+            raise OCRServiceError(f"OCR service returned a non-JSON body ({response.headers.get('Content-Type', 'no content type')})")
+        if not isinstance(data, dict):
+            raise OCRServiceError('OCR service returned an unexpected JSON body')
+        if 'error' in data:
+            raise OCRServiceError(data['error'])
+        fields = map_fields(data)
+        logger.info(f"OCR service answered {filename} from tier {response.headers.get('X-OCR-Tier', 'unknown')}")
+        confidence = 0.95 if any(v is not None for v in fields.values()) else 0.0
+        return {'fields': fields, 'confidence': confidence}
+
+    if out_of_time or (deadline is not None and time.monotonic() >= deadline):
+        raise OCRServiceTimeout(error)
+    raise OCRServiceError(error)
@@ -0,0 +1,110 @@
+import os
+import logging
+import threading
+import bcrypt
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+_slots = None
+_slots_lock = threading.Lock()
+
+# Default cost per scheme: scrypt N, PBKDF2 iterations, bcrypt log2 rounds
+DEFAULT_COSTS = {
+    'scrypt': 32768,
+    'pbkdf2': 600000,
+    'bcrypt': 12,
+}
+
+
+# ────────────────────────────────────────────────────────────
+# KDF Backends
+# ────────────────────────────────────────────────────────────
+
+def hash_with(password, scheme, cost):
+    """Hash a password with an explicit scheme and cost parameter."""
+    if scheme == 'bcrypt':
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cost)).decode('ascii')
+    if scheme == 'scrypt':
+        return generate_password_hash(password, method=f'scrypt:{cost}:8:1')
+    if scheme == 'pbkdf2':
+        return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+    raise ValueError(f'Unsupported password hash scheme: {scheme}')
+
+
+def verify_with(stored_hash, password):
+    """Verify a password against a hash produced by any supported scheme."""
+    if not stored_hash:
+        return False
+    if stored_hash.startswith('$2'):
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('ascii'))
+        except ValueError:
+            return False
+    return check_password_hash(stored_hash, password)
+
+
+def parse_hash_params(stored_hash):
+    """Return (scheme, cost) encoded in a stored hash, or (None, None) if unknown."""
+    if not stored_hash:
+        return None, None
+    try:
+        if stored_hash.startswith('$2'):
+            return 'bcrypt', int(stored_hash.split('$')[2])
+        method = stored_hash.split('$', 1)[0].split(':')
+        if method[0] == 'scrypt':
+            return 'scrypt', int(method[1])
+        if method[0] == 'pbkdf2':
+            return 'pbkdf2', int(method[2])
+    except (IndexError, ValueError):
+        pass
+    return None, None
+
+
+# ────────────────────────────────────────────────────────────
+# Configured Service
+# ────────────────────────────────────────────────────────────
+
+def get_hash_params():
+    """Return the (scheme, cost) configured for this deployment."""
+    scheme = current_app.config.get('PASSWORD_HASH_SCHEME', 'scrypt')
+    if scheme not in DEFAULT_COSTS:
+        raise ValueError(f'Unsupported password hash scheme: {scheme}')
+    cost = current_app.config.get('PASSWORD_HASH_COST') or DEFAULT_COSTS[scheme]
+    return scheme, int(cost)
+
+
+def _get_slots():
+    """Semaphore bounding concurrent KDF calls in this process."""
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                workers = current_app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+                _slots = threading.BoundedSemaphore(workers)
+    return _slots
+
+
+def hash_password(password):
+    """Hash a password with the configured KDF.
+
+    Runs on the calling request thread once one of PASSWORD_HASH_WORKERS slots
+    is free, so a burst of logins queues instead of running every KDF at once
+    (each scrypt hash holds ~32 MiB at the default cost). The KDFs release
+    the GIL, so the slots run in parallel.
+    """
+    scheme, cost = get_hash_params()
+    with _get_slots():
+        return hash_with(password, scheme, cost)
+
+
+def verify_password(stored_hash, password):
+    """Verify a password against its stored hash, in a KDF slot like hash_password."""
+    with _get_slots():
+        return verify_with(stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """Check whether a stored hash was made with different parameters than configured."""
+    return parse_hash_params(stored_hash) != get_hash_params()
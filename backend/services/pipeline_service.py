@@ -0,0 +1,175 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class Stage:
+    """One step of a pipeline.
+
+    func is called with keyword arguments named after `requires` — earlier
+    stages' names or the pipeline's inputs — and its return value becomes this
+    stage's output under `name`. Requiring 'deadline' passes the stage's own
+    deadline (time.monotonic() value, or None) so it can bound its I/O.
+    Stages that touch the database (or anything else bound to the request) set
+    inline=True and run on the calling thread; the rest run on the pipeline
+    pool, each in its own app context.
+
+    budget is the share of the time left before the pipeline deadline the
+    stage may take. A stage that misses it, raises TimeoutError (e.g. its I/O
+    hit the deadline) or depends on a stage that did outputs fallback() if
+    given; otherwise the run fails with DEADLINE_EXCEEDED.
+    """
+
+    def __init__(self, name, func, requires=(), inline=False, budget=1.0, fallback=None):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.inline = inline
+        self.budget = budget
+        self.fallback = fallback
+
+    def __repr__(self):
+        return f'<Stage {self.name}>'
+
+
+def _get_pool(workers):
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline')
+    return _pool
+
+
+def time_left(deadline):
+    """Seconds until a time.monotonic() deadline (None = no deadline)."""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _call(stage, outputs, stage_deadline):
+    kwargs = {name: outputs.get(name) for name in stage.requires}
+    if 'deadline' in stage.requires:
+        kwargs['deadline'] = stage_deadline
+    return stage.func(**kwargs)
+
+
+def run_stages(stages, inputs, deadline=None, timings=None):
+    """Run a stage graph and return every input and stage output by name.
+
+    A stage starts as soon as everything it requires is available, so
+    independent stages overlap and the graph takes as long as its slowest
+    dependency chain. With PIPELINE_WORKERS = 0 stages run one at a time on
+    the calling thread. The first stage error is raised once the stages already
+    running have finished.
+
+    Pool stages are abandoned when their budget runs out (the thread finishes
+    on its own, so stages should bound their I/O by their deadline); inline
+    stages are not interrupted but do not start once time is up. If `timings`
+    is a dict it receives, per stage, status (ok/timeout/skipped), ms and
+    budget_ms.
+    """
+    workers = current_app.config.get('PIPELINE_WORKERS', 4)
+    app = current_app._get_current_object()
+    outputs = dict(inputs)
+    timings = {} if timings is None else timings
+    pending = list(stages)
+    running = {}
+    degraded = set()
+
+    def call_in_context(stage, available, stage_deadline):
+        with app.app_context():
+            return _call(stage, available, stage_deadline)
+
+    def record(stage, status, started, stage_deadline):
+        budget = None if stage_deadline is None else (stage_deadline - started) * 1000
+        timings[stage.name] = {
+            'status': status,
+            'ms': round((time.monotonic() - started) * 1000, 1),
+            'budget_ms': None if budget is None else round(budget, 1),
+        }
+
+    def degrade(stage, status, started, stage_deadline):
+        if stage.fallback is None:
+            logger.warning(f'Pipeline stage {stage.name} {status}, no fallback: deadline exceeded')
+            raise ValueError('DEADLINE_EXCEEDED')
+        outputs[stage.name] = stage.fallback()
+        degraded.add(stage.name)
+        record(stage, status, started, stage_deadline)
+
+    try:
+        while pending or running:
+            ready = [stage for stage in pending if all(name in outputs for name in stage.requires if name != 'deadline')]
+            if not ready and not running:
+                missing = {name for stage in pending for name in stage.requires} - set(outputs) - {'deadline'}
+                raise ValueError(f'Pipeline stages cannot run, missing: {", ".join(sorted(missing))}')
+
+            ran_inline = False
+            for stage in ready:
+                pending.remove(stage)
+                started = time.monotonic()
+                left = time_left(deadline)
+                stage_deadline = None if left is None else started + max(0.0, left) * stage.budget
+                if degraded.intersection(stage.requires):
+                    degrade(stage, 'skipped', started, stage_deadline)
+                elif left is not None and left <= 0:
+                    degrade(stage, 'timeout', started, stage_deadline)
+                elif workers and not stage.inline:
+                    future = _get_pool(workers).submit(call_in_context, stage, dict(outputs), stage_deadline)
+                    running[future] = (stage, started, stage_deadline)
+                    continue
+                else:
+                    try:
+                        outputs[stage.name] = _call(stage, outputs, stage_deadline)
+                        record(stage, 'ok', started, stage_deadline)
+                    except TimeoutError as e:
+                        logger.warning(f'Pipeline stage {stage.name} timed out: {e}')
+                        degrade(stage, 'timeout', started, stage_deadline)
+                ran_inline = True
+
+            if running and not ran_inline:
+                deadlines = [stage_deadline for _, _, stage_deadline in running.values() if stage_deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, started, stage_deadline = running.pop(future)
+                    try:
+                        outputs[stage.name] = future.result()
+                        record(stage, 'ok', started, stage_deadline)
+                    except TimeoutError as e:
+                        logger.warning(f'Pipeline stage {stage.name} timed out: {e}')
+                        degrade(stage, 'timeout', started, stage_deadline)
+                now = time.monotonic()
+                for future, (stage, started, stage_deadline) in list(running.items()):
+                    if stage_deadline is not None and now >= stage_deadline:
+                        del running[future]
+                        future.cancel()
+                        logger.warning(f'Pipeline stage {stage.name} ran out of its '
+                                       f'{(stage_deadline - started) * 1000:.0f}ms budget')
+                        degrade(stage, 'timeout', started, stage_deadline)
+    except Exception:
+        for future in running:
+            future.cancel()
+        wait(running, timeout=time_left(deadline) if deadline is not None else None)
+        raise
+    return outputs
+
+
+def describe_timings(timings, deadline=None):
+    """One log line of stage timings (ms taken/ms budget) and the time left."""
+    parts = []
+    for name, timing in timings.items():
+        part = f"{name} {timing['status']} {timing['ms']:.0f}ms"
+        if timing['budget_ms'] is not None:
+            part += f"/{timing['budget_ms']:.0f}ms"
+        parts.append(part)
+    line = ', '.join(parts)
+    if deadline is not None:
+        line += f'; {time_left(deadline) * 1000:.0f}ms left before deadline'
+    return line
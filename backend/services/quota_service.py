@@ -0,0 +1,73 @@
+import logging
+from flask import current_app
+from sqlalchemy import select, update, func, or_
+from models import db
+from models.user import User
+from services.auth_service import invalidate_principal
+
+logger = logging.getLogger(__name__)
+
+
+def _has_slot():
+    """SQL condition: a metered user may take another validation slot."""
+    limit = current_app.config.get('FREE_VALIDATION_LIMIT', 10)
+    return or_(User.is_paid.is_(True), func.coalesce(User.validation_count, 0) < limit)
+
+
+def check_validation_quota(user_id):
+    """Raise ValueError('USAGE_LIMIT_REACHED') if reserve_validation would refuse
+    the user now. Reads the current count from the database, not the cached
+    principal; takes no slot, so reserve_validation still decides atomically.
+    """
+    blocked = db.session.execute(
+        select(User.id).where(User.id == user_id, User.role == 'user', ~_has_slot())
+    ).first()
+    if blocked is not None:
+        raise ValueError('USAGE_LIMIT_REACHED')
+
+
+def reserve_validation(user_id):
+    """Atomically reserve one validation slot for a user before running the pipeline.
+
+    Uses a single conditional UPDATE ... RETURNING so concurrent requests cannot
+    all pass the limit check. Users with role 'user' are counted (free users only
+    while under FREE_VALIDATION_LIMIT); other roles are unmetered.
+    Returns True if a slot was taken (and must be released on failure), False if
+    the user is unmetered. The reservation is committed immediately.
+    """
+    counted = func.coalesce(User.validation_count, 0)
+    stmt = (
+        update(User)
+        .where(User.id == user_id, User.role == 'user', _has_slot())
+        .values(validation_count=counted + 1)
+        .returning(User.validation_count)
+        .execution_options(synchronize_session=False)
+    )
+    row = db.session.execute(stmt).first()
+    db.session.commit()
+
+    if row is not None:
+        invalidate_principal(user_id)
+        return True
+
+    # No slot taken: either the user is unmetered or the free limit is reached
+    user = db.session.get(User, user_id)
+    if not user:
+        raise ValueError('USER_NOT_FOUND')
+    if user.role == 'user':
+        raise ValueError('USAGE_LIMIT_REACHED')
+    return False
+
+
+def release_validation(user_id):
+    """Give back a slot taken by reserve_validation after a failed pipeline run."""
+    stmt = (
+        update(User)
+        .where(User.id == user_id, User.validation_count > 0)
+        .values(validation_count=User.validation_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+    invalidate_principal(user_id)
+    logger.info(f'Released validation reservation for user {user_id}')
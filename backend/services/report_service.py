@@ -1,24 +1,72 @@
+import io
 import os
+import uuid
+import logging
+from types import SimpleNamespace
+from functools import lru_cache
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from datetime import datetime
+from datetime import timezone
+from flask import current_app
+from sqlalchemy import event
+from models.result import Result
+from storage import get_storage
+from utils.cache_utils import TTLCache
+from utils.file_utils import get_staging_dir
 
+logger = logging.getLogger(__name__)
 
-def generate_validation_report(document, result, output_path):
-    """Generate a PDF validation report for a document result."""
-    doc = SimpleDocTemplate(output_path, pagesize=letter)
+# Bump whenever the report layout changes so cached and stored copies are replaced
+REPORT_TEMPLATE_VERSION = 2
+
+_report_cache = None
+
+
+def _percent(score):
+    return f"{score * 100:.2f}%" if score is not None else "N/A"
+
+
+@lru_cache(maxsize=1)
+def _get_styles():
+    """Paragraph and table styles, built once per process and shared by every render."""
     styles = getSampleStyleSheet()
+    return {
+        'title': styles['Title'],
+        'heading': styles['Heading2'],
+        'normal': styles['Normal'],
+        'footer': ParagraphStyle(name='Footer', fontSize=8, textColor=colors.grey),
+        'info_table': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('PADDING', (0, 0), (-1, -1), 6),
+        ]),
+        'data_table': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('PADDING', (0, 0), (-1, -1), 6),
+        ]),
+    }
+
+
+def generate_validation_report(document, result, output):
+    """Generate a PDF validation report for a document result.
+
+    output is a path or a writable binary buffer. Rendering is deterministic for
+    a given result, so the bytes can be cached and validated with an ETag.
+    """
+    doc = SimpleDocTemplate(output, pagesize=letter, invariant=True)
+    styles = _get_styles()
     elements = []
 
     # Title
-    title_style = styles['Title']
-    elements.append(Paragraph("Document Validation Report", title_style))
+    elements.append(Paragraph("Document Validation Report", styles['title']))
     elements.append(Spacer(1, 20))
 
     # Document Information
-    elements.append(Paragraph("<b>Document Information</b>", styles['Heading2']))
+    elements.append(Paragraph("<b>Document Information</b>", styles['heading']))
     doc_info = [
         ["Filename", document.filename],
         ["File Type", document.file_type.upper()],
@@ -26,16 +74,12 @@ def generate_validation_report(document, result, output_path):
         ["User ID", str(document.user_id)]
     ]
     t1 = Table(doc_info, colWidths=[150, 300])
-    t1.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
+    t1.setStyle(styles['info_table'])
     elements.append(t1)
     elements.append(Spacer(1, 20))
 
     # Validation Result
-    elements.append(Paragraph("<b>Validation Result</b>", styles['Heading2']))
+    elements.append(Paragraph("<b>Validation Result</b>", styles['heading']))
     
     verdict_color = colors.red
     if result.verdict == 'AUTHENTIC':
@@ -44,49 +88,159 @@ def generate_validation_report(document, result, output_path):
         verdict_color = colors.orange
 
     res_info = [
-        ["Verdict", Paragraph(f"<font color={verdict_color.hexval()}><b>{result.verdict}</b></font>", styles['Normal'])],
-        ["Overall Authenticity Score", f"{result.score * 100:.2f}%"],
-        ["AI Visual Confidence (CNN)", f"{result.cnn_score * 100:.2f}%"],
-        ["OCR Text Confidence", f"{result.ocr_confidence * 100:.2f}%"],
-        ["Database Match Score", f"{result.db_match_score * 100:.2f}%"],
+        ["Verdict", Paragraph(f"<font color={verdict_color.hexval()}><b>{result.verdict}</b></font>", styles['normal'])],
+        ["Overall Authenticity Score", _percent(result.final_score)],
+        ["AI Visual Confidence (CNN)", _percent(result.cnn_score)],
+        ["OCR Text Confidence", _percent(result.ocr_confidence)],
+        ["Database Match Score", _percent(result.db_match_score)],
         ["Validation Timestamp", result.validated_at.strftime("%Y-%m-%d %H:%M:%S") if result.validated_at else "N/A"]
     ]
     t2 = Table(res_info, colWidths=[150, 300])
-    t2.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
+    t2.setStyle(styles['info_table'])
     elements.append(t2)
     elements.append(Spacer(1, 20))
 
     # Extracted Data
     if result.extracted_data:
-        elements.append(Paragraph("<b>Extracted Data Verification</b>", styles['Heading2']))
+        elements.append(Paragraph("<b>Extracted Data Verification</b>", styles['heading']))
         data_rows = [["Field", "Value", "Match status"]]
         for field, value in result.extracted_data.items():
-            match = result.match_details.get(field, False)
+            match = (result.field_matches or {}).get(field, False)
             match_text = "PASSED" if match else "FAILED"
             match_color = colors.green if match else colors.red
             data_rows.append([
                 field.capitalize(), 
                 str(value), 
-                Paragraph(f"<font color={match_color.hexval()}>{match_text}</font>", styles['Normal'])
+                Paragraph(f"<font color={match_color.hexval()}>{match_text}</font>", styles['normal'])
             ])
         
         t3 = Table(data_rows, colWidths=[100, 250, 100])
-        t3.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
+        t3.setStyle(styles['data_table'])
         elements.append(t3)
 
     # Footer
     elements.append(Spacer(1, 40))
-    footer_text = f"Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} by Document-Validator AI System."
-    elements.append(Paragraph(footer_text, ParagraphStyle(name='Footer', fontSize=8, textColor=colors.grey)))
+    footer_text = f"Report generated by Document-Validator AI System (template v{REPORT_TEMPLATE_VERSION})."
+    elements.append(Paragraph(footer_text, styles['footer']))
 
     doc.build(elements)
-    return output_path
+    return output
+
+
+def _validated_stamp(result):
+    if not result.validated_at:
+        return 0
+    return int(result.validated_at.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+
+def get_report_version(result):
+    """Identity of a rendered report: result id, validation time and template version."""
+    return f'{result.id}-{_validated_stamp(result)}-v{REPORT_TEMPLATE_VERSION}'
+
+
+def get_report_etag(result):
+    """Strong validator for a result's report (rendering is deterministic)."""
+    return f'report-{get_report_version(result)}'
+
+
+def get_report_key(result):
+    """Storage key of the rendered report for a result."""
+    return f'reports/{result.id}/{_validated_stamp(result)}-v{REPORT_TEMPLATE_VERSION}.pdf'
+
+
+def _get_report_cache():
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = TTLCache(maxsize=current_app.config.get('REPORT_CACHE_SIZE', 128), ttl=0)
+    return _report_cache
+
+
+def render_report(document, result):
+    """Return the report PDF bytes, rendering into memory only on a cache miss."""
+    cache = _get_report_cache()
+    version = get_report_version(result)
+    pdf = cache.get(version)
+    if pdf is None:
+        buffer = io.BytesIO()
+        generate_validation_report(document, result, buffer)
+        pdf = buffer.getvalue()
+        cache.set(version, pdf)
+    return pdf
+
+
+def snapshot_report(document, result):
+    """Plain, picklable copy of everything a report render needs, so reports can
+    be rendered in worker processes without ORM objects or an app context.
+    """
+    return {
+        'version': get_report_version(result),
+        'document': {
+            'id': document.id,
+            'filename': document.filename,
+            'file_type': document.file_type,
+            'uploaded_at': document.uploaded_at,
+            'user_id': document.user_id,
+        },
+        'result': {
+            'id': result.id,
+            'verdict': result.verdict,
+            'final_score': result.final_score,
+            'cnn_score': result.cnn_score,
+            'ocr_confidence': result.ocr_confidence,
+            'db_match_score': result.db_match_score,
+            'validated_at': result.validated_at,
+            'extracted_data': result.extracted_data,
+            'field_matches': result.field_matches,
+        },
+    }
+
+
+def render_report_snapshot(snapshot):
+    """Render a snapshot_report() copy to PDF bytes (process-pool entry point)."""
+    buffer = io.BytesIO()
+    generate_validation_report(
+        SimpleNamespace(**snapshot['document']), SimpleNamespace(**snapshot['result']), buffer
+    )
+    return buffer.getvalue()
+
+
+def get_cached_report(version):
+    """Return already rendered report bytes for a report version, or None."""
+    return _get_report_cache().get(version)
+
+
+def ensure_report(document, result):
+    """Put the report into storage once per report version and return its key.
+
+    Used when downloads are offloaded to the front web server or object storage.
+    Each write goes through a unique staging file, so concurrent downloads of the
+    same document never overwrite each other's output.
+    """
+    storage = get_storage()
+    key = get_report_key(result)
+    if storage.exists(key):
+        return key
+
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    tmp_path = os.path.join(get_staging_dir(), f'{uuid.uuid4().hex}.report.pdf')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(render_report(document, result))
+        storage.put_file(key, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return key
+
+
+@event.listens_for(Result, 'after_delete')
+def _delete_report_on_result_delete(mapper, connection, target):
+    """Drop cached and stored reports when their result goes away (e.g. re-validation)."""
+    if _report_cache is not None:
+        _report_cache.pop(get_report_version(target))
+    try:
+        storage = get_storage()
+        for key, _ in list(storage.iter_keys(f'reports/{target.id}/')):
+            storage.delete(key)
+    except Exception as e:
+        logger.warning(f'Could not delete stored report for result {target.id}: {e}')
@@ -0,0 +1,267 @@
+import os
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, update, delete, or_
+from models import db
+from models.upload_session import UploadSession
+from services.blob_service import adopt_blob
+from services.upload_service import create_document
+from utils.file_utils import (
+    allowed_file, generate_stored_name, get_safe_filename,
+    get_session_dir, get_session_part_path, inspect_file, STREAM_CHUNK_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+
+def create_upload_session(user_id, filename, total_size):
+    """Start a resumable upload and allocate its sparse backing file."""
+    if not filename:
+        raise ValueError('Filename is required')
+    if not allowed_file(filename):
+        raise ValueError('File type not allowed. Allowed types: pdf, jpg, jpeg, png')
+
+    try:
+        total_size = int(total_size)
+    except (TypeError, ValueError):
+        raise ValueError('A valid file size is required')
+    max_size = current_app.config['MAX_RESUMABLE_FILE_SIZE']
+    if total_size <= 0:
+        raise ValueError('A valid file size is required')
+    if total_size > max_size:
+        raise ValueError(f'File exceeds the maximum size of {max_size // (1024 * 1024)}MB')
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=get_safe_filename(filename),
+        file_type=filename.rsplit('.', 1)[1].lower(),
+        total_size=total_size,
+        offset=0
+    )
+
+    # Truncating to the declared size creates a sparse file on common filesystems
+    os.makedirs(get_session_dir(), exist_ok=True)
+    with open(get_session_part_path(session.id), 'wb') as f:
+        f.truncate(total_size)
+
+    db.session.add(session)
+    db.session.commit()
+
+    logger.info(f'Upload session {session.id} created for user {user_id} ({total_size} bytes)')
+    return session.to_dict()
+
+
+def get_upload_session(session_id, user_id):
+    """Get an upload session, verifying ownership."""
+    session = db.session.get(UploadSession, session_id)
+    if not session:
+        raise ValueError('NOT_FOUND')
+    if session.user_id != user_id:
+        raise ValueError('FORBIDDEN')
+    return session
+
+
+def _claim_chunk(session_id, offset):
+    """Claim the right to write the chunk at offset; returns a token or None.
+
+    A conditional UPDATE so exactly one request wins: the offset must still be
+    current and no other request may hold an unexpired claim.
+    """
+    now = datetime.now(timezone.utc)
+    token = uuid.uuid4().hex
+    ttl = current_app.config.get('UPLOAD_CHUNK_TIMEOUT', 300)
+    claimed = db.session.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == session_id,
+            UploadSession.offset == offset,
+            or_(UploadSession.writer.is_(None), UploadSession.writer_expires_at < now)
+        )
+        .values(writer=token, writer_expires_at=now + timedelta(seconds=ttl))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return token if claimed else None
+
+
+def write_chunk(session_id, user_id, offset, stream):
+    """Write a chunk at the given offset and return the updated session dict.
+
+    The offset must equal the number of bytes already received, so chunks are
+    applied in order and a retried chunk is rejected instead of duplicated.
+    The chunk's byte range is claimed before anything is written, so of two
+    concurrent requests for the same offset only one touches the file.
+    """
+    session = get_upload_session(session_id, user_id)
+    if offset is None or offset != session.offset:
+        raise ValueError('OFFSET_MISMATCH')
+    token = _claim_chunk(session.id, offset)
+    if token is None:
+        raise ValueError('OFFSET_MISMATCH')
+
+    remaining = session.total_size - offset
+    written = 0
+    try:
+        with open(get_session_part_path(session.id), 'r+b') as f:
+            f.seek(offset)
+            while True:
+                chunk = stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > remaining:
+                    raise ValueError('Chunk exceeds the declared file size')
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # Give the offset back; the next attempt rewrites the same range
+        db.session.rollback()
+        _release_chunk(session.id, token, offset)
+        raise
+
+    # Advance the offset and drop the claim, unless it lapsed and was taken over
+    updated = _release_chunk(session.id, token, offset + written)
+    if not updated:
+        raise ValueError('OFFSET_MISMATCH')
+
+    db.session.refresh(session)
+    return session.to_dict()
+
+
+def _release_chunk(session_id, token, new_offset):
+    updated = db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session_id, UploadSession.writer == token)
+        .values(offset=new_offset, writer=None, writer_expires_at=None, updated_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return updated
+
+
+def finalize_upload_session(session_id, user_id):
+    """Validate a fully received upload and turn it into a Document.
+
+    The session is claimed like a chunk at its final offset first, so a
+    concurrent finalize, chunk write, cancel or cleanup pass cannot read or
+    remove the file while it is inspected and moved into the blob store.
+    """
+    session = get_upload_session(session_id, user_id)
+    if session.offset < session.total_size:
+        raise ValueError('INCOMPLETE')
+    token = _claim_chunk(session.id, session.total_size)
+    if token is None:
+        raise ValueError('SESSION_BUSY')
+
+    # Same content checks as save_document: magic bytes, size limit and hash
+    part_path = get_session_part_path(session.id)
+    try:
+        file_size, content_hash = inspect_file(
+            part_path, session.file_type,
+            max_size=current_app.config['MAX_RESUMABLE_FILE_SIZE']
+        )
+    except ValueError:
+        _discard_session(session.id, token)
+        raise
+
+    filename, file_type, total_size = session.filename, session.file_type, session.total_size
+    try:
+        adopt_blob(part_path, content_hash, file_size)
+        # Only the claim holder may remove the session; losing the claim
+        # (it lapsed and was taken over) rolls back the blob reference
+        if not _delete_session(session_id, token):
+            raise ValueError('SESSION_BUSY')
+        document = create_document(
+            filename, generate_stored_name(filename), file_type, file_size, content_hash, user_id
+        )
+    except BaseException:
+        db.session.rollback()
+        if os.path.exists(part_path):
+            _release_chunk(session_id, token, total_size)
+        else:
+            _discard_session(session_id, token)
+        raise
+
+    logger.info(f'Upload session {session_id} finalized as document {document.id}')
+    return document.to_dict()
+
+
+def cancel_upload_session(session_id, user_id):
+    """Abort an upload session and remove its partial file."""
+    session = get_upload_session(session_id, user_id)
+    if not _discard_session(session.id):
+        raise ValueError('SESSION_BUSY')
+    return True
+
+
+def _delete_session(session_id, token=None, older_than=None):
+    """Delete a session row unless another request holds a live claim on it.
+
+    With a token only the request holding that claim may delete it. Returns
+    whether the row was deleted; the caller commits.
+    """
+    now = datetime.now(timezone.utc)
+    conditions = [UploadSession.id == session_id]
+    if token is not None:
+        conditions.append(UploadSession.writer == token)
+    else:
+        conditions.append(or_(UploadSession.writer.is_(None), UploadSession.writer_expires_at < now))
+    if older_than is not None:
+        conditions.append(UploadSession.updated_at < older_than)
+    return db.session.execute(
+        delete(UploadSession).where(*conditions).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _discard_session(session_id, token=None, older_than=None):
+    deleted = _delete_session(session_id, token, older_than)
+    db.session.commit()
+    if deleted:
+        part_path = get_session_part_path(session_id)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return deleted
+
+
+def cleanup_stale_sessions(max_age_seconds=None):
+    """Remove upload sessions that have not received data within max_age_seconds.
+    Sessions a request is still writing or finalizing are left alone.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = current_app.config['UPLOAD_SESSION_TTL']
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+
+    stale = [session_id for session_id, in db.session.execute(
+        select(UploadSession.id).where(UploadSession.updated_at < cutoff)
+    )]
+    removed = sum(_discard_session(session_id, older_than=cutoff) for session_id in stale)
+
+    if removed:
+        logger.info(f'Cleaned up {removed} stale upload sessions')
+    return removed
+
+
+def start_session_cleanup(app):
+    """Run cleanup_stale_sessions periodically on a daemon thread."""
+    interval = app.config.get('UPLOAD_SESSION_CLEANUP_INTERVAL', 0)
+    if not interval:
+        return None
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                with app.app_context():
+                    cleanup_stale_sessions()
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f'Upload session cleanup error: {e}', exc_info=True)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=loop, name='upload-session-cleanup', daemon=True)
+    thread.start()
+    return stop
@@ -1,10 +1,17 @@
 import os
+import uuid
 import logging
+from flask import current_app
+from werkzeug.sansio.multipart import File
 from models import db
 from models.document import Document
+from services.blob_service import store_blob, adopt_blob, blob_key
+from services.derivative_service import enqueue_derivatives, delete_derivatives
+from storage import get_storage
+from services.validation_service import enqueue_validation
 from utils.file_utils import (
-    allowed_file, generate_stored_name, get_safe_filename,
-    get_upload_path, delete_file, ensure_upload_dir, validate_file_content
+    allowed_file, generate_stored_name, get_safe_filename, ensure_upload_dir,
+    get_staging_dir, iter_multipart, StagedFile, SpooledUpload
 )
 
 logger = logging.getLogger(__name__)
@@ -21,38 +28,152 @@ def save_document(file, user_id):
     # Ensure upload directory exists
     ensure_upload_dir()
 
-    # Validate file content matches extension (magic bytes check)
-    file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-    if file_ext and not validate_file_content(file, file_ext):
-        raise ValueError('File content does not match its extension')
+    # Get file extension
+    file_type = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'unknown'
 
     # Generate safe names
     original_name = get_safe_filename(file.filename)
     stored_name = generate_stored_name(file.filename)
 
-    # Save file to disk
-    file_path = get_upload_path(stored_name)
-    file.save(file_path)
+    # Move the file into the content-addressed blob store; identical files are
+    # stored only once. Parts spooled by UploadRequest were checked and hashed
+    # while the request was parsed and are adopted as they are. Any other
+    # stream is copied in a single pass: magic bytes check, size limit, byte
+    # count and SHA-256 hash are computed while copying.
+    stream = file.stream
+    if isinstance(stream, SpooledUpload) and stream.extension == file_type:
+        file_size, content_hash = stream.finish()
+        adopt_blob(stream.path, content_hash, file_size)
+        stream.adopted(get_storage().local_path(blob_key(content_hash)))
+    else:
+        content_hash, file_size = store_blob(
+            stream, file_type,
+            max_size=current_app.config.get('MAX_FILE_SIZE')
+        )
+
+    document = create_document(original_name, stored_name, file_type, file_size, content_hash, user_id)
 
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    logger.info(f'Document uploaded: {original_name} by user {user_id}')
+    return document.to_dict()
 
-    # Get file extension
-    file_type = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'unknown'
 
-    # Create database record
+def save_documents(stream, boundary, user_id, validate=False):
+    """Store every file of a multipart/form-data batch and create all document
+    records in one transaction.
+
+    The body is parsed incrementally and each file is streamed into its own
+    staging file, so memory use does not grow with the batch. Files that fail
+    the checks are reported individually and do not affect the others. Returns
+    one status entry per file part, in request order.
+    """
+    max_size = current_app.config.get('MAX_FILE_SIZE')
+    max_files = current_app.config.get('MAX_BATCH_FILES', 500)
+    staging_dir = get_staging_dir()
+
+    results = []
+    staged = []
+    current = None  # (status entry, StagedFile or None) of the file part being read
+
+    try:
+        for part, chunk, more in iter_multipart(stream, boundary, max_parts=max_files * 2 + 100):
+            if not isinstance(part, File):
+                continue
+
+            if current is None:
+                entry = {'filename': part.filename, 'status': 'rejected'}
+                results.append(entry)
+                writer = None
+                if len(results) > max_files:
+                    entry['error'] = f'Too many files (maximum {max_files} per request)'
+                elif not part.filename or not allowed_file(part.filename):
+                    entry['error'] = 'File type not allowed. Allowed types: pdf, jpg, jpeg, png'
+                else:
+                    file_type = part.filename.rsplit('.', 1)[1].lower()
+                    incoming_path = os.path.join(staging_dir, f'{uuid.uuid4().hex}.incoming')
+                    writer = StagedFile(incoming_path, file_type, max_size)
+                current = (entry, writer)
+
+            entry, writer = current
+            if writer is not None:
+                try:
+                    writer.write(chunk)
+                    if not more:
+                        file_size, content_hash = writer.finish()
+                        staged.append((entry, writer.path, file_size, content_hash))
+                except ValueError as e:
+                    entry['error'] = str(e)
+                    current = (entry, None)
+            if not more:
+                current = None
+
+        if current is not None and current[1] is not None:
+            current[1].abort()
+
+        documents = []
+        while staged:
+            # Still listed while it is adopted, so a failure cleans it up below
+            entry, path, file_size, content_hash = staged[0]
+            adopt_blob(path, content_hash, file_size)
+            staged.pop(0)
+            filename = entry['filename']
+            documents.append((entry, Document(
+                filename=get_safe_filename(filename),
+                stored_name=generate_stored_name(filename),
+                file_type=filename.rsplit('.', 1)[1].lower(),
+                file_size=file_size,
+                content_hash=content_hash,
+                blob_hash=content_hash,
+                user_id=user_id
+            )))
+
+        # One flush inserts every row (executemany with RETURNING), one commit
+        db.session.add_all([document for _, document in documents])
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        if current is not None and current[1] is not None:
+            current[1].abort()
+        for _, path, _, _ in staged:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    for entry, document in documents:
+        entry['status'] = 'stored'
+        entry['document'] = document.to_dict()
+        enqueue_derivatives(get_document_key(document), document.file_type)
+        if validate:
+            enqueue_validation(document.id, user_id)
+            entry['validation'] = 'queued'
+
+    logger.info(f'Batch upload by user {user_id}: {len(documents)}/{len(results)} files stored')
+    return results
+
+
+def create_document(filename, stored_name, file_type, file_size, content_hash, user_id):
+    """Create the database record for a file already validated and added to the blob store."""
     document = Document(
-        filename=original_name,
+        filename=filename,
         stored_name=stored_name,
         file_type=file_type,
         file_size=file_size,
+        content_hash=content_hash,
+        blob_hash=content_hash,
         user_id=user_id
     )
     db.session.add(document)
     db.session.commit()
 
-    logger.info(f'Document uploaded: {original_name} by user {user_id}')
-    return document.to_dict()
+    # Thumbnails/previews are produced in the background after the upload
+    enqueue_derivatives(get_document_key(document), file_type)
+    return document
+
+
+def get_document_key(document):
+    """Get the storage key of a document's file (blob store, or legacy per-upload file)."""
+    if document.blob_hash:
+        return blob_key(document.blob_hash)
+    return document.stored_name
 
 
 def get_user_documents(user_id, page=1, per_page=10):
@@ -79,9 +200,15 @@ def delete_document(doc_id, user_id):
     """Delete a document and its file, verifying ownership."""
     document = get_document(doc_id, user_id)
 
-    # Delete the file from disk
-    if not delete_file(document.stored_name):
-        logger.warning(f'Physical file not found for document {doc_id}: {document.stored_name}')
+    # Legacy documents own their file and delete it directly. Blob-backed files
+    # are shared: deleting the record releases the blob reference (see
+    # blob_service) and blob GC reclaims the file once unreferenced.
+    # Derivatives follow the same rule: blob derivatives are shared and deleted
+    # once the last reference is released, legacy ones are deleted here.
+    if not document.blob_hash:
+        delete_derivatives(document.stored_name)
+        if not get_storage().delete(document.stored_name):
+            logger.warning(f'Physical file not found for document {doc_id}: {document.stored_name}')
 
     # Delete the database record (cascades to Result)
     db.session.delete(document)
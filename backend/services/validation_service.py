@@ -1,15 +1,32 @@
+import io
 import os
+import time
 import random
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from models import db
 from models.document import Document
 from models.result import Result
 from models.institution_record import InstitutionRecord
+from services.quota_service import reserve_validation, release_validation, check_validation_quota
+from services.lease_service import run_once
+from services.pipeline_service import Stage, run_stages, time_left, describe_timings
+from services import ocr_client
+from storage import get_storage
+from utils.file_utils import SharedFileReader, STREAM_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
+_executor = None
+_executor_lock = threading.Lock()
+
 
 def get_genai_model():
     """Initialize and return the Gemini model."""
@@ -28,13 +45,54 @@ def get_genai_model():
 # AI Pipeline Implementation
 # ────────────────────────────────────────────────────────────
 
-def mock_cnn_predict(image_path):
+def mock_cnn_predict(image_file):
     """[STUB] CNN visual analysis — replace with real model inference once trained."""
     return round(random.uniform(0.6, 0.95), 4)
 
 
-def extract_data_with_gemini(image_path):
-    """Use Gemini AI to extract text data from document images."""
+EXTRACTION_PROMPT = """
+        Analyze this document image and extract the following fields in JSON format:
+        - name
+        - id_number
+        - institution
+        - date
+        
+        If a field is missing, use null. Return ONLY the JSON object.
+        """
+
+# Fields a region-of-interest extraction must find before the full page is skipped
+ROI_REQUIRED_FIELDS = ('name', 'id_number')
+
+
+def _gemini_fields(model, img, deadline=None):
+    """One Gemini call: the parsed JSON fields for an image."""
+    if deadline is None:
+        response = model.generate_content([EXTRACTION_PROMPT, img])
+    else:
+        left = time_left(deadline)
+        if left <= 0:
+            raise TimeoutError('Gemini call skipped: deadline exceeded')
+        response = model.generate_content([EXTRACTION_PROMPT, img], request_options={'timeout': left})
+    text = response.text.strip()
+
+    # Strip markdown code blocks if present
+    if text.startswith('```json'):
+        text = text[7:-3].strip()
+    elif text.startswith('```'):
+        text = text[3:-3].strip()
+
+    return json.loads(text)
+
+
+def extract_data_with_gemini(image_file, deadline=None):
+    """Use Gemini AI to extract text data from document images.
+
+    With OCR_ROI_CROPPING the text regions of the page are sent as a compact
+    mosaic first (fewer image tokens); the full page is sent only if no mosaic
+    could be built or the mosaic answer lacks a required field. Each call is
+    given the time left before the deadline (a time.monotonic() value), and
+    TimeoutError is raised if the deadline cuts the extraction short.
+    """
     model = get_genai_model()
     if not model:
         return {
@@ -45,37 +103,53 @@ def extract_data_with_gemini(image_path):
     try:
         # Load image
         from PIL import Image
-        img = Image.open(image_path)
-
-        prompt = """
-        Analyze this document image and extract the following fields in JSON format:
-        - name
-        - id_number
-        - institution
-        - date
-        
-        If a field is missing, use null. Return ONLY the JSON object.
-        """
-        
-        response = model.generate_content([prompt, img])
-        text = response.text.strip()
-        
-        # Strip markdown code blocks if present
-        if text.startswith('```json'):
-            text = text[7:-3].strip()
-        elif text.startswith('```'):
-            text = text[3:-3].strip()
-            
-        fields = json.loads(text)
+        img = Image.open(image_file)
+        img.load()
+
+        if current_app.config.get('OCR_ROI_CROPPING', True):
+            from utils.layout_utils import build_roi_mosaic
+            mosaic = build_roi_mosaic(img, current_app.config.get('OCR_ROI_MAX_AREA', 0.7))
+            if mosaic is not None:
+                try:
+                    fields = _gemini_fields(model, mosaic, deadline)
+                except json.JSONDecodeError:
+                    fields = {}
+                if isinstance(fields, dict) and all(fields.get(key) for key in ROI_REQUIRED_FIELDS):
+                    return {'fields': fields, 'confidence': 0.95}
+                logger.info('Region-of-interest extraction incomplete; retrying with the full page')
+
+        fields = _gemini_fields(model, img, deadline)
         return {
             'fields': fields,
             'confidence': 0.95 # Gemini doesn't return raw per-field confidence easily
         }
     except Exception as e:
+        # Running out of time is not an empty extraction: let the pipeline
+        # record the stage as timed out and the verdict as partial
+        if isinstance(e, (TimeoutError, google_exceptions.DeadlineExceeded)) or \
+                (deadline is not None and time_left(deadline) <= 0):
+            raise TimeoutError(f'Gemini extraction ran out of time: {e}') from e
         logger.error(f"Gemini extraction error: {e}", exc_info=True)
         return {'fields': {}, 'confidence': 0.0}
 
 
+def extract_document_data(image_file, filename, deadline=None):
+    """OCR step: the OCR service when OCR_SERVICE_URL is set, otherwise Gemini directly.
+
+    Failures give an empty extraction, except running out of time before the
+    deadline, which raises TimeoutError.
+    """
+    if not current_app.config.get('OCR_SERVICE_URL'):
+        return extract_data_with_gemini(image_file, deadline)
+    try:
+        return ocr_client.extract(image_file, filename, deadline)
+    except ocr_client.OCRServiceTimeout:
+        raise
+    except ocr_client.OCRServiceError as e:
+        logger.error(f'OCR service extraction failed for {filename}: {e}')
+        return {'fields': {}, 'confidence': 0.0}
+
+
 def verify_against_institution_data(extracted_fields, user_id=None):
     """
     Verify extracted fields against ground-truth data in InstitutionRecord.
@@ -134,19 +208,24 @@ def calculate_verdict(final_score):
         return 'FAKE'
 
 
-def validate_document(doc_id, user_id):
-    """Run the full validation pipeline on a document."""
-    # Step 1: Verify user and check usage limits
-    from models.user import User
-    user = db.session.get(User, user_id)
-    if not user:
-        raise ValueError('USER_NOT_FOUND')
-    
-    # Enforce 10-doc limit for free 'user' role
-    if user.role == 'user' and not user.is_paid:
-        if user.validation_count >= 10:
-            raise ValueError('USAGE_LIMIT_REACHED')
+def validate_document(doc_id, user_id, image_file=None):
+    """Run the full validation pipeline on a document.
+
+    image_file may be an already open binary file with the document's content
+    (e.g. the request body that was just stored) to skip reading it back from
+    storage.
+
+    Concurrent calls for the same document (double clicks, client retries,
+    other workers) are coalesced: one runs the pipeline, the others wait and
+    return its stored result.
+
+    The whole call has VALIDATION_DEADLINE seconds. Waiting for another
+    worker's result and every pipeline stage are bounded by it; see
+    _run_pipeline for what happens when a stage runs out of time.
+    """
+    deadline = time.monotonic() + current_app.config.get('VALIDATION_DEADLINE', 30)
 
+    # Step 1: Verify ownership
     document = db.session.get(Document, doc_id)
     if not document:
         raise ValueError('NOT_FOUND')
@@ -158,53 +237,256 @@ def validate_document(doc_id, user_id):
         logger.info(f'Document {doc_id} already validated, returning existing result')
         return document.result.to_dict()
 
-    # Step 3: Get file path
-    from utils.file_utils import get_upload_path
-    image_path = get_upload_path(document.stored_name)
+    # Step 3: Get the storage key (captured as a plain value — no ORM state is
+    # touched again until the result is saved)
+    from services.upload_service import get_document_key
+    document_key = get_document_key(document)
+    filename = document.filename
+
+    return run_once(
+        doc_id,
+        lambda: _run_pipeline(doc_id, user_id, document_key, filename, image_file, deadline),
+        lambda: _stored_result(doc_id),
+        deadline
+    )
+
+
+def _stored_result(doc_id):
+    """The saved result of a document as a dict, read fresh from the database."""
+    result = db.session.execute(
+        select(Result).where(Result.document_id == doc_id).execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+    return result.to_dict() if result else None
+
+
+class DocumentSource:
+    """Opens independent read streams over one document for the pipeline stages.
+
+    A caller's open file is shared through SharedFileReader views, each with
+    its own position; otherwise (or once it was closed, e.g. a spooled upload
+    adopted into the blob store) every stream is opened from storage. Nothing
+    is read into memory up front, so the OCR client can stream (and rewind)
+    even the largest resumable uploads.
+    """
+
+    def __init__(self, document_key, image_file=None):
+        self.document_key = document_key
+        usable = image_file is not None and not image_file.closed and image_file.seekable()
+        self._file = image_file if usable else None
+        self._lock = threading.Lock()
+
+    def open(self):
+        if self._file is not None:
+            return io.BufferedReader(SharedFileReader(self._file, self._lock), STREAM_CHUNK_SIZE)
+        return get_storage().open(self.document_key)
+
+
+def _open_document(document_key, image_file):
+    """Stage: where the other stages read the document from."""
+    return DocumentSource(document_key, image_file)
 
-    # Step 4 & 5: CNN Prediction (mock for now)
-    cnn_score = mock_cnn_predict(image_path)
 
-    # Step 6: OCR Extraction with Gemini
-    ocr_result = extract_data_with_gemini(image_path)
-    ocr_confidence = ocr_result['confidence']
-    extracted_data = ocr_result['fields']
+def _cnn_stage(document):
+    # Step 5: CNN Prediction (mock for now)
+    with document.open() as stream:
+        return mock_cnn_predict(stream)
 
+
+def _ocr_stage(document, filename, deadline):
+    # Step 6: OCR Extraction (OCR service or Gemini), bounded by the stage deadline
+    with document.open() as stream:
+        return extract_document_data(stream, filename, deadline)
+
+
+def _db_match_stage(ocr, user_id):
     # Step 7: Database Cross-Verification against Institution Data
-    db_result = verify_against_institution_data(extracted_data, user_id)
-    db_match_score = db_result['score']
-    field_matches = db_result['matches']
-
-    # Step 8: Score Combination
-    final_score = round(
-        (cnn_score * 0.4) + (ocr_confidence * 0.2) + (db_match_score * 0.4),
-        4
-    )
-    verdict = calculate_verdict(final_score)
-
-    # Step 9: Save result
-    result = Result(
-        document_id=doc_id,
-        cnn_score=cnn_score,
-        ocr_confidence=ocr_confidence,
-        db_match_score=db_match_score,
-        final_score=final_score,
-        verdict=verdict,
-        extracted_data=extracted_data,
-        field_matches=field_matches
-    )
-    db.session.add(result)
-    
-    # Increment usage count for free users
-    if user.role == 'user':
-        user.validation_count += 1
-        
-    db.session.commit()
+    return verify_against_institution_data(ocr['fields'], user_id)
+
+
+# Each model stage opens its own stream over the document, so stages on the
+# pool never share a file position. A new stage that needs only the document
+# (e.g. a tamper detector) runs alongside CNN and OCR.
+#
+# Budgets are shares of the time left when a stage starts. OCR leaves a tenth
+# for DB matching and saving; CNN runs beside it and gets the same. A stage
+# that runs out of time (or depends on one that did) contributes no score.
+PIPELINE_STAGES = (
+    Stage('document', _open_document, requires=('document_key', 'image_file'), inline=True),
+    Stage('cnn', _cnn_stage, requires=('document',), budget=0.9, fallback=lambda: None),
+    Stage('ocr', _ocr_stage, requires=('document', 'filename', 'deadline'), budget=0.9,
+          fallback=lambda: {'fields': {}, 'confidence': None}),
+    Stage('db_match', _db_match_stage, requires=('ocr', 'user_id'), inline=True,
+          fallback=lambda: {'score': None, 'matches': None}),
+)
+
+# Weight of each stage's score in the final score
+SCORE_WEIGHTS = {'cnn': 0.4, 'ocr': 0.2, 'db_match': 0.4}
+
+
+def combine_scores(scores):
+    """Weighted final score over the stages that produced a score.
+
+    Missing scores (None) drop out and the remaining weights are rescaled, so
+    a partial result is still on the 0-1 scale. None if no stage scored.
+    """
+    weights = {name: weight for name, weight in SCORE_WEIGHTS.items() if scores.get(name) is not None}
+    total = sum(weights.values())
+    if not total:
+        return None
+    return round(sum(scores[name] * weight for name, weight in weights.items()) / total, 4)
+
+
+def _run_pipeline(doc_id, user_id, document_key, filename, image_file=None, deadline=None):
+    """Steps 4-9 of validate_document; runs while holding the document's lease.
 
-    logger.info(f'Document {doc_id} validated: {verdict} (score: {final_score})')
+    Stages that run out of their budget before the deadline are skipped: the
+    verdict comes from the stages that finished and the result is saved with
+    partial=True and the skipped stages listed. If no scoring stage finished,
+    raises ValueError('DEADLINE_EXCEEDED') and nothing is saved or counted.
+    """
+    # Step 4: Reserve a usage slot up front. This commits immediately, so the
+    # long-running model calls below run outside any DB transaction.
+    reserved = reserve_validation(user_id)
+
+    try:
+        # Steps 5-7 run as a stage graph: CNN and OCR overlap on the pipeline
+        # pool, DB matching runs on this thread once OCR is done
+        timings = {}
+        try:
+            outputs = run_stages(PIPELINE_STAGES, {
+                'document_key': document_key, 'filename': filename,
+                'image_file': image_file, 'user_id': user_id
+            }, deadline=deadline, timings=timings)
+        finally:
+            logger.info(f'Document {doc_id} stage timings: {describe_timings(timings, deadline)}')
+        cnn_score = outputs['cnn']
+        ocr_confidence = outputs['ocr']['confidence']
+        extracted_data = outputs['ocr']['fields']
+        db_result = outputs['db_match']
+        db_match_score = db_result['score']
+        field_matches = db_result['matches']
+        skipped_stages = [name for name, timing in timings.items() if timing['status'] != 'ok']
+
+        # Step 8: Score Combination
+        final_score = combine_scores({'cnn': cnn_score, 'ocr': ocr_confidence, 'db_match': db_match_score})
+        if final_score is None:
+            raise ValueError('DEADLINE_EXCEEDED')
+        verdict = calculate_verdict(final_score)
+
+        # Step 9: Save result
+        result = Result(
+            document_id=doc_id,
+            cnn_score=cnn_score,
+            ocr_confidence=ocr_confidence,
+            db_match_score=db_match_score,
+            final_score=final_score,
+            verdict=verdict,
+            extracted_data=extracted_data,
+            field_matches=field_matches,
+            partial=bool(skipped_stages),
+            skipped_stages=skipped_stages or None
+        )
+        db.session.add(result)
+        db.session.commit()
+    except IntegrityError:
+        # A result was saved meanwhile (e.g. by a worker whose lease we took
+        # over after it expired); that one stands
+        db.session.rollback()
+        if reserved:
+            release_validation(user_id)
+        stored = _stored_result(doc_id)
+        if stored is None:
+            raise
+        logger.info(f'Document {doc_id} was validated concurrently, returning that result')
+        return stored
+    except Exception:
+        db.session.rollback()
+        if reserved:
+            release_validation(user_id)
+        raise
+
+    if skipped_stages:
+        logger.warning(f'Document {doc_id} validated partially: {verdict} (score: {final_score}, '
+                       f'skipped: {", ".join(skipped_stages)})')
+    else:
+        logger.info(f'Document {doc_id} validated: {verdict} (score: {final_score})')
     return result.to_dict()
 
 
+def _validate_safely(doc_id, user_id):
+    try:
+        validate_document(doc_id, user_id)
+    except Exception as e:
+        logger.warning(f'Queued validation failed for document {doc_id}: {e}')
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='validation')
+    return _executor
+
+
+def enqueue_validation(doc_id, user_id):
+    """Schedule validate_document on the background pool; the outcome is read
+    later through get_result. With VALIDATION_WORKERS = 0 it runs inline.
+    """
+    workers = current_app.config.get('VALIDATION_WORKERS', 2)
+    if not workers:
+        _validate_safely(doc_id, user_id)
+        return
+
+    app = current_app._get_current_object()
+
+    def task():
+        with app.app_context():
+            _validate_safely(doc_id, user_id)
+
+    _get_executor(workers).submit(task)
+
+
+def upload_and_validate(file, user, run_async=False):
+    """Store an uploaded file and validate it in the same request.
+
+    The pipeline reads the request's upload stream instead of the stored copy
+    where it can: a spooled upload adopted into a local blob store is reopened
+    at its new path; with remote storage it is read back from there. If validation fails the stored document is deleted again.
+    With run_async the validation is queued and only the document is
+    returned; the result is then polled via get_result.
+    Returns (document_dict, result_dict or None).
+    """
+    from services.upload_service import save_document
+
+    # Fail fast before storing anything; reserve_validation still enforces the
+    # limit atomically when the pipeline runs
+    check_validation_quota(user.id)
+
+    document = save_document(file, user.id)
+    if run_async:
+        enqueue_validation(document['id'], user.id)
+        return document, None
+
+    try:
+        result = validate_document(document['id'], user.id, image_file=file.stream)
+    except Exception:
+        # Nothing is kept from a failed fused request, so a retry starts clean
+        _discard_document(document['id'], user.id)
+        raise
+    document['has_result'] = True
+    return document, result
+
+
+def _discard_document(doc_id, user_id):
+    from services.upload_service import delete_document
+    try:
+        db.session.rollback()
+        delete_document(doc_id, user_id)
+    except Exception as e:
+        logger.error(f'Could not remove document {doc_id} after failed validation: {e}', exc_info=True)
+
+
 def revalidate_document(doc_id, user_id):
     """Force re-validation by deleting existing result and re-running the pipeline."""
     document = db.session.get(Document, doc_id)
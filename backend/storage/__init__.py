@@ -0,0 +1,25 @@
+from flask import current_app
+from storage.base import StorageBackend
+from storage.local import LocalStorage
+from storage.s3 import S3Storage
+
+
+def init_storage(app):
+    """Create the configured storage driver and attach it to the app."""
+    backend = app.config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        storage = LocalStorage(app.config['UPLOAD_FOLDER'])
+    elif backend == 's3':
+        storage = S3Storage.from_config(app.config)
+    elif backend == 'memory':
+        from storage.fake_s3 import FakeS3Client
+        storage = S3Storage(FakeS3Client(), app.config.get('S3_BUCKET') or 'uploads')
+    else:
+        raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
+    app.extensions['storage'] = storage
+    return storage
+
+
+def get_storage():
+    """Return the storage driver for the current app."""
+    return current_app.extensions['storage']
@@ -0,0 +1,35 @@
+class StorageBackend:
+    """Interface for where uploaded files live.
+
+    Keys are '/'-separated names relative to the storage root, e.g.
+    'blobs/<sha256>' for content-addressed blobs or '<stored_name>' for legacy
+    per-upload files. Drivers decide how keys map onto disks or buckets.
+    """
+
+    def put_file(self, key, path):
+        """Move a local file into storage under key. The local file is consumed."""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Open key for streaming binary reads. Raises FileNotFoundError if missing."""
+        raise NotImplementedError
+
+    def exists(self, key):
+        """Check whether key is present."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove key. Returns True if something was deleted."""
+        raise NotImplementedError
+
+    def iter_keys(self, prefix=''):
+        """Yield (key, last_modified_timestamp) for every key under prefix."""
+        raise NotImplementedError
+
+    def local_path(self, key):
+        """Filesystem path for key when the driver stores files locally, else None."""
+        return None
+
+    def url(self, key, expires_in=300):
+        """Short-lived direct download URL for key, or None if the driver has none."""
+        return None
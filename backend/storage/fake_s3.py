@@ -0,0 +1,95 @@
+import io
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+
+class FakeClientError(Exception):
+    """Mimics botocore's ClientError shape (error.response['Error']['Code'])."""
+
+    def __init__(self, code, message=''):
+        super().__init__(message or code)
+        self.response = {'Error': {'Code': code, 'Message': message or code}}
+
+
+class FakeS3Client:
+    """In-process stand-in for the subset of the boto3 S3 client used by S3Storage.
+
+    Objects live in memory, so this is meant for tests and local development
+    without an object store (STORAGE_BACKEND=memory).
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_body(body):
+        return body.read() if hasattr(body, 'read') else bytes(body)
+
+    def put_object(self, Bucket, Key, Body):
+        data = self._read_body(Body)
+        with self._lock:
+            self._objects[(Bucket, Key)] = (data, datetime.now(timezone.utc))
+        return {'ETag': hashlib.md5(data).hexdigest()}
+
+    def get_object(self, Bucket, Key):
+        with self._lock:
+            if (Bucket, Key) not in self._objects:
+                raise FakeClientError('NoSuchKey')
+            data, modified = self._objects[(Bucket, Key)]
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data), 'LastModified': modified}
+
+    def head_object(self, Bucket, Key):
+        with self._lock:
+            if (Bucket, Key) not in self._objects:
+                raise FakeClientError('404')
+            data, modified = self._objects[(Bucket, Key)]
+        return {'ContentLength': len(data), 'LastModified': modified}
+
+    def delete_object(self, Bucket, Key):
+        with self._lock:
+            self._objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000):
+        with self._lock:
+            keys = sorted(k for b, k in self._objects if b == Bucket and k.startswith(Prefix))
+            start = int(ContinuationToken or 0)
+            page = keys[start:start + MaxKeys]
+            contents = [{'Key': k, 'Size': len(self._objects[(Bucket, k)][0]),
+                         'LastModified': self._objects[(Bucket, k)][1]} for k in page]
+        truncated = start + MaxKeys < len(keys)
+        response = {'Contents': contents, 'IsTruncated': truncated}
+        if truncated:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = (Bucket, Key, {})
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        data = self._read_body(Body)
+        with self._lock:
+            self._uploads[UploadId][2][PartNumber] = data
+        return {'ETag': hashlib.md5(data).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        with self._lock:
+            _, _, parts = self._uploads.pop(UploadId)
+            data = b''.join(parts[p['PartNumber']] for p in MultipartUpload['Parts'])
+            self._objects[(Bucket, Key)] = (data, datetime.now(timezone.utc))
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        return f"memory://{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
@@ -0,0 +1,46 @@
+import os
+from storage.base import StorageBackend
+from utils.file_utils import shard_path, resolve_sharded_path
+
+
+class LocalStorage(StorageBackend):
+    """Local filesystem driver using the sharded ab/cd/<name> layout under root."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _split(self, key):
+        prefix, _, name = key.rpartition('/')
+        base_dir = os.path.join(self.root, *prefix.split('/')) if prefix else self.root
+        return base_dir, name
+
+    def local_path(self, key):
+        return resolve_sharded_path(*self._split(key))
+
+    def put_file(self, key, path):
+        # New files always go to the sharded location; an atomic rename when
+        # the staging area is on the same filesystem
+        target = shard_path(*self._split(key))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key):
+        path = self.local_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+            return True
+        return False
+
+    def iter_keys(self, prefix=''):
+        base_dir = os.path.join(self.root, *prefix.strip('/').split('/')) if prefix.strip('/') else self.root
+        key_prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        for dirpath, _, filenames in os.walk(base_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                yield key_prefix + name, os.path.getmtime(path)
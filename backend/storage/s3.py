@@ -0,0 +1,155 @@
+import io
+import os
+from storage.base import StorageBackend
+
+# S3 requires every multipart part except the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def _is_not_found(error):
+    """Check a botocore-style ClientError for a missing-object code."""
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code in ('404', 'NoSuchKey', 'NotFound')
+
+
+class _ObjectReader(io.RawIOBase):
+    """Raw binary reader over an S3 GetObject body, so callers can stream it
+    through io.BufferedReader like a regular file.
+    """
+
+    def __init__(self, body):
+        self._body = body
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._body.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._body.close()
+        super().close()
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage driver (AWS S3, MinIO, Ceph RGW, ...).
+
+    The client is created once per process and shared across threads; boto3
+    pools HTTP connections per client up to max_pool_connections. Files at or
+    above multipart_threshold are uploaded in parts of part_size bytes.
+    """
+
+    def __init__(self, client, bucket, prefix='', multipart_threshold=8 * 1024 * 1024,
+                 part_size=8 * 1024 * 1024):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.multipart_threshold = multipart_threshold
+        self.part_size = max(part_size, MIN_PART_SIZE)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a driver with a pooled boto3 client from app config."""
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError:
+            raise RuntimeError('STORAGE_BACKEND=s3 requires boto3: pip install boto3')
+
+        client = boto3.client(
+            's3',
+            endpoint_url=config.get('S3_ENDPOINT_URL') or None,
+            region_name=config.get('S3_REGION') or None,
+            aws_access_key_id=config.get('S3_ACCESS_KEY_ID') or None,
+            aws_secret_access_key=config.get('S3_SECRET_ACCESS_KEY') or None,
+            config=BotoConfig(
+                max_pool_connections=config.get('S3_MAX_POOL_CONNECTIONS', 32),
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+                tcp_keepalive=True
+            )
+        )
+        return cls(
+            client,
+            config['S3_BUCKET'],
+            prefix=config.get('S3_PREFIX', ''),
+            multipart_threshold=config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            part_size=config.get('S3_MULTIPART_PART_SIZE', 8 * 1024 * 1024)
+        )
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def put_file(self, key, path):
+        if os.path.getsize(path) >= self.multipart_threshold:
+            self._multipart_upload(self._key(key), path)
+        else:
+            with open(path, 'rb') as f:
+                self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f)
+        os.remove(path)
+
+    def _multipart_upload(self, object_key, path):
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=object_key)['UploadId']
+        parts = []
+        try:
+            with open(path, 'rb') as f:
+                part_number = 1
+                while True:
+                    data = f.read(self.part_size)
+                    if not data:
+                        break
+                    response = self.client.upload_part(
+                        Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                        PartNumber=part_number, Body=data
+                    )
+                    parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+                    part_number += 1
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+            raise
+
+    def open(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _is_not_found(e):
+                raise FileNotFoundError(key) from e
+            raise
+        return io.BufferedReader(_ObjectReader(response['Body']), buffer_size=256 * 1024)
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception as e:
+            if _is_not_found(e):
+                return False
+            raise
+
+    def delete(self, key):
+        existed = self.exists(key)
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return existed
+
+    def iter_keys(self, prefix=''):
+        kwargs = {'Bucket': self.bucket, 'Prefix': self._key(prefix)}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for obj in response.get('Contents', []):
+                yield obj['Key'][len(self.prefix):], obj['LastModified'].timestamp()
+            if not response.get('IsTruncated'):
+                break
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def url(self, key, expires_in=300):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(key)},
+            ExpiresIn=expires_in
+        )
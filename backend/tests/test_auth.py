@@ -124,6 +124,64 @@ class TestLogin:
         assert response.status_code == 401
         assert data['success'] is False
 
+    def test_login_rehashes_outdated_hash(self, client, db):
+        """Test login upgrades a hash made with outdated KDF parameters."""
+        from werkzeug.security import generate_password_hash
+        from models.user import User
+        from services.password_service import verify_password
+
+        client.post('/api/auth/register', json={
+            'email': 'legacy@example.com',
+            'password': 'password123',
+            'name': 'Legacy User'
+        })
+        user = User.query.filter_by(email='legacy@example.com').first()
+        user.password_hash = generate_password_hash('password123', method='pbkdf2:sha256:1000')
+        db.session.commit()
+
+        response = client.post('/api/auth/login', json={
+            'email': 'legacy@example.com',
+            'password': 'password123'
+        })
+        assert response.status_code == 200
+
+        db.session.refresh(user)
+        assert user.password_hash.startswith('scrypt:')
+        assert verify_password(user.password_hash, 'password123')
+
+    def test_password_hashing_is_bounded(self, app, monkeypatch):
+        """Test no more KDF calls run at once than PASSWORD_HASH_WORKERS."""
+        import time
+        import threading
+        from services import password_service
+        monkeypatch.setattr(password_service, '_slots', None)
+        monkeypatch.setitem(app.config, 'PASSWORD_HASH_WORKERS', 2)
+        lock = threading.Lock()
+        running, peak = [0], [0]
+
+        def slow_verify(stored_hash, password):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return True
+
+        monkeypatch.setattr(password_service, 'verify_with', slow_verify)
+
+        def login():
+            with app.app_context():
+                password_service.verify_password('hash', 'password')
+
+        threads = [threading.Thread(target=login) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        assert peak[0] == 2
+
     def test_login_missing_fields(self, client):
         """Test login with missing fields returns 400."""
         response = client.post('/api/auth/login', json={})
@@ -214,3 +272,95 @@ class TestChangePassword:
             'new_password': 'newpassword456'
         })
         assert response.status_code == 401
+
+
+class TestPrincipalCache:
+    """Tests for the cached principal resolution in token_required"""
+
+    def test_cached_principal_serves_profile(self, client, auth_headers):
+        """Test repeated authenticated requests reuse the cached principal."""
+        from services import auth_service
+
+        first = client.get('/api/auth/profile', headers=auth_headers)
+        hits = auth_service._get_principal_cache().hits
+        second = client.get('/api/auth/profile', headers=auth_headers)
+
+        assert first.status_code == 200
+        assert second.get_json()['data']['user'] == first.get_json()['data']['user']
+        assert auth_service._get_principal_cache().hits == hits + 1
+
+    def test_cached_principal_skips_user_query(self, client, db, auth_headers):
+        """Test a request needing only cached fields does not query the users table."""
+        from sqlalchemy import event
+
+        client.get('/api/upload/list', headers=auth_headers)
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = client.get('/api/upload/list', headers=auth_headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert response.status_code == 200
+        assert statements
+        assert not [statement for statement in statements if 'FROM users' in statement]
+
+    def test_role_change_invalidates_cache(self, client, db, auth_headers):
+        """Test a role change is picked up on the next request."""
+        from models.user import User
+
+        response = client.get('/api/admin/stats', headers=auth_headers)
+        assert response.status_code == 403
+
+        user = User.query.filter_by(email='test@example.com').first()
+        user.role = 'admin'
+        db.session.commit()
+
+        response = client.get('/api/admin/stats', headers=auth_headers)
+        assert response.status_code == 200
+
+    def test_deleted_user_rejected(self, client, db, auth_headers):
+        """Test a deleted user's token stops working immediately."""
+        from models.user import User
+
+        assert client.get('/api/auth/profile', headers=auth_headers).status_code == 200
+
+        user = User.query.filter_by(email='test@example.com').first()
+        db.session.delete(user)
+        db.session.commit()
+
+        response = client.get('/api/auth/profile', headers=auth_headers)
+        assert response.status_code == 401
+
+    def test_user_deleted_by_other_process_rejected(self, client, db, auth_headers):
+        """Test a cached principal whose user row is gone answers 401, not 500."""
+        from sqlalchemy import delete
+        from models.user import User
+
+        assert client.get('/api/auth/profile', headers=auth_headers).status_code == 200
+        # A Core delete skips the ORM events, like a delete in another worker
+        db.session.execute(delete(User).where(User.email == 'test@example.com'))
+        db.session.commit()
+
+        first = client.get('/api/auth/profile', headers=auth_headers)
+        second = client.get('/api/auth/profile', headers=auth_headers)
+
+        assert first.status_code == second.status_code == 401
+        assert first.get_json()['error']['code'] == 'AUTH_ERROR'
+
+    def test_principal_is_read_only(self, app, auth_headers):
+        """Test writes to a cached principal fail instead of being silently dropped."""
+        import pytest
+        from models.user import User
+        from services.auth_service import get_principal
+
+        with app.app_context():
+            principal = get_principal(User.query.filter_by(email='test@example.com').first().id)
+            with pytest.raises(AttributeError, match='read-only'):
+                principal.validation_count = 99
+            with pytest.raises(AttributeError, match='read-only'):
+                principal.name = 'Changed'
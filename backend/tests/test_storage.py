@@ -0,0 +1,89 @@
+"""Tests for the storage backends."""
+import io
+import os
+import pytest
+from storage.s3 import S3Storage, MIN_PART_SIZE
+from storage.fake_s3 import FakeS3Client
+
+
+@pytest.fixture
+def s3_storage():
+    """S3 driver backed by the in-process fake client."""
+    return S3Storage(FakeS3Client(), 'test-bucket', prefix='docs', multipart_threshold=MIN_PART_SIZE)
+
+
+def write_temp_file(tmp_path, content, name='upload.bin'):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+class TestS3Storage:
+    """Tests for S3Storage against FakeS3Client"""
+
+    def test_put_and_stream_read(self, s3_storage, tmp_path):
+        """Test a small file round-trips and the local copy is consumed."""
+        path = write_temp_file(tmp_path, b'%PDF-1.4 small')
+        s3_storage.put_file('blobs/abc', path)
+
+        assert not os.path.exists(path)
+        assert s3_storage.exists('blobs/abc')
+        with s3_storage.open('blobs/abc') as f:
+            assert f.read() == b'%PDF-1.4 small'
+
+    def test_multipart_upload(self, s3_storage, tmp_path):
+        """Test files above the threshold are uploaded in parts."""
+        content = os.urandom(MIN_PART_SIZE + 1024)
+        path = write_temp_file(tmp_path, content)
+        s3_storage.put_file('blobs/large', path)
+
+        with s3_storage.open('blobs/large') as f:
+            chunks = iter(lambda: f.read(64 * 1024), b'')
+            assert b''.join(chunks) == content
+
+    def test_missing_key(self, s3_storage):
+        """Test missing objects raise FileNotFoundError and report absent."""
+        assert s3_storage.exists('blobs/missing') is False
+        assert s3_storage.delete('blobs/missing') is False
+        with pytest.raises(FileNotFoundError):
+            s3_storage.open('blobs/missing')
+
+    def test_iter_keys_paginates(self, tmp_path):
+        """Test listing follows continuation tokens and strips the prefix."""
+        client = FakeS3Client()
+        storage = S3Storage(client, 'test-bucket', prefix='docs')
+        for i in range(5):
+            client.put_object(Bucket='test-bucket', Key=f'docs/blobs/{i}', Body=io.BytesIO(b'x'))
+
+        original = client.list_objects_v2
+        client.list_objects_v2 = lambda **kwargs: original(MaxKeys=2, **kwargs)
+
+        keys = [key for key, _ in storage.iter_keys('blobs/')]
+        assert keys == [f'blobs/{i}' for i in range(5)]
+
+
+class TestMemoryBackedUploads:
+    """Tests for the upload flow running entirely through the storage interface"""
+
+    def test_upload_validate_delete(self, app, client, auth_headers, monkeypatch):
+        """Test upload, validation, deletion and GC against object storage."""
+        from services.blob_service import collect_garbage
+
+        storage = S3Storage(FakeS3Client(), 'uploads')
+        monkeypatch.setitem(app.extensions, 'storage', storage)
+
+        response = client.post(
+            '/api/upload',
+            data={'file': (io.BytesIO(b'%PDF-1.4 object storage'), 'remote.pdf')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        document = response.get_json()['data']['document']
+        assert storage.exists(f"blobs/{document['content_hash']}")
+
+        response = client.post(f"/api/validate/{document['id']}", headers=auth_headers)
+        assert response.status_code == 200
+
+        client.delete(f"/api/upload/{document['id']}", headers=auth_headers)
+        collect_garbage(grace_seconds=-1)
+        assert not storage.exists(f"blobs/{document['content_hash']}")
@@ -54,6 +54,93 @@ class TestUpload:
         assert response.status_code == 400
         assert result['success'] is False
 
+    def test_upload_records_content_hash(self, client, auth_headers):
+        """Test the SHA-256 content hash and size are computed during upload."""
+        import hashlib
+        content = b'%PDF-1.4 hashed content'
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file('hashed.pdf', content)},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        document = response.get_json()['data']['document']
+
+        assert response.status_code == 201
+        assert document['content_hash'] == hashlib.sha256(content).hexdigest()
+        assert document['file_size'] == len(content)
+
+    def test_upload_content_mismatch(self, client, auth_headers):
+        """Test upload whose magic bytes do not match the extension returns 400."""
+        data = {'file': create_test_file('fake.pdf', b'\xff\xd8\xff\xe0 not a pdf')}
+        response = client.post(
+            '/api/upload',
+            data=data,
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        result = response.get_json()
+
+        assert response.status_code == 400
+        assert result['success'] is False
+
+    def test_upload_written_once(self, app, client, auth_headers, monkeypatch):
+        """Test the spooled request file is adopted into the blob store without a second copy."""
+        import os
+        from services import blob_service
+        from utils.file_utils import get_staging_dir
+
+        def no_copy(*args, **kwargs):
+            raise AssertionError('upload should not be copied again')
+
+        monkeypatch.setattr(blob_service, 'stream_to_file', no_copy)
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file('once.pdf', b'%PDF-1.4 spooled once')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+
+        assert response.status_code == 201
+        with app.app_context():
+            assert not [name for name in os.listdir(get_staging_dir()) if name.endswith('.incoming')]
+
+    def test_spool_closed_before_adopt(self, client, auth_headers, monkeypatch):
+        """Test the spooled file is no longer held open when it is moved into the blob store."""
+        from flask import request
+        from services import upload_service
+        real_adopt = upload_service.adopt_blob
+        states = []
+
+        def checked_adopt(path, content_hash, file_size):
+            states.append(request.files['file'].stream.closed)
+            return real_adopt(path, content_hash, file_size)
+
+        monkeypatch.setattr(upload_service, 'adopt_blob', checked_adopt)
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file('closed.pdf', b'%PDF-1.4 closed first')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+
+        assert response.status_code == 201
+        assert states == [True]
+
+    def test_rejected_upload_spool_removed(self, app, client, auth_headers):
+        """Test a spooled file that fails the content check is removed with the request."""
+        import os
+        from utils.file_utils import get_staging_dir
+        client.post(
+            '/api/upload',
+            data={'file': create_test_file('fake.pdf', b'not a pdf')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+
+        with app.app_context():
+            assert not [name for name in os.listdir(get_staging_dir()) if name.endswith('.incoming')]
+
     def test_upload_no_file(self, client, auth_headers):
         """Test upload without file returns 400."""
         response = client.post(
@@ -194,3 +281,501 @@ class TestGetDocument:
 
         assert response.status_code == 403
         assert result['success'] is False
+
+
+class TestResumableUpload:
+    """Tests for /api/upload/sessions"""
+
+    def _create_session(self, client, auth_headers, content, filename='scan.pdf'):
+        response = client.post('/api/upload/sessions', headers=auth_headers, json={
+            'filename': filename,
+            'size': len(content)
+        })
+        assert response.status_code == 201
+        return response.get_json()['data']['session']['id']
+
+    def _put_chunk(self, client, auth_headers, session_id, offset, chunk):
+        return client.put(
+            f'/api/upload/sessions/{session_id}',
+            data=chunk,
+            headers={
+                'Authorization': auth_headers['Authorization'],
+                'Content-Type': 'application/offset+octet-stream',
+                'Upload-Offset': str(offset)
+            }
+        )
+
+    def test_chunked_upload_success(self, client, auth_headers):
+        """Test uploading in two chunks and finalizing into a document."""
+        content = b'%PDF-1.4 ' + b'x' * 1000
+        session_id = self._create_session(client, auth_headers, content)
+
+        first = self._put_chunk(client, auth_headers, session_id, 0, content[:400])
+        assert first.status_code == 200
+        assert first.headers['Upload-Offset'] == '400'
+
+        status = client.get(f'/api/upload/sessions/{session_id}', headers=auth_headers)
+        assert status.get_json()['data']['session']['offset'] == 400
+
+        second = self._put_chunk(client, auth_headers, session_id, 400, content[400:])
+        assert second.get_json()['data']['session']['complete'] is True
+
+        response = client.post(f'/api/upload/sessions/{session_id}/complete', headers=auth_headers)
+        document = response.get_json()['data']['document']
+
+        assert response.status_code == 201
+        assert document['file_size'] == len(content)
+        assert document['file_type'] == 'pdf'
+
+    def test_concurrent_chunk_rejected_before_write(self, app, client, db, auth_headers):
+        """Test a chunk for a byte range another request is writing is refused without touching the file."""
+        from datetime import datetime, timedelta, timezone
+        from models.upload_session import UploadSession
+        from utils.file_utils import get_session_part_path
+        content = b'%PDF-1.4 racing chunks'
+        session_id = self._create_session(client, auth_headers, content)
+        session = db.session.get(UploadSession, session_id)
+        session.writer = 'other-request'
+        session.writer_expires_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+        db.session.commit()
+
+        response = self._put_chunk(client, auth_headers, session_id, 0, b'%PDF-1.4 loser')
+
+        assert response.status_code == 409
+        with app.app_context(), open(get_session_part_path(session_id), 'rb') as f:
+            assert f.read() == bytes(len(content))
+
+    def test_failed_chunk_releases_claim(self, client, auth_headers):
+        """Test a rejected chunk gives its byte range back for the retry."""
+        content = b'%PDF-1.4 retry'
+        session_id = self._create_session(client, auth_headers, content)
+
+        assert self._put_chunk(client, auth_headers, session_id, 0, content + b'overflow').status_code == 400
+        retry = self._put_chunk(client, auth_headers, session_id, 0, content)
+        assert retry.status_code == 200
+        assert retry.get_json()['data']['session']['complete'] is True
+
+    def test_chunk_offset_mismatch(self, client, auth_headers):
+        """Test a chunk at the wrong offset returns 409."""
+        content = b'%PDF-1.4 resumable'
+        session_id = self._create_session(client, auth_headers, content)
+
+        response = self._put_chunk(client, auth_headers, session_id, 5, content[5:])
+        assert response.status_code == 409
+
+    def test_finalize_incomplete(self, client, auth_headers):
+        """Test finalizing before all bytes arrive returns 409."""
+        content = b'%PDF-1.4 resumable'
+        session_id = self._create_session(client, auth_headers, content)
+        self._put_chunk(client, auth_headers, session_id, 0, content[:4])
+
+        response = client.post(f'/api/upload/sessions/{session_id}/complete', headers=auth_headers)
+        assert response.status_code == 409
+
+    def test_finalize_content_mismatch(self, client, auth_headers):
+        """Test finalize applies the same magic bytes check as direct uploads."""
+        content = b'MZ not really a pdf'
+        session_id = self._create_session(client, auth_headers, content)
+        self._put_chunk(client, auth_headers, session_id, 0, content)
+
+        response = client.post(f'/api/upload/sessions/{session_id}/complete', headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_concurrent_finalize(self, app, client, auth_headers, monkeypatch):
+        """Test a second finalize, cancel or cleanup while one is running is refused."""
+        import threading
+        from services import resumable_upload_service
+        from services.resumable_upload_service import cleanup_stale_sessions
+        content = b'%PDF-1.4 finalize once'
+        session_id = self._create_session(client, auth_headers, content)
+        self._put_chunk(client, auth_headers, session_id, 0, content)
+
+        real_inspect = resumable_upload_service.inspect_file
+        inspecting, resume = threading.Event(), threading.Event()
+        responses = []
+
+        def slow_inspect(*args, **kwargs):
+            inspecting.set()
+            resume.wait(5)
+            return real_inspect(*args, **kwargs)
+
+        def complete():
+            responses.append(client.post(f'/api/upload/sessions/{session_id}/complete', headers=auth_headers))
+
+        monkeypatch.setattr(resumable_upload_service, 'inspect_file', slow_inspect)
+        first = threading.Thread(target=complete)
+        first.start()
+        assert inspecting.wait(5)
+        complete()
+        cancelled = client.delete(f'/api/upload/sessions/{session_id}', headers=auth_headers)
+        with app.app_context():
+            swept = cleanup_stale_sessions(max_age_seconds=-1)
+        resume.set()
+        first.join(5)
+
+        loser, winner = responses
+        assert loser.status_code == 409
+        assert loser.get_json()['error']['code'] == 'SESSION_BUSY'
+        assert cancelled.status_code == 409
+        assert swept == 0
+        assert winner.status_code == 201
+        assert winner.get_json()['data']['document']['file_size'] == len(content)
+        again = client.post(f'/api/upload/sessions/{session_id}/complete', headers=auth_headers)
+        assert again.status_code == 404
+
+    def test_cleanup_stale_sessions(self, client, auth_headers):
+        """Test stale sessions and their files are removed."""
+        import os
+        from services.resumable_upload_service import cleanup_stale_sessions
+        from utils.file_utils import get_session_part_path
+
+        session_id = self._create_session(client, auth_headers, b'%PDF-1.4 stale')
+
+        assert cleanup_stale_sessions(max_age_seconds=-1) == 1
+        assert not os.path.exists(get_session_part_path(session_id))
+        response = client.get(f'/api/upload/sessions/{session_id}', headers=auth_headers)
+        assert response.status_code == 404
+
+
+class TestBlobStore:
+    """Tests for content-addressed storage of uploads"""
+
+    def _upload(self, client, auth_headers, filename, content=b'%PDF-1.4 shared certificate'):
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file(filename, content)},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        return response.get_json()['data']['document']
+
+    def test_identical_uploads_share_blob(self, client, db, auth_headers, second_user_headers):
+        """Test identical files are stored once with a reference per document."""
+        from models.blob import Blob
+
+        first = self._upload(client, auth_headers, 'a.pdf')
+        second = self._upload(client, second_user_headers, 'b.pdf')
+
+        assert first['content_hash'] == second['content_hash']
+        blob = db.session.get(Blob, first['content_hash'])
+        assert blob.ref_count == 2
+
+    def test_delete_releases_blob_and_gc_reclaims(self, client, db, auth_headers):
+        """Test deleting the last reference lets GC remove the file."""
+        import os
+        from models.blob import Blob
+        from services.blob_service import collect_garbage
+        from utils.file_utils import get_blob_path
+
+        document = self._upload(client, auth_headers, 'gc.pdf', b'%PDF-1.4 collect me')
+        client.delete(f"/api/upload/{document['id']}", headers=auth_headers)
+
+        blob = db.session.get(Blob, document['content_hash'])
+        assert blob.ref_count == 0
+        assert os.path.exists(get_blob_path(document['content_hash']))
+
+        stats = collect_garbage(grace_seconds=-1)
+        assert stats['blobs_removed'] == 1
+        assert not os.path.exists(get_blob_path(document['content_hash']))
+
+    def test_gc_keeps_recently_stored_file(self, client, db, auth_headers):
+        """Test GC drops an expired row but keeps a file an upload just stored again."""
+        import os
+        from datetime import datetime, timedelta, timezone
+        from models.blob import Blob
+        from services.blob_service import collect_garbage
+        from utils.file_utils import get_blob_path
+
+        document = self._upload(client, auth_headers, 'gc.pdf', b'%PDF-1.4 stored again')
+        client.delete(f"/api/upload/{document['id']}", headers=auth_headers)
+        blob = db.session.get(Blob, document['content_hash'])
+        blob.updated_at = datetime.now(timezone.utc) - timedelta(hours=2)
+        db.session.commit()
+
+        stats = collect_garbage(grace_seconds=3600)
+        assert stats['blobs_removed'] == 0
+        assert db.session.get(Blob, document['content_hash']) is None
+        assert os.path.exists(get_blob_path(document['content_hash']))
+
+        again = self._upload(client, auth_headers, 'again.pdf', b'%PDF-1.4 stored again')
+        assert db.session.get(Blob, again['content_hash']).ref_count == 1
+        assert os.path.exists(get_blob_path(again['content_hash']))
+
+
+class TestShardedLayout:
+    """Tests for the sharded uploads folder layout"""
+
+    def test_new_uploads_are_sharded(self, client, db, auth_headers):
+        """Test new files land in the ab/cd/<name> fan-out layout."""
+        import os
+        from utils.file_utils import get_blob_dir, get_blob_path
+
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file('sharded.pdf', b'%PDF-1.4 sharded')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        content_hash = response.get_json()['data']['document']['content_hash']
+
+        expected = os.path.join(get_blob_dir(), content_hash[:2], content_hash[2:4], content_hash)
+        assert get_blob_path(content_hash) == expected
+        assert os.path.exists(expected)
+
+    def test_migrate_flat_files(self, app, db):
+        """Test legacy flat files are readable before and after migration."""
+        import os
+        from utils.file_utils import get_upload_path, migrate_flat_files, ensure_upload_dir
+
+        ensure_upload_dir()
+        flat_path = os.path.join(app.config['UPLOAD_FOLDER'], 'feedbeef0001.pdf')
+        with open(flat_path, 'wb') as f:
+            f.write(b'%PDF-1.4 legacy')
+
+        assert get_upload_path('feedbeef0001.pdf') == flat_path
+
+        assert migrate_flat_files(app.config['UPLOAD_FOLDER']) >= 1
+        migrated = get_upload_path('feedbeef0001.pdf')
+        assert migrated != flat_path
+        assert os.path.exists(migrated)
+        os.remove(migrated)
+
+
+class TestDownload:
+    """Tests for GET /api/upload/<id>/download and signed URLs"""
+
+    content = b'%PDF-1.4 downloadable content'
+
+    def _upload(self, client, auth_headers):
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file('download.pdf', self.content)},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        return response.get_json()['data']['document']['id']
+
+    def test_download_own_file(self, client, auth_headers):
+        """Test downloading the original file."""
+        doc_id = self._upload(client, auth_headers)
+        response = client.get(f'/api/upload/{doc_id}/download', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.data == self.content
+        assert response.mimetype == 'application/pdf'
+
+    def test_download_range(self, client, auth_headers):
+        """Test HTTP Range requests return partial content."""
+        doc_id = self._upload(client, auth_headers)
+        headers = dict(auth_headers, Range='bytes=0-7')
+        response = client.get(f'/api/upload/{doc_id}/download', headers=headers)
+
+        assert response.status_code == 206
+        assert response.data == self.content[:8]
+
+    def test_download_other_users_file(self, client, auth_headers, second_user_headers):
+        """Test downloading another user's file returns 403."""
+        doc_id = self._upload(client, auth_headers)
+        response = client.get(f'/api/upload/{doc_id}/download', headers=second_user_headers)
+        assert response.status_code == 403
+
+    def test_download_x_accel_redirect(self, app, client, auth_headers, monkeypatch):
+        """Test nginx offload returns an internal redirect instead of the body."""
+        doc_id = self._upload(client, auth_headers)
+        monkeypatch.setitem(app.config, 'DOWNLOAD_OFFLOAD', 'x-accel')
+
+        response = client.get(f'/api/upload/{doc_id}/download', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.headers['X-Accel-Redirect'].startswith('/protected-uploads/blobs/')
+        assert response.data == b''
+
+    def test_signed_download_url(self, client, auth_headers):
+        """Test a signed URL serves the file without an Authorization header."""
+        doc_id = self._upload(client, auth_headers)
+        response = client.get(f'/api/upload/{doc_id}/download-url', headers=auth_headers)
+        url = response.get_json()['data']['url']
+
+        download = client.get(url)
+        assert download.status_code == 200
+        assert download.data == self.content
+
+        tampered = client.get(url[:-2] + 'xx')
+        assert tampered.status_code == 401
+
+
+class TestThumbnail:
+    """Tests for GET /api/upload/<id>/thumbnail"""
+
+    def _upload_png(self, client, auth_headers):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), (200, 30, 30)).save(buffer, format='PNG')
+        response = client.post(
+            '/api/upload',
+            data={'file': create_test_file('scan.png', buffer.getvalue())},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        return response.get_json()['data']['document']['id']
+
+    def test_thumbnail_generated(self, client, auth_headers):
+        """Test an image upload gets a bounded-size thumbnail."""
+        from PIL import Image
+        doc_id = self._upload_png(client, auth_headers)
+
+        response = client.get(f'/api/upload/{doc_id}/thumbnail', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'image/webp'
+        assert 'private' in response.headers['Cache-Control']
+        thumb = Image.open(io.BytesIO(response.data))
+        assert max(thumb.size) == 256
+
+    def test_thumbnail_not_modified(self, client, auth_headers):
+        """Test If-None-Match with the current ETag returns 304."""
+        doc_id = self._upload_png(client, auth_headers)
+        first = client.get(f'/api/upload/{doc_id}/thumbnail', headers=auth_headers)
+
+        headers = dict(auth_headers, **{'If-None-Match': first.headers['ETag']})
+        second = client.get(f'/api/upload/{doc_id}/thumbnail', headers=headers)
+
+        assert second.status_code == 304
+        assert second.data == b''
+
+    def test_thumbnail_other_user(self, client, auth_headers, second_user_headers):
+        """Test another user's thumbnail is not accessible."""
+        doc_id = self._upload_png(client, auth_headers)
+        response = client.get(f'/api/upload/{doc_id}/thumbnail', headers=second_user_headers)
+        assert response.status_code == 403
+
+    def test_unavailable_thumbnail_not_requeued(self, client, auth_headers, monkeypatch):
+        """Test a source whose thumbnail cannot be rendered is not queued on every view."""
+        import blueprints.upload as upload_blueprint
+        from services import derivative_service
+        monkeypatch.setattr(derivative_service, '_render_pdf_first_page', lambda stream, size: None)
+        doc_id = client.post(
+            '/api/upload',
+            data={'file': create_test_file('scan.pdf')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        ).get_json()['data']['document']['id']
+        queued = []
+        monkeypatch.setattr(upload_blueprint, 'enqueue_derivatives', lambda *args: queued.append(args))
+
+        for _ in range(2):
+            response = client.get(f'/api/upload/{doc_id}/thumbnail', headers=auth_headers)
+            assert response.status_code == 404
+            assert response.get_json()['error']['code'] == 'THUMBNAIL_UNAVAILABLE'
+        assert queued == []
+
+    def test_in_flight_source_not_queued_twice(self, app, monkeypatch):
+        from services import derivative_service
+        rendered = []
+        monkeypatch.setattr(derivative_service, 'generate_thumbnail', lambda key, file_type: rendered.append(key))
+        monkeypatch.setattr(derivative_service, '_pending', {'blobs/in-flight'})
+
+        with app.app_context():
+            derivative_service.enqueue_derivatives('blobs/in-flight', 'png')
+            derivative_service.enqueue_derivatives('blobs/other', 'png')
+
+        assert rendered == ['blobs/other']
+
+    def test_derivatives_deleted_with_last_reference(self, app, client, auth_headers, second_user_headers):
+        """Test a shared blob's thumbnail stays until the last document using it is deleted."""
+        from models import db
+        from models.document import Document
+        from services.derivative_service import derivative_key
+        from services.upload_service import get_document_key
+        from storage import get_storage
+        first = self._upload_png(client, auth_headers)
+        second = self._upload_png(client, second_user_headers)
+        with app.app_context():
+            key = derivative_key(get_document_key(db.session.get(Document, first)))
+            assert get_storage().exists(key)
+
+        client.delete(f'/api/upload/{first}', headers=auth_headers)
+        with app.app_context():
+            assert get_storage().exists(key)
+
+        client.delete(f'/api/upload/{second}', headers=second_user_headers)
+        with app.app_context():
+            assert not get_storage().exists(key)
+
+
+class TestBatchUpload:
+    """Tests for POST /api/upload/batch"""
+
+    def _post(self, client, auth_headers, files, query=''):
+        return client.post(
+            f'/api/upload/batch{query}',
+            data={'files': files},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+
+    def test_batch_per_file_status(self, client, auth_headers):
+        """Test valid files are stored and invalid ones rejected individually."""
+        response = self._post(client, auth_headers, [
+            create_test_file('a.pdf', b'%PDF-1.4 first'),
+            create_test_file('notes.txt', b'plain text'),
+            create_test_file('b.pdf', b'%PDF-1.4 second'),
+            create_test_file('fake.png', b'%PDF-1.4 not a png'),
+        ])
+        assert response.status_code == 201
+        data = response.get_json()['data']
+        assert data['stored'] == 2
+        assert data['rejected'] == 2
+        assert [f['status'] for f in data['files']] == ['stored', 'rejected', 'stored', 'rejected']
+        assert data['files'][0]['document']['filename'] == 'a.pdf'
+        assert 'error' in data['files'][3]
+
+        listing = client.get('/api/upload/list', headers=auth_headers)
+        assert listing.get_json()['data']['pagination']['total'] == 2
+
+    def test_batch_with_validation(self, client, auth_headers):
+        """Test ?validate=true queues validation for every stored document."""
+        response = self._post(client, auth_headers, [
+            create_test_file('a.pdf', b'%PDF-1.4 first'),
+            create_test_file('b.pdf', b'%PDF-1.4 second'),
+        ], query='?validate=true')
+        assert response.status_code == 201
+        for entry in response.get_json()['data']['files']:
+            assert entry['validation'] == 'queued'
+            result = client.get(f"/api/results/{entry['document']['id']}", headers=auth_headers)
+            assert result.status_code == 200
+
+    def test_batch_requires_multipart(self, client, auth_headers):
+        """Test a non-multipart body is rejected."""
+        response = client.post('/api/upload/batch', json={'files': []}, headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_batch_without_files(self, client, auth_headers):
+        """Test a multipart body with no file parts is rejected."""
+        response = client.post(
+            '/api/upload/batch',
+            data={'note': 'nothing here'},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 400
+
+    def test_batch_failure_removes_staged_files(self, app, client, auth_headers, monkeypatch):
+        """Test a file whose blob store write fails is not left in the staging area."""
+        import os
+        from storage import get_storage
+        from utils.file_utils import get_staging_dir
+
+        def broken_put(key, path):
+            raise OSError('disk full')
+
+        with app.app_context():
+            monkeypatch.setattr(get_storage(), 'put_file', broken_put)
+            staging_dir = get_staging_dir()
+        response = self._post(client, auth_headers, [
+            create_test_file('a.pdf', b'%PDF-1.4 first'),
+            create_test_file('b.pdf', b'%PDF-1.4 second'),
+        ])
+
+        assert response.status_code == 500
+        assert not [name for name in os.listdir(staging_dir) if name.endswith('.incoming')]
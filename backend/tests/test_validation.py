@@ -1,5 +1,6 @@
 """Tests for validation endpoints."""
 import io
+import json
 
 
 def upload_test_file(client, auth_headers, filename='test.pdf'):
@@ -62,6 +63,81 @@ class TestValidation:
         assert result['success'] is False
 
 
+class TestUploadAndValidate:
+    """Tests for POST /api/validate (upload + validate in one request)"""
+
+    def _post(self, client, auth_headers, query='', filename='fused.pdf'):
+        return client.post(
+            f'/api/validate{query}',
+            data={'file': (io.BytesIO(b'%PDF-1.4 fused content'), filename)},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+
+    def test_upload_and_validate(self, client, auth_headers, monkeypatch):
+        """Test the pipeline runs on the uploaded bytes without reading storage back."""
+        import services.validation_service as validation_service
+
+        def no_storage():
+            raise AssertionError('pipeline should not reopen the stored file')
+
+        monkeypatch.setattr(validation_service, 'get_storage', no_storage)
+        response = self._post(client, auth_headers)
+        data = response.get_json()['data']
+
+        assert response.status_code == 201
+        assert data['result']['verdict'] in ['AUTHENTIC', 'SUSPICIOUS', 'FAKE']
+        assert data['document']['has_result'] is True
+
+    def test_upload_and_validate_async(self, client, auth_headers):
+        """Test async mode returns a job handle and the result becomes available."""
+        response = self._post(client, auth_headers, query='?async=true')
+        data = response.get_json()['data']
+
+        assert response.status_code == 202
+        assert data['status_url'] == f"/api/results/{data['document']['id']}"
+        assert client.get(data['status_url'], headers=auth_headers).status_code == 200
+
+    def test_upload_and_validate_over_limit(self, client, db, auth_headers):
+        """Test a user over quota is rejected before anything is stored."""
+        from models.user import User
+        user = User.query.filter_by(email='test@example.com').first()
+        user.validation_count = 10
+        db.session.commit()
+
+        response = self._post(client, auth_headers)
+        assert response.status_code == 403
+        listing = client.get('/api/upload/list', headers=auth_headers)
+        assert listing.get_json()['data']['pagination']['total'] == 0
+
+    def test_failed_validation_removes_document(self, client, auth_headers, monkeypatch):
+        """Test a fused request whose validation fails leaves no document behind."""
+        import services.validation_service as validation_service
+
+        def broken_cnn(image_file):
+            raise RuntimeError('model crashed')
+
+        monkeypatch.setattr(validation_service, 'mock_cnn_predict', broken_cnn)
+        response = self._post(client, auth_headers)
+
+        assert response.status_code == 500
+        listing = client.get('/api/upload/list', headers=auth_headers)
+        assert listing.get_json()['data']['pagination']['total'] == 0
+
+    def test_over_limit_check_ignores_cached_count(self, client, db, auth_headers):
+        """Test the fail-fast quota check reads the database, not the cached principal."""
+        from sqlalchemy import update
+        from models.user import User
+        client.get('/api/auth/profile', headers=auth_headers)  # caches the principal at count 0
+        db.session.execute(update(User).where(User.email == 'test@example.com').values(validation_count=10))
+        db.session.commit()
+
+        response = self._post(client, auth_headers)
+        assert response.status_code == 403
+        listing = client.get('/api/upload/list', headers=auth_headers)
+        assert listing.get_json()['data']['pagination']['total'] == 0
+
+
 class TestResults:
     """Tests for GET /api/results/<doc_id>"""
 
@@ -91,6 +167,61 @@ class TestResults:
         assert result['success'] is False
 
 
+class TestReport:
+    """Tests for GET /api/results/<doc_id>/report"""
+
+    def test_download_report(self, client, auth_headers):
+        """Test downloading the PDF report of a validated document."""
+        doc_id = upload_test_file(client, auth_headers, 'report.pdf')
+        client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        response = client.get(f'/api/results/{doc_id}/report', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/pdf'
+        assert response.data.startswith(b'%PDF')
+
+    def test_report_conditional_get(self, client, auth_headers):
+        """Test the report carries validators and If-None-Match returns 304."""
+        doc_id = upload_test_file(client, auth_headers, 'etag.pdf')
+        client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        first = client.get(f'/api/results/{doc_id}/report', headers=auth_headers)
+        assert first.headers.get('ETag')
+        assert first.headers.get('Last-Modified')
+
+        headers = dict(auth_headers, **{'If-None-Match': first.headers['ETag']})
+        second = client.get(f'/api/results/{doc_id}/report', headers=headers)
+        assert second.status_code == 304
+        assert second.data == b''
+
+    def test_report_rendered_once(self, client, auth_headers, monkeypatch):
+        """Test repeated downloads are served from the report cache."""
+        import services.report_service as report_service
+        calls = []
+        original = report_service.generate_validation_report
+
+        def counting(document, result, output):
+            calls.append(result.id)
+            return original(document, result, output)
+
+        monkeypatch.setattr(report_service, 'generate_validation_report', counting)
+        doc_id = upload_test_file(client, auth_headers, 'cached.pdf')
+        client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        first = client.get(f'/api/results/{doc_id}/report', headers=auth_headers)
+        second = client.get(f'/api/results/{doc_id}/report', headers=auth_headers)
+
+        assert first.data == second.data
+        assert len(calls) == 1
+
+    def test_report_not_validated(self, client, auth_headers):
+        """Test requesting a report before validation returns 400."""
+        doc_id = upload_test_file(client, auth_headers, 'noreport.pdf')
+        response = client.get(f'/api/results/{doc_id}/report', headers=auth_headers)
+        assert response.status_code == 400
+
+
 class TestHistory:
     """Tests for GET /api/history"""
 
@@ -144,3 +275,697 @@ class TestRevalidation:
         """Test re-validating non-existent document returns 404."""
         response = client.put('/api/validate/99999', headers=auth_headers)
         assert response.status_code == 404
+
+
+class TestUsageLimit:
+    """Tests for the free-tier validation quota"""
+
+    def _set_count(self, db, count):
+        from models.user import User
+        user = User.query.filter_by(email='test@example.com').first()
+        user.validation_count = count
+        db.session.commit()
+        return user
+
+    def test_validation_consumes_slot(self, client, db, auth_headers):
+        """Test a successful validation counts against the free quota."""
+        user = self._set_count(db, 0)
+        doc_id = upload_test_file(client, auth_headers, 'quota.pdf')
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+        assert response.status_code == 200
+
+        db.session.refresh(user)
+        assert user.validation_count == 1
+
+    def test_limit_reached(self, client, db, auth_headers):
+        """Test free users are rejected once the quota is used up."""
+        self._set_count(db, 10)
+        doc_id = upload_test_file(client, auth_headers, 'over_quota.pdf')
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+        result = response.get_json()
+
+        assert response.status_code == 403
+        assert result['error']['code'] == 'USAGE_LIMIT_REACHED'
+
+    def test_failed_pipeline_releases_slot(self, client, db, auth_headers, monkeypatch):
+        """Test a reservation is given back when the pipeline fails."""
+        import services.validation_service as validation_service
+
+        def broken_cnn(image_path):
+            raise RuntimeError('model crashed')
+
+        monkeypatch.setattr(validation_service, 'mock_cnn_predict', broken_cnn)
+        user = self._set_count(db, 3)
+        doc_id = upload_test_file(client, auth_headers, 'broken.pdf')
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+        assert response.status_code == 500
+
+        db.session.refresh(user)
+        assert user.validation_count == 3
+
+
+class TestReportExport:
+    """Tests for POST /api/results/export"""
+
+    def _validated(self, client, auth_headers, count):
+        doc_ids = []
+        for i in range(count):
+            doc_id = upload_test_file(client, auth_headers, f'export_{i}.pdf')
+            client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+            doc_ids.append(doc_id)
+        return doc_ids
+
+    def _open_zip(self, data):
+        import zipfile
+        return zipfile.ZipFile(io.BytesIO(data))
+
+    def test_export_streams_zip(self, client, auth_headers):
+        """Test a small export streams a ZIP with every report and a CSV summary."""
+        doc_ids = self._validated(client, auth_headers, 3)
+
+        response = client.post('/api/results/export', json={}, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/zip'
+
+        archive = self._open_zip(response.data)
+        names = archive.namelist()
+        assert names[0] == 'summary.csv'
+        assert len([n for n in names if n.endswith('.pdf')]) == 3
+        summary = archive.read('summary.csv').decode().splitlines()
+        assert summary[0].startswith('document_id,filename,verdict')
+        assert len(summary) == 4
+        assert archive.read(names[1]).startswith(b'%PDF')
+        assert str(doc_ids[0]) in summary[1]
+
+    def test_export_selected_documents(self, client, auth_headers, second_user_headers):
+        """Test document_ids limits the export and other users' documents are excluded."""
+        mine = self._validated(client, auth_headers, 2)
+        theirs = self._validated(client, second_user_headers, 1)
+
+        response = client.post('/api/results/export', json={'document_ids': [mine[1], theirs[0]]}, headers=auth_headers)
+        archive = self._open_zip(response.data)
+        assert len([n for n in archive.namelist() if n.endswith('.pdf')]) == 1
+
+    def test_export_background_job(self, client, auth_headers):
+        """Test async exports run as a job whose ZIP can be downloaded."""
+        self._validated(client, auth_headers, 2)
+
+        response = client.post('/api/results/export?async=true', json={}, headers=auth_headers)
+        assert response.status_code == 202
+        status_url = response.get_json()['data']['status_url']
+
+        status = client.get(status_url, headers=auth_headers).get_json()['data']
+        assert status['job']['status'] == 'done'
+        assert status['job']['completed'] == 2
+        assert 'download_url' in status
+
+        download = client.get(f'{status_url}/download', headers=auth_headers)
+        assert download.status_code == 200
+        assert 'summary.csv' in self._open_zip(download.data).namelist()
+
+    def test_export_nothing_validated(self, client, auth_headers):
+        """Test exporting with no validated documents returns 404."""
+        upload_test_file(client, auth_headers, 'pending.pdf')
+        response = client.post('/api/results/export', json={}, headers=auth_headers)
+        assert response.status_code == 404
+
+
+class TestHistoryExport:
+    """Tests for GET /api/history/export"""
+
+    def _validate_with_scores(self, client, db, auth_headers, scores):
+        from models.result import Result
+        for i, score in enumerate(scores):
+            doc_id = upload_test_file(client, auth_headers, f'hist_{i}.pdf')
+            client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+            result = Result.query.filter_by(document_id=doc_id).first()
+            result.final_score = score
+            result.verdict = 'AUTHENTIC' if score >= 0.9 else 'FAKE'
+        db.session.commit()
+
+    def test_export_csv(self, client, db, auth_headers):
+        """Test the CSV export has a header and one line per result."""
+        self._validate_with_scores(client, db, auth_headers, [0.95, 0.5, 0.4])
+
+        response = client.get('/api/history/export?format=csv', headers=auth_headers)
+        lines = response.data.decode().splitlines()
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert lines[0].startswith('result_id,document_id,filename')
+        assert len(lines) == 4
+
+    def test_export_ndjson_filters(self, client, db, auth_headers):
+        """Test verdict and score filters are applied to the NDJSON export."""
+        import json
+        self._validate_with_scores(client, db, auth_headers, [0.95, 0.5, 0.4])
+
+        response = client.get('/api/history/export?format=ndjson&verdict=fake&min_score=0.45', headers=auth_headers)
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+
+        assert response.mimetype == 'application/x-ndjson'
+        assert len(rows) == 1
+        assert rows[0]['verdict'] == 'FAKE'
+        assert rows[0]['final_score'] == 0.5
+
+    def test_export_date_range(self, client, db, auth_headers):
+        """Test a date range outside the validations yields no rows."""
+        self._validate_with_scores(client, db, auth_headers, [0.95])
+
+        response = client.get('/api/history/export?format=ndjson&from=2000-01-01&to=2000-12-31', headers=auth_headers)
+        assert response.data == b''
+
+    def test_export_invalid_filter(self, client, auth_headers):
+        """Test malformed filters are rejected."""
+        assert client.get('/api/history/export?from=yesterday', headers=auth_headers).status_code == 400
+        assert client.get('/api/history/export?format=xml', headers=auth_headers).status_code == 400
+        assert client.get('/api/history/export?min_score=2', headers=auth_headers).status_code == 400
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data or {}
+        self.text = str(self._data)
+        self.headers = {}
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    """Records each posted body and answers with the queued responses."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.bodies = []
+        self.timeouts = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.timeouts.append(timeout)
+        self.bodies.append((getattr(data, 'len', None), b''.join(iter(lambda: data.read(8192), b''))))
+        return self.responses.pop(0)
+
+
+class TestOCRServiceClient:
+    """Tests for the pooled OCR service client used by the validation pipeline"""
+
+    def use_session(self, app, monkeypatch, responses):
+        from services import ocr_client
+        session = FakeSession(responses)
+        monkeypatch.setattr(ocr_client, '_get_session', lambda: session)
+        monkeypatch.setitem(app.config, 'OCR_SERVICE_URL', 'http://ocr.test')
+        monkeypatch.setitem(app.config, 'OCR_SERVICE_BACKOFF', 0)
+        return session
+
+    def test_fields_mapped_and_body_streamed(self, app, monkeypatch):
+        """The file is sent as multipart with a Content-Length and the schema is mapped."""
+        from services import ocr_client
+        session = self.use_session(app, monkeypatch, [
+            FakeResponse(200, {'Name': 'Asha Rao', 'Roll Number': 'R42', 'Year': '2023'})
+        ])
+        with app.app_context():
+            result = ocr_client.extract(io.BytesIO(b'image-bytes'), 'cert.png')
+
+        assert result['fields']['name'] == 'Asha Rao'
+        assert result['fields']['id_number'] == 'R42'
+        assert result['fields']['date'] == '2023'
+        assert result['confidence'] > 0
+        length, body = session.bodies[0]
+        assert length == len(body)
+        assert b'filename="cert.png"' in body and b'image-bytes' in body
+
+    def test_gateway_error_retried(self, app, monkeypatch):
+        """A 503 is retried with the stream rewound."""
+        from services import ocr_client
+        session = self.use_session(app, monkeypatch, [
+            FakeResponse(503), FakeResponse(200, {'Name': 'Asha Rao'})
+        ])
+        with app.app_context():
+            result = ocr_client.extract(io.BytesIO(b'image-bytes'), 'cert.png')
+
+        assert result['fields']['name'] == 'Asha Rao'
+        assert len(session.bodies) == 2
+        assert all(b'image-bytes' in body for _, body in session.bodies)
+
+    def test_client_error_not_retried(self, app, monkeypatch):
+        """A 4xx fails at once and the pipeline falls back to an empty extraction."""
+        from services import validation_service
+        session = self.use_session(app, monkeypatch, [FakeResponse(400, {'detail': 'bad file'})])
+        with app.app_context():
+            result = validation_service.extract_document_data(io.BytesIO(b'image-bytes'), 'cert.png')
+
+        assert result == {'fields': {}, 'confidence': 0.0}
+        assert len(session.bodies) == 1
+
+    def test_non_json_body(self, app, monkeypatch):
+        """A 200 with an HTML body (e.g. from a proxy) becomes an empty extraction."""
+        from services import validation_service
+        page = FakeResponse(200)
+        page.json = lambda: json.loads('<html>Bad gateway</html>')
+        self.use_session(app, monkeypatch, [page])
+        with app.app_context():
+            result = validation_service.extract_document_data(io.BytesIO(b'image-bytes'), 'cert.png')
+
+        assert result == {'fields': {}, 'confidence': 0.0}
+
+    def test_timeout_bounded_by_deadline(self, app, monkeypatch):
+        """The read timeout shrinks to the time left, and no retry starts after the deadline."""
+        import time
+        import pytest
+        from services import ocr_client
+        session = self.use_session(app, monkeypatch, [FakeResponse(503), FakeResponse(200, {'Name': 'Asha Rao'})])
+        monkeypatch.setitem(app.config, 'OCR_SERVICE_BACKOFF', 10)
+        monkeypatch.setattr(ocr_client.random, 'uniform', lambda low, high: high)
+        with app.app_context(), pytest.raises(ocr_client.OCRServiceError, match='503'):
+            ocr_client.extract(io.BytesIO(b'image-bytes'), 'cert.png', deadline=time.monotonic() + 2)
+
+        assert len(session.bodies) == 1
+        assert session.timeouts[0][1] <= 2
+
+
+def certificate_image():
+    """A page with a border, a seal and a few lines of text."""
+    from PIL import Image, ImageDraw, ImageFont
+    img = Image.new('RGB', (1600, 1130), (250, 245, 230))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((30, 30, 1570, 1100), outline=(120, 80, 20), width=12)
+    draw.ellipse((1250, 800, 1480, 1030), outline=(160, 20, 20), width=6)
+    font = ImageFont.load_default(size=34)
+    for i, text in enumerate(['Pune University', 'Name: Asha Rao', 'Roll No: R42']):
+        draw.text((400, 300 + i * 80), text, fill=(0, 0, 0), font=font)
+    return img
+
+
+class TestRegionCropping:
+    """Tests for the region-of-interest mosaic sent to Gemini"""
+
+    def test_mosaic_keeps_text_only(self):
+        """Text lines are found in reading order and the mosaic is far smaller than the page."""
+        from utils.layout_utils import find_text_regions, build_roi_mosaic
+        img = certificate_image()
+
+        rows = find_text_regions(img)
+        assert len(rows) == 3
+        assert all(box[0] < 400 and box[1] < 300 + i * 80 for i, (box,) in enumerate(rows))
+        mosaic = build_roi_mosaic(img)
+        assert mosaic.width * mosaic.height < 0.2 * img.width * img.height
+
+    def test_blank_page_has_no_mosaic(self):
+        from PIL import Image
+        from utils.layout_utils import build_roi_mosaic
+        assert build_roi_mosaic(Image.new('RGB', (800, 600), 'white')) is None
+
+    def test_full_page_fallback(self, app, monkeypatch):
+        """An incomplete answer for the mosaic is retried with the full page."""
+        from types import SimpleNamespace
+        from services import validation_service
+        sizes = []
+
+        class FakeModel:
+            def generate_content(self, parts):
+                sizes.append(parts[1].size)
+                fields = {'name': 'Asha Rao', 'id_number': 'R42'} if len(sizes) > 1 else {'name': None}
+                return SimpleNamespace(text=json.dumps(fields))
+
+        monkeypatch.setattr(validation_service, 'get_genai_model', lambda: FakeModel())
+        buffer = io.BytesIO()
+        certificate_image().save(buffer, format='PNG')
+        buffer.seek(0)
+        with app.app_context():
+            result = validation_service.extract_data_with_gemini(buffer)
+
+        assert result['fields']['id_number'] == 'R42'
+        assert len(sizes) == 2
+        assert sizes[0] != (1600, 1130) and sizes[1] == (1600, 1130)
+
+
+class TestCoalescing:
+    """Tests for single-flight validation of a document"""
+
+    def hold_lease(self, db, doc_id, seconds):
+        from datetime import datetime, timedelta, timezone
+        from models.validation_lease import ValidationLease
+        db.session.add(ValidationLease(
+            document_id=doc_id, owner='other-worker',
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=seconds)
+        ))
+        db.session.commit()
+
+    def test_waits_for_other_worker(self, app, client, db, auth_headers, monkeypatch):
+        """While another worker holds the lease, its result is returned instead of running again."""
+        from services import lease_service, validation_service
+        doc_id = upload_test_file(client, auth_headers)
+        self.hold_lease(db, doc_id, 60)
+        runs = []
+        monkeypatch.setattr(validation_service, 'mock_cnn_predict', lambda f: runs.append(f) or 0.9)
+
+        from models.user import User
+        user_id = User.query.filter_by(email='test@example.com').first().id
+
+        def other_worker_finishes(seconds):
+            # The lease holder saves its result while we poll
+            with app.app_context():
+                validation_service._run_pipeline(doc_id, user_id, 'unused', 'test.pdf', io.BytesIO(b'x'))
+
+        monkeypatch.setattr(lease_service.time, 'sleep', other_worker_finishes)
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        assert response.status_code == 200
+        assert len(runs) == 1
+
+    def test_gives_up_after_wait_timeout(self, app, client, db, auth_headers, monkeypatch):
+        doc_id = upload_test_file(client, auth_headers)
+        self.hold_lease(db, doc_id, 60)
+        monkeypatch.setitem(app.config, 'VALIDATION_WAIT_TIMEOUT', 0.05)
+        monkeypatch.setitem(app.config, 'VALIDATION_LEASE_POLL', 0.01)
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        assert response.status_code == 409
+        assert response.get_json()['error']['code'] == 'VALIDATION_IN_PROGRESS'
+        assert 'Retry-After' in response.headers
+
+    def test_expired_lease_taken_over(self, client, db, auth_headers):
+        doc_id = upload_test_file(client, auth_headers)
+        self.hold_lease(db, doc_id, -1)
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        assert response.status_code == 200
+        from models.validation_lease import ValidationLease
+        assert db.session.get(ValidationLease, doc_id) is None
+
+    def test_concurrent_callers_in_process(self, app, monkeypatch):
+        """Callers arriving while the pipeline runs wait for it and share its result."""
+        import threading
+        from services import lease_service
+        monkeypatch.setattr(lease_service, 'acquire_lease', lambda *args: True)
+        monkeypatch.setattr(lease_service, 'release_lease', lambda *args: None)
+        started, finish = threading.Event(), threading.Event()
+        runs, stored, outcomes = [], {}, []
+
+        def run():
+            runs.append(1)
+            started.set()
+            finish.wait(5)
+            stored['result'] = {'verdict': 'AUTHENTIC'}
+            return stored['result']
+
+        def call():
+            with app.app_context():
+                outcomes.append(lease_service.run_once(42, run, lambda: stored.get('result')))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=call) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        finish.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        assert len(runs) == 1
+        assert outcomes == [{'verdict': 'AUTHENTIC'}] * 4
+
+
+class TestIdempotencyKey:
+    """Tests for the Idempotency-Key header on validate/upload POSTs"""
+
+    def upload(self, client, auth_headers, key, content=b'%PDF-1.4 idempotent'):
+        return client.post(
+            '/api/upload',
+            data={'file': (io.BytesIO(content), 'idem.pdf')},
+            headers={'Authorization': auth_headers['Authorization'], 'Idempotency-Key': key},
+            content_type='multipart/form-data'
+        )
+
+    def test_retry_replays_response(self, client, auth_headers):
+        first = self.upload(client, auth_headers, 'key-1')
+        second = self.upload(client, auth_headers, 'key-1')
+
+        assert first.status_code == second.status_code == 201
+        assert second.headers.get('Idempotent-Replayed') == 'true'
+        assert second.get_json() == first.get_json()
+        listing = client.get('/api/upload/list', headers=auth_headers).get_json()
+        assert listing['data']['pagination']['total'] == 1
+
+    def test_key_reused_for_other_request(self, client, auth_headers):
+        self.upload(client, auth_headers, 'key-2')
+        response = self.upload(client, auth_headers, 'key-2', content=b'%PDF-1.4 something else')
+
+        assert response.status_code == 422
+        assert response.get_json()['error']['code'] == 'IDEMPOTENCY_KEY_REUSED'
+
+    def test_keys_are_per_user(self, client, auth_headers, second_user_headers):
+        self.upload(client, auth_headers, 'shared-key')
+        response = self.upload(client, second_user_headers, 'shared-key')
+
+        assert response.status_code == 201
+        assert 'Idempotent-Replayed' not in response.headers
+
+    def test_validate_replayed(self, client, auth_headers):
+        doc_id = upload_test_file(client, auth_headers)
+        headers = dict(auth_headers, **{'Idempotency-Key': 'validate-1'})
+        first = client.post(f'/api/validate/{doc_id}', headers=headers)
+        second = client.post(f'/api/validate/{doc_id}', headers=headers)
+
+        assert first.status_code == second.status_code == 200
+        assert second.headers.get('Idempotent-Replayed') == 'true'
+        assert second.get_json() == first.get_json()
+
+    def test_retry_after_in_progress_runs_again(self, client, auth_headers, monkeypatch):
+        """A 409 from the single-flight lease is not stored; the retry gets the real result."""
+        from blueprints import validation as validation_bp
+        real_validate = validation_bp.validate_document
+        calls = []
+
+        def busy_once(doc_id, user_id):
+            calls.append(doc_id)
+            if len(calls) == 1:
+                raise ValueError('VALIDATION_IN_PROGRESS')
+            return real_validate(doc_id, user_id)
+
+        monkeypatch.setattr(validation_bp, 'validate_document', busy_once)
+        doc_id = upload_test_file(client, auth_headers)
+        headers = dict(auth_headers, **{'Idempotency-Key': 'validate-busy'})
+        first = client.post(f'/api/validate/{doc_id}', headers=headers)
+        second = client.post(f'/api/validate/{doc_id}', headers=headers)
+        third = client.post(f'/api/validate/{doc_id}', headers=headers)
+
+        assert first.status_code == 409
+        assert first.headers.get('Retry-After') == '5'
+        assert second.status_code == 200
+        assert 'Idempotent-Replayed' not in second.headers
+        assert second.get_json()['data']['result']['verdict']
+        assert third.headers.get('Idempotent-Replayed') == 'true'
+        assert third.get_json() == second.get_json()
+        assert len(calls) == 2
+
+
+class TestPipelineStages:
+    """Tests for the stage graph the validation pipeline runs on"""
+
+    def test_independent_stages_overlap(self, app):
+        import time
+        import threading
+        from services.pipeline_service import Stage, run_stages
+        caller = threading.get_ident()
+
+        def slow(x):
+            time.sleep(0.2)
+            return x * 2
+
+        stages = [
+            Stage('a', slow, requires=('x',)),
+            Stage('b', slow, requires=('x',)),
+            Stage('total', lambda a, b: (a + b, threading.get_ident()), requires=('a', 'b'), inline=True),
+        ]
+        with app.app_context():
+            start = time.perf_counter()
+            outputs = run_stages(stages, {'x': 5})
+            elapsed = time.perf_counter() - start
+
+        assert outputs['total'] == (20, caller)
+        assert elapsed < 0.35
+
+    def test_serial_without_workers(self, app, monkeypatch):
+        from services.pipeline_service import Stage, run_stages
+        monkeypatch.setitem(app.config, 'PIPELINE_WORKERS', 0)
+        stages = [Stage('b', lambda a: a + 1, requires=('a',)), Stage('a', lambda x: x * 10, requires=('x',))]
+        with app.app_context():
+            assert run_stages(stages, {'x': 1})['b'] == 11
+
+    def test_stage_error_raised(self, app):
+        import pytest
+        from services.pipeline_service import Stage, run_stages
+
+        def broken(x):
+            raise RuntimeError('model down')
+
+        with app.app_context(), pytest.raises(RuntimeError, match='model down'):
+            run_stages([Stage('ok', lambda x: x, requires=('x',)), Stage('bad', broken, requires=('x',))], {'x': 1})
+
+    def test_stages_stream_the_document(self, client, auth_headers, monkeypatch):
+        """OCR reads a rewindable stream over the file, not an in-memory copy, on both paths."""
+        from services import validation_service
+        seen = []
+
+        def fake_extract(stream, filename, deadline):
+            content = stream.read()
+            stream.seek(0)
+            seen.append((stream, content, stream.read(4)))
+            return {'fields': {}, 'confidence': 0.5}
+
+        monkeypatch.setattr(validation_service, 'extract_document_data', fake_extract)
+        doc_id = upload_test_file(client, auth_headers)
+        assert client.post(f'/api/validate/{doc_id}', headers=auth_headers).status_code == 200
+        fused = client.post(
+            '/api/validate',
+            data={'file': (io.BytesIO(b'%PDF-1.4 fused content'), 'fused.pdf')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        )
+        assert fused.status_code == 201
+
+        (stored, stored_content, stored_head), (spooled, spooled_content, spooled_head) = seen
+        assert (stored_content, stored_head) == (b'%PDF-1.4 test content', b'%PDF')
+        assert (spooled_content, spooled_head) == (b'%PDF-1.4 fused content', b'%PDF')
+        assert not isinstance(stored, io.BytesIO) and not isinstance(spooled, io.BytesIO)
+
+    def test_missing_input(self, app):
+        import pytest
+        from services.pipeline_service import Stage, run_stages
+        with app.app_context(), pytest.raises(ValueError, match='missing: y'):
+            run_stages([Stage('a', lambda y: y, requires=('y',))], {})
+
+
+class TestDeadlines:
+    """Tests for validation deadlines and per-stage budgets"""
+
+    def test_stage_over_budget_falls_back(self, app):
+        """A stage that misses its budget is abandoned; its dependents are skipped."""
+        import time
+        from services.pipeline_service import Stage, run_stages
+
+        def slow(x):
+            time.sleep(0.5)
+            return x
+
+        stages = [
+            Stage('fast', lambda x: x + 1, requires=('x',)),
+            Stage('slow', slow, requires=('x',), budget=0.5, fallback=lambda: 'late'),
+            Stage('after', lambda slow: slow, requires=('slow',), inline=True, fallback=lambda: 'skipped'),
+        ]
+        timings = {}
+        with app.app_context():
+            start = time.perf_counter()
+            outputs = run_stages(stages, {'x': 1}, deadline=time.monotonic() + 0.2, timings=timings)
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3
+        assert (outputs['fast'], outputs['slow'], outputs['after']) == (2, 'late', 'skipped')
+        assert [timings[name]['status'] for name in ('fast', 'slow', 'after')] == ['ok', 'timeout', 'skipped']
+        assert timings['slow']['budget_ms'] <= 100
+
+    def test_stage_without_fallback_exceeds_deadline(self, app):
+        import time
+        import pytest
+        from services.pipeline_service import Stage, run_stages
+        with app.app_context(), pytest.raises(ValueError, match='DEADLINE_EXCEEDED'):
+            run_stages([Stage('a', lambda x: time.sleep(0.5), requires=('x',))], {'x': 1},
+                       deadline=time.monotonic() + 0.1)
+
+    def test_slow_ocr_gives_partial_result(self, app, client, auth_headers, monkeypatch):
+        """When OCR runs out of time the verdict comes from the CNN score alone."""
+        import time
+        from services import validation_service
+        monkeypatch.setitem(app.config, 'VALIDATION_DEADLINE', 0.3)
+        monkeypatch.setattr(validation_service, 'mock_cnn_predict', lambda f: 0.92)
+        monkeypatch.setattr(validation_service, 'extract_document_data',
+                            lambda f, name, deadline: time.sleep(1))
+        doc_id = upload_test_file(client, auth_headers)
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        assert response.status_code == 200
+        result = response.get_json()['data']['result']
+        assert result['partial'] is True
+        assert result['skipped_stages'] == ['ocr', 'db_match']
+        assert result['scores']['ocr_confidence'] is None
+        assert result['scores']['final_score'] == 0.92
+        assert result['verdict'] == 'AUTHENTIC'
+
+    def test_gemini_deadline_gives_partial_result(self, app, client, auth_headers, monkeypatch):
+        """A Gemini call cut short by its deadline marks OCR timed out instead of scoring it 0."""
+        from PIL import Image
+        from google.api_core import exceptions as google_exceptions
+        from services import validation_service
+
+        class DeadlineModel:
+            def generate_content(self, parts, request_options=None):
+                assert request_options['timeout'] <= app.config['VALIDATION_DEADLINE']
+                raise google_exceptions.DeadlineExceeded('504 Deadline Exceeded')
+
+        monkeypatch.setattr(validation_service, 'get_genai_model', lambda: DeadlineModel())
+        monkeypatch.setattr(validation_service, 'mock_cnn_predict', lambda f: 0.92)
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), (255, 255, 255)).save(buffer, format='PNG')
+        doc_id = client.post(
+            '/api/upload',
+            data={'file': (io.BytesIO(buffer.getvalue()), 'scan.png')},
+            headers={'Authorization': auth_headers['Authorization']},
+            content_type='multipart/form-data'
+        ).get_json()['data']['document']['id']
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        result = response.get_json()['data']['result']
+        assert result['partial'] is True
+        assert result['skipped_stages'] == ['ocr', 'db_match']
+        assert result['scores']['final_score'] == 0.92
+
+    def test_ocr_service_deadline_raised(self, app, monkeypatch):
+        """The OCR service client's timeout at the deadline is not turned into an empty extraction."""
+        import time
+        import pytest
+        import requests
+        from services import ocr_client, validation_service
+
+        class SlowSession:
+            def post(self, url, data=None, headers=None, timeout=None):
+                time.sleep(timeout[1])
+                raise requests.ReadTimeout('read timed out')
+
+        monkeypatch.setattr(ocr_client, '_get_session', lambda: SlowSession())
+        monkeypatch.setitem(app.config, 'OCR_SERVICE_URL', 'http://ocr.test')
+        with app.app_context(), pytest.raises(TimeoutError):
+            validation_service.extract_document_data(
+                io.BytesIO(b'image-bytes'), 'cert.png', deadline=time.monotonic() + 0.1
+            )
+
+    def test_complete_result_not_partial(self, client, auth_headers):
+        doc_id = upload_test_file(client, auth_headers)
+        result = client.post(f'/api/validate/{doc_id}', headers=auth_headers).get_json()['data']['result']
+        assert result['partial'] is False
+        assert result['skipped_stages'] == []
+
+    def test_deadline_exceeded(self, app, client, auth_headers, monkeypatch):
+        """With no stage finished in time nothing is saved and the call answers 504."""
+        import time
+        from services import validation_service
+        monkeypatch.setitem(app.config, 'VALIDATION_DEADLINE', 0.2)
+        monkeypatch.setattr(validation_service, 'mock_cnn_predict', lambda f: time.sleep(1))
+        monkeypatch.setattr(validation_service, 'extract_document_data',
+                            lambda f, name, deadline: time.sleep(1))
+        doc_id = upload_test_file(client, auth_headers)
+
+        response = client.post(f'/api/validate/{doc_id}', headers=auth_headers)
+
+        assert response.status_code == 504
+        assert response.get_json()['error']['code'] == 'VALIDATION_TIMEOUT'
+        assert client.get(f'/api/results/{doc_id}', headers=auth_headers).status_code == 404
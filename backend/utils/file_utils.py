@@ -1,8 +1,11 @@
+import io
 import os
 import uuid
+import hashlib
 import logging
 from werkzeug.utils import secure_filename
-from flask import current_app
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Epilogue, Data, Field, File
+from flask import current_app, Request
 
 logger = logging.getLogger(__name__)
 
@@ -31,19 +34,72 @@ def get_safe_filename(filename):
     return secure_filename(filename)
 
 
+# Fan-out layout: <dir>/ab/cd/<name>, taken from the first characters of the name
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+# In-flight files that must not be moved by the layout migration
+_TRANSIENT_SUFFIXES = ('.part', '.incoming')
+
+
+def shard_path(base_dir, name):
+    """Get the sharded location of name under base_dir (e.g. base/ab/cd/abcd1234.pdf)."""
+    parts = [name[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+    return os.path.join(base_dir, *parts, name)
+
+
+def resolve_sharded_path(base_dir, name):
+    """Sharded path for name, falling back to the legacy flat path for files
+    not yet moved by `flask storage migrate-layout`.
+    """
+    sharded = shard_path(base_dir, name)
+    if os.path.exists(sharded):
+        return sharded
+    flat = os.path.join(base_dir, name)
+    if os.path.exists(flat):
+        return flat
+    return sharded
+
+
 def get_upload_path(stored_name):
     """Get the full path for an uploaded file."""
-    return os.path.join(current_app.config['UPLOAD_FOLDER'], stored_name)
+    return resolve_sharded_path(current_app.config['UPLOAD_FOLDER'], stored_name)
 
 
-def delete_file(stored_name):
-    """Delete a file from the uploads directory."""
-    file_path = get_upload_path(stored_name)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        return True
-    logger.warning(f'File not found on disk during deletion: {stored_name}')
-    return False
+def get_blob_dir():
+    """Directory holding the content-addressed blob store."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs')
+
+
+def get_blob_path(content_hash):
+    """Get the full path of a content-addressed blob."""
+    return resolve_sharded_path(get_blob_dir(), content_hash)
+
+
+def migrate_flat_files(base_dir, batch_size=500):
+    """Move up to batch_size files from the flat top level of base_dir into the
+    sharded layout and return how many were moved.
+
+    Each move is an atomic rename, and readers fall back to the flat path until
+    a file has moved, so this is safe to run while the service is up. Files
+    already migrated are no longer at the top level, which makes repeated
+    calls resume where the previous batch stopped.
+    """
+    if not os.path.isdir(base_dir):
+        return 0
+
+    moved = 0
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            if moved >= batch_size:
+                break
+            if not entry.is_file() or entry.name.endswith(_TRANSIENT_SUFFIXES):
+                continue
+            target = shard_path(base_dir, entry.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(entry.path, target)
+            moved += 1
+    return moved
 
 
 def ensure_upload_dir():
@@ -60,20 +116,291 @@ FILE_SIGNATURES = {
 }
 
 
-def validate_file_content(file_storage, extension):
-    """Validate file content matches the declared extension using magic bytes.
-    Returns True if the file content matches, False otherwise.
-    Resets the file stream position after reading.
-    """
+def signature_length(extension):
+    """Number of leading bytes needed to check the signature for an extension."""
+    signatures = FILE_SIGNATURES.get(extension.lower(), [])
+    return max((len(sig) for sig in signatures), default=0)
+
+
+def matches_signature(header, extension):
+    """Check leading file bytes against the magic bytes registered for an extension."""
     signatures = FILE_SIGNATURES.get(extension.lower(), [])
     if not signatures:
         # No signature registered for this extension — skip magic byte check.
         # The extension whitelist in ALLOWED_EXTENSIONS is the primary gate.
         return True
+    return any(header.startswith(sig) for sig in signatures)
 
-    # Read enough bytes to check the signature
-    max_sig_len = max(len(sig) for sig in signatures)
-    header = file_storage.read(max_sig_len)
-    file_storage.seek(0)  # Reset stream position
 
-    return any(header.startswith(sig) for sig in signatures)
+# Copy buffer for streaming uploads to disk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ContentInspector:
+    """Incremental content checks over a file delivered as a sequence of chunks.
+
+    Checks the magic bytes for the declared extension, enforces max_size, counts
+    bytes and computes the SHA-256 content hash without buffering the file.
+    Raises ValueError as soon as the content is known to be invalid.
+    """
+
+    def __init__(self, extension, max_size=None):
+        self.extension = extension
+        self.max_size = max_size
+        self.size = 0
+        self._header_len = signature_length(extension)
+        self._header = b''
+        self._digest = hashlib.sha256()
+
+    def update(self, chunk):
+        if len(self._header) < self._header_len:
+            self._header += chunk[:self._header_len - len(self._header)]
+            if len(self._header) == self._header_len:
+                self._check_signature()
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise ValueError(f'File exceeds the maximum size of {self.max_size // (1024 * 1024)}MB')
+        self._digest.update(chunk)
+
+    def finish(self):
+        """Return (file_size, sha256_hex) once all chunks have been fed."""
+        # Files shorter than the signature never triggered the check in update()
+        if len(self._header) < self._header_len:
+            self._check_signature()
+        return self.size, self._digest.hexdigest()
+
+    def _check_signature(self):
+        if not matches_signature(self._header, self.extension):
+            raise ValueError('File content does not match its extension')
+
+
+def stream_to_file(stream, dest_path, extension, max_size=None):
+    """Copy a stream to dest_path in one pass and return (file_size, sha256_hex).
+
+    Content is checked with ContentInspector while copying in fixed-size chunks.
+    Data goes to a temporary file in the destination directory, is fsync'ed and
+    then atomically renamed, so a failed upload never leaves a partial file
+    under dest_path.
+    """
+    inspector = ContentInspector(extension, max_size)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = f'{dest_path}.{uuid.uuid4().hex}.part'
+
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                inspector.update(chunk)
+                out.write(chunk)
+            result = inspector.finish()
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return result
+
+
+class StagedFile:
+    """Push-style counterpart of stream_to_file for data that arrives in chunks
+    (e.g. from iter_multipart). Same checks, temp file, fsync and atomic rename.
+    """
+
+    def __init__(self, dest_path, extension, max_size=None):
+        self.path = dest_path
+        self._inspector = ContentInspector(extension, max_size)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        self._tmp_path = f'{dest_path}.{uuid.uuid4().hex}.part'
+        self._out = open(self._tmp_path, 'wb')
+
+    def write(self, chunk):
+        try:
+            self._inspector.update(chunk)
+            self._out.write(chunk)
+        except BaseException:
+            self.abort()
+            raise
+
+    def finish(self):
+        """Move the data under dest_path and return (file_size, sha256_hex)."""
+        try:
+            result = self._inspector.finish()
+            self._out.flush()
+            os.fsync(self._out.fileno())
+            self._out.close()
+            os.replace(self._tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        return result
+
+    def abort(self):
+        """Discard everything written so far."""
+        if not self._out.closed:
+            self._out.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class SharedFileReader(io.RawIOBase):
+    """Read-only view of a shared seekable file with its own position.
+
+    Every read seeks the shared file under `lock`, so several threads can read
+    one open file independently without copying it (e.g. the pipeline stages
+    reading the same upload). Closing the view leaves the file open.
+    """
+
+    def __init__(self, file, lock):
+        self._file = file
+        self._lock = lock
+        self._pos = 0
+        with lock:
+            self._size = file.seek(0, os.SEEK_END)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        with self._lock:
+            self._file.seek(self._pos)
+            data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class SpooledUpload:
+    """File werkzeug's form parser spools a multipart file part into.
+
+    Replaces werkzeug's anonymous temporary file: the part is written straight
+    into the staging directory and inspected (magic bytes, size, SHA-256) while
+    it is parsed, so save_document can adopt the file into the blob store
+    instead of copying it a second time. Content errors are raised by finish(),
+    which also closes the file so it can be moved while nothing holds it open;
+    adopted() then reopens it read-only where it ended up, if that is local.
+    Reads and seeks go to the open file; close() removes the staging file
+    unless it was adopted.
+    """
+
+    def __init__(self, extension, max_size=None):
+        staging_dir = get_staging_dir()
+        os.makedirs(staging_dir, exist_ok=True)
+        self.extension = extension
+        self.path = os.path.join(staging_dir, f'{uuid.uuid4().hex}.incoming')
+        self._file = open(self.path, 'w+b')
+        self._inspector = ContentInspector(extension, max_size)
+        self._error = None
+        self._adopted = False
+
+    def write(self, data):
+        if self._error is None:
+            try:
+                self._inspector.update(data)
+            except ValueError as e:
+                self._error = e
+        return self._file.write(data)
+
+    def finish(self):
+        """Flush and close the file and return (file_size, sha256_hex)."""
+        if self._error is not None:
+            raise self._error
+        result = self._inspector.finish()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        return result
+
+    def adopted(self, path=None):
+        """Mark the finished file as moved away; reopen it for reading at path if given."""
+        self._adopted = True
+        if path is not None:
+            self._file = open(path, 'rb')
+
+    def close(self):
+        self._file.close()
+        if not self._adopted and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['_file'], name)
+
+
+class UploadRequest(Request):
+    """Request that spools uploaded files of allowed types with SpooledUpload.
+
+    Flask closes every file of request.files when the request ends, which
+    removes spools that were not stored.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and allowed_file(filename):
+            return SpooledUpload(get_file_extension(filename), current_app.config.get('MAX_FILE_SIZE'))
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def iter_multipart(stream, boundary, max_form_memory_size=None, max_parts=None):
+    """Parse a multipart/form-data body incrementally from a stream.
+
+    Yields (part, chunk, more_data) where part is the werkzeug Field or File
+    header of the part the chunk belongs to. Only one STREAM_CHUNK_SIZE read is
+    held in memory at a time, however many files the body contains.
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size, max_parts=max_parts)
+    part = None
+    while True:
+        data = stream.read(STREAM_CHUNK_SIZE)
+        decoder.receive_data(data or None)
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if isinstance(event, (Field, File)):
+                part = event
+            elif isinstance(event, Data):
+                yield part, event.data, event.more_data
+            event = decoder.next_event()
+        if isinstance(event, Epilogue):
+            return
+        if not data:
+            raise ValueError('Incomplete multipart body')
+
+
+def inspect_file(path, extension, max_size=None):
+    """Run ContentInspector over a file already on disk and return (file_size, sha256_hex)."""
+    inspector = ContentInspector(extension, max_size)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            inspector.update(chunk)
+    return inspector.finish()
+
+
+def get_staging_dir():
+    """Local directory where uploads are spooled and checked before entering storage."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], '.staging')
+
+
+def get_session_dir():
+    """Directory holding in-progress resumable upload files."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], '.sessions')
+
+
+def get_session_part_path(session_id):
+    """Get the path of the sparse file backing a resumable upload session."""
+    return os.path.join(get_session_dir(), f'{session_id}.part')